@@ -0,0 +1,108 @@
+import argparse
+import multiprocessing
+import os
+import sys
+
+# Add path to the current directory (with batch.py)
+base_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, base_path)
+
+from logs.logger import app_logger as logger
+
+# Import calculating module (Qt-free)
+from src.Analysis.pipeline import ANALYSES, DEFAULT_VALUES, expand_paths, run_batch
+from src.Analysis.live import POLL_INTERVAL, watch
+from src.Analysis.msd import MSD_MODES
+from src.utils.track_store import LARGE_ROWS
+
+
+def parse_args(argv=None):
+    """
+    Parse the command line of the batch runner.
+
+    Args:
+        argv (list of str, optional): Arguments, defaults to sys.argv[1:].
+
+    Returns:
+        argparse.Namespace: Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Run cell migration analyses on Excel workbooks, CSV/TSV tables or TrackMate XML files without the GUI."
+    )
+    parser.add_argument("inputs", nargs="+", help="Input files or glob patterns (e.g. 'plates/*.xlsx', 'tracks/*.csv').")
+    parser.add_argument("-o", "--output", default="results", help="Directory for result workbooks and plots.")
+    parser.add_argument("-a", "--analyses", nargs="+", choices=list(ANALYSES), default=list(ANALYSES),
+                        help="Analyses to run (default: all).")
+    parser.add_argument("--time-interval", type=float, default=DEFAULT_VALUES["time_interval"],
+                        help="Time between slices (min).")
+    parser.add_argument("--n-time-points", type=int, default=DEFAULT_VALUES["n_time_points"],
+                        help="Number of time points kept per track.")
+    parser.add_argument("--n-tracks", type=int, default=DEFAULT_VALUES["n_tracks"],
+                        help="Expected number of tracks (cells) per sheet.")
+    parser.add_argument("--n-plot-points", type=int, default=DEFAULT_VALUES["n_plot_points"],
+                        help="Number of autocorrelation steps.")
+    parser.add_argument("--msd-mode", choices=MSD_MODES, default=MSD_MODES[0],
+                        help="MSD kernel.")
+    parser.add_argument("-j", "--workers", type=int, default=DEFAULT_VALUES["n_workers"],
+                        help="Number of processes analysing sheets in parallel (default: 1).")
+    parser.add_argument("--columns", nargs="*", metavar="COLUMN",
+                        help="Read only 'Track n', 'Slice n', 'X', 'Y' and these columns (default: every column).")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always parse the workbooks, without the on-disk cache of opened workbooks.")
+    parser.add_argument("--wide-results", action="store_true",
+                        help="Also write the condition average and SEM into the analysed sheets, "
+                             "in the columns of earlier versions (default: Summary sheet only).")
+    parser.add_argument("--memory-mapped", action="store_true",
+                        help="Keep the trajectories in memory-mapped files on disk and analyse them chunk by chunk, "
+                             "for datasets larger than the memory (done automatically for sheets of more than "
+                             f"{LARGE_ROWS} rows). Only the Summary sheet is written.")
+    parser.add_argument("--watch", action="store_true",
+                        help="Follow the inputs (directories, files or glob patterns) while an acquisition writes them: "
+                             "new frames of growing CSV/TSV tables and workbooks are analysed as they arrive and "
+                             "live_<analysis>.csv/.png are kept up to date in the output directory. Stop with Ctrl+C.")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL,
+                        help="With --watch, seconds between two looks at the files.")
+    parser.add_argument("--idle-timeout", type=float, default=None,
+                        help="With --watch, stop after this many seconds without new frames (default: never).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    values = {
+        "time_interval": args.time_interval,
+        "n_time_points": args.n_time_points,
+        "n_tracks": args.n_tracks,
+        "n_plot_points": args.n_plot_points,
+        "msd_mode": args.msd_mode,
+        "n_workers": args.workers,
+    }
+    if min(values["time_interval"], values["n_time_points"], values["n_plot_points"], values["n_workers"]) <= 0:
+        print("Error: time interval, number of time points, number of plot points and workers must be positive.", file=sys.stderr)
+        return 2
+
+    if args.watch:
+        conditions = watch(args.inputs, args.analyses, values, args.output, args.interval, args.idle_timeout)
+        print(f"Followed {len(conditions)} condition(s), results written to {args.output}")
+        return 0
+
+    file_paths = expand_paths(args.inputs)
+    if not file_paths:
+        print("Error: no input file found.", file=sys.stderr)
+        return 2
+
+    logger.info(f"Batch : {len(file_paths)} files, analyses {args.analyses}, parameters {values}")
+    messages = run_batch(file_paths, args.analyses, values, args.output, extra_columns=args.columns,
+                         use_cache=not args.no_cache, wide_results=args.wide_results,
+                         memory_mapped=args.memory_mapped)
+    for message in messages:
+        print(message, file=sys.stderr)
+
+    print(f"Processed {len(file_paths)} file(s), results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,424 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# Add path to the repository root (parent of benchmarks/)
+base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, base_path)
+
+# Saving a page needs Qt widgets, which do not need a display to exist
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import WALK_MODELS, generate
+from src.Analysis.pipeline import ANALYSES, DEFAULT_VALUES, prepare_tracks, run_sheet_analysis
+from src.Statistics.features import cell_features
+from src.utils.input_data import read_workbook
+from src.utils.kinematics import kinematics_cache
+from src.utils.workbook_cache import WorkbookCache
+
+RESULTS_DIR = Path(base_path) / "benchmarks" / "results"
+
+# Names of the benchmarks reading or writing Excel files, limited by --io-max-tracks
+IO_BENCHMARKS = ("read_workbook", "read_workbook_cached", "save_page")
+
+
+def analysis_benchmark(analysis):
+    """
+    Benchmark of one analysis class on prepared data, TrackTable construction included.
+
+    Args:
+        analysis (str): Key of ANALYSES.
+
+    Returns:
+        tuple: (setup, run) functions, see `measure`.
+    """
+    def setup(case):
+        kinematics_cache.clear()
+        return (case["data"].copy(), case["values"])
+
+    def run(data, values):
+        run_sheet_analysis(data, analysis, values)
+
+    return setup, run
+
+
+def prepare_tracks_benchmark():
+    """
+    Benchmark of the preparation of a raw sheet before the analyses (sorting, track
+    filtering and renumbering), the former `pretreat_data`.
+    """
+    def setup(case):
+        return (case["raw"].copy(), case["values"])
+
+    def run(raw, values):
+        prepare_tracks(raw, values)
+
+    return setup, run
+
+
+def features_benchmark():
+    """
+    Benchmark of the per-cell feature extraction of the statistics module.
+    """
+    def setup(case):
+        kinematics_cache.clear()
+        return (case["raw"], case["values"]["time_interval"])
+
+    def run(data, time_interval):
+        cell_features(data, "synthetic", time_interval)
+
+    return setup, run
+
+
+def read_workbook_benchmark():
+    """
+    Benchmark of loading and validating a workbook, the path used when opening a file.
+    """
+    def setup(case):
+        return (case["workbook"],)
+
+    def run(path):
+        read_workbook(path, cache=None)
+
+    return setup, run
+
+
+def read_workbook_cached_benchmark():
+    """
+    Benchmark of loading a workbook opened before, from the on-disk cache of the sheets.
+    """
+    def setup(case):
+        cache = WorkbookCache(case["workdir"] / "cache")
+        if cache.load(case["workbook"]) is None:
+            read_workbook(case["workbook"], cache=cache)
+        return (case["workbook"], cache)
+
+    def run(path, cache):
+        read_workbook(path, cache=cache)
+
+    return setup, run
+
+
+def save_page_benchmark():
+    """
+    Benchmark of `UIFile._save_page_to_file` on a page with one sheet, until the
+    background save is done.
+    """
+    def setup(case):
+        return (case["page"], case["workdir"] / "saved.xlsx")
+
+    def run(page, path):
+        from PyQt6.QtCore import QThreadPool
+
+        qt = qt_objects()
+        qt["file"]._save_page_to_file(page, path)
+        while qt["file"].save_worker is not None:
+            QThreadPool.globalInstance().waitForDone(10)
+            qt["app"].processEvents()
+
+    return setup, run
+
+
+def sheet_paint_benchmark():
+    """
+    Benchmark of the display strings a table view asks its DataModel for: a window of
+    40 rows at 100 scroll positions over the sheet, each painted twice.
+    """
+    def setup(case):
+        from src.data_model import DataModel
+
+        qt_objects()
+        return (DataModel(case["raw"], copy=True),)
+
+    def run(model):
+        n_rows, n_columns = model.rowCount(), model.columnCount()
+        for start in np.linspace(0, max(n_rows - 40, 0), 100).astype(int):
+            for _ in range(2):
+                for row in range(start, min(start + 40, n_rows)):
+                    for column in range(n_columns):
+                        model.data(model.index(row, column))
+
+    return setup, run
+
+
+BENCHMARKS = {
+    "prepare_tracks": prepare_tracks_benchmark(),
+    **{analysis: analysis_benchmark(analysis) for analysis in ANALYSES},
+    "features": features_benchmark(),
+    "read_workbook": read_workbook_benchmark(),
+    "read_workbook_cached": read_workbook_cached_benchmark(),
+    "save_page": save_page_benchmark(),
+    "sheet_paint": sheet_paint_benchmark(),
+}
+
+
+_qt = {}
+
+
+def qt_objects():
+    """
+    Creates the QApplication and a UIFile handler on an offscreen main window once.
+
+    Returns:
+        dict: 'app', 'window' and 'file'.
+    """
+    if not _qt:
+        from PyQt6.QtWidgets import QApplication, QMainWindow
+        from ui.main_window.main_window import Ui_MainWindow
+        from src.ui_file import UIFile
+
+        _qt["app"] = QApplication.instance() or QApplication([])
+        _qt["window"] = QMainWindow()
+        ui = Ui_MainWindow()
+        ui.setupUi(_qt["window"])
+        _qt["file"] = UIFile(ui)
+    return _qt
+
+
+def make_page(df):
+    """
+    Builds a file page like `UIFile.open_file` does, with one sheet showing `df`.
+
+    Args:
+        df (pd.DataFrame): Sheet data.
+
+    Returns:
+        QWidget: The page.
+    """
+    from PyQt6.QtWidgets import QWidget, QVBoxLayout, QTabWidget, QTableView
+    from src.data_model import DataModel
+
+    qt_objects()
+    page = QWidget()
+    layout = QVBoxLayout(page)
+    tab_widget = QTabWidget()
+    layout.addWidget(tab_widget)
+    table = QTableView()
+    table.setModel(DataModel(df))
+    tab_widget.addTab(table, "synthetic")
+    return page
+
+
+def measure(setup, run, case, repeat):
+    """
+    Times a benchmark and records its peak memory.
+
+    The best of `repeat` runs is kept as the time. The peak memory comes from one more
+    run traced with tracemalloc, so tracing does not slow down the timed runs.
+
+    Args:
+        setup (callable): Returns the arguments of `run` for a case, not timed.
+        run (callable): The measured code.
+        case (dict): Inputs of the size being measured.
+        repeat (int): Number of timed runs.
+
+    Returns:
+        tuple: (seconds, peak_bytes)
+    """
+    times = []
+    for _ in range(repeat):
+        args = setup(case)
+        start = time.perf_counter()
+        run(*args)
+        times.append(time.perf_counter() - start)
+
+    args = setup(case)
+    tracemalloc.start()
+    try:
+        run(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(times), peak
+
+
+def make_case(model, n_tracks, n_frames, workdir, with_io):
+    """
+    Generates the inputs of all benchmarks for one size.
+
+    Args:
+        model (str): Walk model, see WALK_MODELS.
+        n_tracks (int): Number of tracks.
+        n_frames (int): Number of slices per track.
+        workdir (Path): Directory for the files written by the benchmarks.
+        with_io (bool): Also write the workbook and build the page for the IO benchmarks.
+
+    Returns:
+        dict: Inputs shared by the benchmarks.
+    """
+    raw = generate(model, n_tracks, n_frames, seed=n_tracks)
+    values = {**DEFAULT_VALUES, "n_time_points": n_frames, "n_tracks": n_tracks}
+    data, _, _ = prepare_tracks(raw.copy(), values)
+    case = {"raw": raw, "data": data, "values": values, "workdir": workdir}
+
+    if with_io:
+        case["workbook"] = workdir / f"synthetic_{n_tracks}.xlsx"
+        raw.to_excel(case["workbook"], sheet_name="synthetic", index=False)
+        case["page"] = make_page(raw.copy())
+    return case
+
+
+def git_revision():
+    """
+    Returns the short hash of the checked-out commit, "unknown" outside of a git checkout.
+    """
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=base_path,
+                                capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def run_benchmarks(names, tracks, n_frames, model, repeat, io_max_tracks):
+    """
+    Runs the benchmarks for every number of tracks.
+
+    Args:
+        names (list of str): Keys of BENCHMARKS.
+        tracks (list of int): Numbers of tracks to generate.
+        n_frames (int): Number of slices per track.
+        model (str): Walk model.
+        repeat (int): Number of timed runs of each benchmark.
+        io_max_tracks (int): Largest number of tracks for the Excel benchmarks.
+
+    Returns:
+        list of dict: One record per benchmark and size.
+    """
+    records = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for n_tracks in tracks:
+            with_io = n_tracks <= io_max_tracks and any(name in IO_BENCHMARKS for name in names)
+            case = make_case(model, n_tracks, n_frames, Path(workdir), with_io)
+
+            for name in names:
+                if name in IO_BENCHMARKS and not with_io:
+                    continue
+                setup, run = BENCHMARKS[name]
+                seconds, peak = measure(setup, run, case, repeat)
+                record = {"name": name, "n_tracks": n_tracks, "n_rows": len(case["raw"]),
+                          "seconds": seconds, "peak_mb": peak / 2**20}
+                records.append(record)
+                print(f"{name:>22} {n_tracks:>8} tracks {seconds * 1000:>11.1f} ms {record['peak_mb']:>9.1f} MB", flush=True)
+    return records
+
+
+def compare(records, previous, threshold):
+    """
+    Prints the time of each benchmark against a previous run and flags regressions.
+
+    Args:
+        records (list of dict): Results of this run.
+        previous (dict): Content of a previous results file.
+        threshold (float): Ratio of times above which a benchmark is a regression.
+
+    Returns:
+        int: Number of regressions.
+    """
+    before = {(r["name"], r["n_tracks"]): r for r in previous["results"]}
+    print(f"\nCompared with {previous['meta']['revision']} ({previous['meta']['date']}):")
+    regressions = 0
+    for record in records:
+        old = before.get((record["name"], record["n_tracks"]))
+        if old is None:
+            continue
+        ratio = record["seconds"] / old["seconds"] if old["seconds"] > 0 else np.inf
+        flag = ""
+        if ratio > threshold:
+            flag = "  <-- slower"
+            regressions += 1
+        print(f"{record['name']:>22} {record['n_tracks']:>8} tracks {old['seconds'] * 1000:>11.1f} -> "
+              f"{record['seconds'] * 1000:>11.1f} ms (x{ratio:.2f}){flag}")
+    return regressions
+
+
+def latest_results(directory):
+    """
+    Returns the most recent results file of a directory, or None.
+    """
+    files = sorted(Path(directory).glob("*.json"))
+    return files[-1] if files else None
+
+
+def parse_args(argv=None):
+    """
+    Parse the command line of the benchmark runner.
+
+    Args:
+        argv (list of str, optional): Arguments, defaults to sys.argv[1:].
+
+    Returns:
+        argparse.Namespace: Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Time the analyses, the statistics features and the Excel load/save path on synthetic trajectories.")
+    parser.add_argument("-b", "--benchmarks", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS),
+                        help="Benchmarks to run (default: all).")
+    parser.add_argument("-t", "--tracks", nargs="+", type=int, default=[10, 100, 1000, 10000, 100000],
+                        help="Numbers of tracks to generate (default: 10 100 1000 10000 100000).")
+    parser.add_argument("-f", "--frames", type=int, default=40, help="Slices per track (default: 40).")
+    parser.add_argument("-m", "--model", choices=WALK_MODELS, default=WALK_MODELS[0],
+                        help="Trajectory model (default: persistent).")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Timed runs per benchmark, the best is kept (default: 3).")
+    parser.add_argument("--io-max-tracks", type=int, default=1000,
+                        help="Largest number of tracks for the Excel benchmarks (default: 1000).")
+    parser.add_argument("-o", "--output", default=str(RESULTS_DIR), help="Directory where results are stored.")
+    parser.add_argument("-c", "--compare", nargs="?", const="latest",
+                        help="Results file to compare with (default: the latest one in the output directory).")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="Slow-down ratio reported as a regression (default: 1.25).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    previous = None
+    if args.compare:
+        path = latest_results(args.output) if args.compare == "latest" else Path(args.compare)
+        if path is None or not path.exists():
+            print(f"Error: no results to compare with ({args.compare}).", file=sys.stderr)
+            return 2
+        previous = json.loads(path.read_text())
+
+    records = run_benchmarks(args.benchmarks, args.tracks, args.frames, args.model, args.repeat, args.io_max_tracks)
+
+    now = datetime.datetime.now()
+    revision = git_revision()
+    results = {
+        "meta": {
+            "date": now.isoformat(timespec="seconds"),
+            "revision": revision,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.platform(),
+            "frames": args.frames,
+            "model": args.model,
+            "repeat": args.repeat,
+        },
+        "results": records,
+    }
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+    path = output / f"{now:%Y%m%d-%H%M%S}_{revision}.json"
+    path.write_text(json.dumps(results, indent=2))
+    print(f"Results written to {path}")
+
+    if previous is not None and compare(records, previous, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
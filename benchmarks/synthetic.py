@@ -0,0 +1,100 @@
+# This code generates synthetic trajectories in the input format of the application
+# (columns 'Track n', 'Slice n', 'X', 'Y'), for benchmarks and examples
+
+
+import numpy as np
+import pandas as pd
+
+WALK_MODELS = ("persistent", "random")
+
+
+def random_walk(n_tracks, n_frames, step_size=1.0, seed=None):
+    """
+    Generates isotropic random walks: independent Gaussian steps in X and Y.
+
+    Args:
+        n_tracks (int): Number of tracks (cells).
+        n_frames (int): Number of slices per track.
+        step_size (float, optional): Standard deviation of a step along each axis.
+        seed (int, optional): Seed of the random generator.
+
+    Returns:
+        pd.DataFrame: Trajectories sorted by track and slice.
+    """
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(0.0, step_size, size=(2, n_tracks, n_frames))
+    steps[:, :, 0] = 0.0
+    start = rng.uniform(0.0, 1000.0, size=(2, n_tracks, 1))
+    x, y = start + np.cumsum(steps, axis=2)
+    return to_frame(x, y)
+
+
+def persistent_random_walk(n_tracks, n_frames, speed=1.0, persistence=0.9, seed=None):
+    """
+    Generates persistent random walks: steps of constant length whose direction turns by
+    a Gaussian angle at every slice. The turning angle is chosen so that the mean cosine
+    between consecutive directions equals `persistence`, which makes the direction
+    autocorrelation decay as persistence**step.
+
+    Args:
+        n_tracks (int): Number of tracks (cells).
+        n_frames (int): Number of slices per track.
+        speed (float, optional): Length of a step.
+        persistence (float, optional): Mean cosine of the turning angle, in (0, 1].
+        seed (int, optional): Seed of the random generator.
+
+    Returns:
+        pd.DataFrame: Trajectories sorted by track and slice.
+    """
+    rng = np.random.default_rng(seed)
+    sigma = np.sqrt(-2.0 * np.log(persistence))
+    turns = rng.normal(0.0, sigma, size=(n_tracks, n_frames))
+    turns[:, 0] = rng.uniform(0.0, 2 * np.pi, size=n_tracks)
+    heading = np.cumsum(turns, axis=1)
+
+    step_x = speed * np.cos(heading)
+    step_y = speed * np.sin(heading)
+    step_x[:, 0] = 0.0
+    step_y[:, 0] = 0.0
+    start = rng.uniform(0.0, 1000.0, size=(2, n_tracks, 1))
+    return to_frame(start[0] + np.cumsum(step_x, axis=1), start[1] + np.cumsum(step_y, axis=1))
+
+
+def to_frame(x, y):
+    """
+    Lays out (n_tracks, n_frames) coordinate matrices as input rows.
+
+    Args:
+        x (np.ndarray): X of every track (rows) and slice (columns).
+        y (np.ndarray): Y of every track (rows) and slice (columns).
+
+    Returns:
+        pd.DataFrame: Columns 'Track n', 'Slice n', 'X', 'Y', tracks and slices numbered from 1.
+    """
+    n_tracks, n_frames = x.shape
+    return pd.DataFrame({
+        "Track n": np.repeat(np.arange(1, n_tracks + 1), n_frames).astype(float),
+        "Slice n": np.tile(np.arange(1, n_frames + 1), n_tracks).astype(float),
+        "X": x.ravel(),
+        "Y": y.ravel(),
+    })
+
+
+def generate(model, n_tracks, n_frames, seed=None):
+    """
+    Generates trajectories with one of `WALK_MODELS`.
+
+    Args:
+        model (str): "persistent" or "random".
+        n_tracks (int): Number of tracks (cells).
+        n_frames (int): Number of slices per track.
+        seed (int, optional): Seed of the random generator.
+
+    Returns:
+        pd.DataFrame: Trajectories sorted by track and slice.
+    """
+    if model == "persistent":
+        return persistent_random_walk(n_tracks, n_frames, seed=seed)
+    if model == "random":
+        return random_walk(n_tracks, n_frames, seed=seed)
+    raise ValueError(f"Unknown walk model {model}, expected one of {WALK_MODELS}")
@@ -1,6 +1,7 @@
 from PyQt6.QtWidgets import QApplication, QMainWindow, QMessageBox
 from PyQt6.QtGui import QShortcut, QKeySequence
 from PyQt6.QtCore import Qt
+import multiprocessing
 import os
 
 from logs.logger import app_logger as logger
@@ -115,13 +116,7 @@ class CellMigration(QMainWindow):
 
                 for j in range(item.childCount()):
                     stack.append(item.child(j))
-            
-        temp_path = os.path.join(os.getcwd(), "tmp")
-        if os.path.exists(temp_path):
-            for filename in os.listdir(temp_path):
-                file_path = os.path.join(temp_path, filename)
-                if os.path.isfile(file_path):
-                    os.remove(file_path)
+
         logger.info(f"Closed Application")
         event.accept() 
 
@@ -129,6 +124,8 @@ class CellMigration(QMainWindow):
 
 if __name__ == '__main__':
     import sys
+    # Needed by the analysis process pool in the packaged application
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = CellMigration()
     window.show()
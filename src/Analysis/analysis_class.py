@@ -1,10 +1,9 @@
-import pandas as pd
 import os
 
 from PyQt6.QtWidgets import (
-    QWidget, QDialog, QMessageBox, QTreeWidgetItem, QTabWidget
+    QWidget, QDialog, QMessageBox, QTreeWidgetItem, QTabWidget, QProgressDialog
 )
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QThreadPool
 
 from logs.logger import app_logger as logger
 
@@ -13,10 +12,11 @@ from ui.configuration.choose_sample_window import Ui_ChooseSampleWindow
 
 from src.Plot.plot import PlotDialog
 from src.data_model import DataModel
-from src.Analysis.autocorrelation import Autocorrelation, plot_scalar_averages
-from src.Analysis.speed import Speed, plot_speed
-from src.Analysis.msd import MSD, plot_msd
-from src.Analysis.dir_ratio import DirRatio, plot_dir_ratio
+from src.Analysis.pipeline import ANALYSES, result_label, plot_results
+from src.Analysis.incremental import TrackResults
+from src.Analysis.results import results_table
+from src.utils.track_store import LARGE_ROWS
+from src.Analysis.worker import AnalysisWorker
 from src.Plot.trajectories import plot_trajectories
 
 class UIAnalysis(QWidget):
@@ -85,11 +85,15 @@ class UIAnalysis(QWidget):
             n_time_points = int(ui.lineEdit_n_time_points.text())
             n_tracks = int(ui.lineEdit_n_tracks.text())
             n_plot_points = int(ui.lineEdit_n_plot_points.text())
+            n_workers = int(ui.lineEdit_n_workers.text())
+            if n_workers < 1:
+                raise ValueError(f"Number of processes must be at least 1, got {n_workers}")
             return {
                 "time_interval": time_interval,
                 "n_time_points": n_time_points,
                 "n_tracks": n_tracks,
-                "n_plot_points": n_plot_points
+                "n_plot_points": n_plot_points,
+                "n_workers": n_workers
             }
         except ValueError as e:
             logger.warning(f"Invalid input in configuration: {e}")
@@ -151,71 +155,28 @@ class UIAnalysis(QWidget):
             else:
                 return None
 
-    def pretreat_data(self, df, filename):
-        """
-        Clean and preprocess the input DataFrame.
-
-        Args:
-            df (pd.DataFrame): Raw input data.
-            filename (tuple): (filename, sheetname)
-
-        Returns:
-            pd.DataFrame or None: Cleaned data or None if invalid.
-        """
-        try:
-            df.dropna(subset=["Track n", "Slice n"], inplace=True)
-            df["Track n"] = df["Track n"].astype(int)
-            df["Slice n"] = df["Slice n"].astype(int)
-            df["X"] = pd.to_numeric(df["X"], errors='coerce')
-            df["Y"] = pd.to_numeric(df["Y"], errors='coerce')
-        except Exception as e:
-            logger.error(f"Error while treating data: {e}")
-            QMessageBox.warning(self, "Error", f"Incorrect type of data in columns Track n or Slice n:\n{e}")
-            return None
-        
-        # Treat track
-        cleaned_rows = []
-        missing_tracks = []
-        for track_id in sorted(df["Track n"].unique()):
-            track_df = df[df["Track n"] == track_id].sort_values("Slice n")
-            if len(track_df) < self.values['n_time_points']:
-                missing_tracks.append(track_id)
-            else:
-                cleaned_rows.append(track_df.iloc[:self.values['n_time_points']])
-
-        result_df = pd.concat(cleaned_rows, ignore_index=True)
-
-        # Check number of tracks
-        if len(df["Track n"].unique()) < self.values['n_tracks']:
-            logger.warning(f"Track count mismatch in {filename}: expected {self.values['n_tracks']}, found {len(df['Track n'].unique())}")
-            QMessageBox.warning(self, "Warning", f"{filename[0]} {filename[1]} expected {self.values['n_tracks']} tracks, found {len(df['Track n'].unique())}.")
-
-        if missing_tracks:
-            logger.warning(f"Missing slices for tracks in {filename}: {missing_tracks}")
-            QMessageBox.warning(self, "Warning", f"{filename[0]} {filename[1]} Folowing tracks have less than {self.values['n_time_points']} slices: {missing_tracks}")
-
-        return result_df
-
     def run_analysis(self, analysis):
         """
-        Run the selected analysis and update the interface with the results.
+        Collect the selected samples and run the analysis in a background worker.
+        A progress dialog shows the sample in progress and allows cancelling the run.
 
         Args:
             analysis (str): Type of analysis to perform.
         """
         logger.info(f"Running analysis: {analysis}")
 
-        self.all_scalar_data = []
-        self.speed_data_by_condition = []
-        self.avg_msd_data = []
-        self.avg_dir_data = []
+        self.results = []
         self.trajectories_dialogs = []
         self.plot_dialogs = []
+        self.sample_tables = []
+        self.sample_errors = []
+        self.samples_done = 0
 
         if self.values['time_interval'] == 0 or self.values['n_plot_points'] == 0:
             logger.warning("Invalid analysis parameters: time interval or n plot points is 0.")
             QMessageBox.warning(self, "Error", "Please, input correct parameters.")
 
+        samples = []
         for filename in self.selected_samples:
             # Find sheet
             index = None
@@ -239,75 +200,162 @@ class UIAnalysis(QWidget):
                 logger.warning(f"No DataFrame found for: {filename}")
                 continue
 
-            original_df = data_model.get_dataframe()
-
-            data = self.pretreat_data(original_df, filename)
-            if data is None:
+            error = data_model.validate()
+            if error is not None:
+                logger.error(f"Not correct data in the sheet '{filename[1]}', sheet skipped: {error}")
+                QMessageBox.critical(self, "Error", f"Not correct data in the sheet '{filename[1]}', sheet skipped: {error}")
                 continue
-            
-            try: 
-                # Perform the selected analysis
-                if analysis == "Autocorrelation":
-                    autocorr_data = Autocorrelation(data, self.values)
-                    self.all_scalar_data.append((autocorr_data.data, f"{filename[0]} {filename[1]}"))
-                    data = autocorr_data.data
-                
-                if analysis == "MSD":
-                    msd_data = MSD(data, self.values)
-                    self.avg_msd_data.append((msd_data.data, f"{filename[1]}"))
-                    data = msd_data.data
-                
-                if analysis == "Speed":
-                    speed_data = Speed(data, self.values)
-                    self.speed_data_by_condition.append((speed_data.data, f"{filename[1]}"))
-                    data = speed_data.data
-                    
-                if analysis == "Directionality_Ratio":
-                    dir_data = DirRatio(data, self.values)
-                    self.avg_dir_data.append((dir_data.data, f"{filename[1]}"))
-                    data = dir_data.data
-
-                if analysis == "Trajectories":
-                    dialog = PlotDialog(filename, analysis, title=f"{analysis} {filename[1]}")
-                    dialog.show_plot(lambda ax: plot_trajectories(ax, data, self.values, filename[1]))
-                    dialog.show()
-
-                    # Save pointer so the dialog won't close automatically
-                    self.trajectories_dialogs.append(dialog)
-            except Exception as e:
-                logger.exception(f"Analysis Module : problem with {analysis} : {e}")
-                QMessageBox.warning(self, "Error", e)
-
-            #Update table in tab:
-            new_model = DataModel(data)
-            table.setModel(new_model)
-
-            # Reset unsaved change flags in the tree
-            tree_item = getattr(table, "tree_item", None)
-            data = tree_item.data(0, Qt.ItemDataRole.UserRole) or {}
-            data["unsaved_changes"] = True
-            tree_item.setData(0, Qt.ItemDataRole.UserRole, data)
-            
-        # create plot Dialog
-        dialog = PlotDialog(filename, analysis, title=f"{analysis} Plot")
 
-        if analysis == "Autocorrelation":
-            dialog.show_plot(lambda ax: plot_scalar_averages(ax, self.all_scalar_data))
+            # Widgets stay in the GUI thread, the worker only receives copies of the data:
+            # large sheets are written to memory-mapped files and analysed chunk by chunk
+            if analysis in ANALYSES and data_model.n_rows > LARGE_ROWS:
+                try:
+                    samples.append((filename, data_model.to_track_store()))
+                except Exception as e:
+                    logger.error(f"Cannot write the sheet '{filename[1]}' to disk: {e}")
+                    QMessageBox.critical(self, "Error", f"Cannot write the sheet '{filename[1]}' to disk:\n{e}")
+                    continue
+            else:
+                samples.append((filename, data_model.get_dataframe()))
+            self.sample_tables.append(table)
+
+        if not samples:
+            return
+
+        self.analysis = analysis
+        self.worker = AnalysisWorker(analysis, samples, self.values)
+        self.worker.signals.sample_started.connect(self.on_sample_started)
+        self.worker.signals.sample_done.connect(self.on_sample_done)
+        self.worker.signals.finished.connect(self.on_analysis_finished)
+
+        self.progress = QProgressDialog(f"Running {analysis}...", "Cancel", 0, len(samples), self)
+        self.progress.setWindowTitle(f"{analysis}")
+        self.progress.setWindowModality(Qt.WindowModality.WindowModal)
+        self.progress.setMinimumDuration(0)
+        self.progress.setAutoClose(False)
+        self.progress.setAutoReset(False)
+        self.progress.canceled.connect(self.worker.cancel)
+        self.progress.setValue(0)
+
+        QThreadPool.globalInstance().start(self.worker)
+
+    def on_sample_started(self, i, name):
+        """
+        Show which sample the worker is analysing.
+
+        Args:
+            i (int): Index of the sample.
+            name (str): "file sheet" description of the sample.
+        """
+        if self.values.get('n_workers', 1) > 1:
+            # Samples run side by side in the process pool, only completions are meaningful
+            self.progress.setLabelText(f"{self.analysis}: {len(self.sample_tables)} samples on {self.values['n_workers']} processes")
+        else:
+            self.progress.setLabelText(f"{self.analysis}: {name} ({i + 1}/{len(self.sample_tables)})")
+
+    def on_sample_done(self, i, data, results, warnings, error):
+        """
+        Apply the result of one sample: show warnings, update the table and open
+        the trajectory plot if needed. Runs in the GUI thread.
+
+        Args:
+            i (int): Index of the sample.
+            data (pd.DataFrame | None): Analysed data, None if the sample failed or was
+                analysed from a TrackStore.
+            results (AnalysisResults | None): Per-track values and condition summary of the analysis.
+            warnings (list of str): Warnings raised while preparing the tracks.
+            error (str): Error message, empty on success.
+        """
+        filename = self.worker.samples[i][0]
+        table = self.sample_tables[i]
+
+        # Apply the result before anything that spins the event loop (progress, message boxes),
+        # otherwise the next sample or the end of the run could be handled first
+        failed = data is None and results is None
+        if failed:
+            self.sample_errors.append(f"{filename[0]} {filename[1]}: {error}")
+        else:
+            self.apply_sample_result(i, filename, table, data, results)
+
+        self.progress.setValue(self.samples_done + len(self.sample_errors))
 
-        if analysis == "Speed":
-            dialog.show_plot(lambda ax: plot_speed(ax, self.speed_data_by_condition))
+        for warning in warnings:
+            QMessageBox.warning(self, "Warning", f"{filename[0]} {filename[1]} {warning}")
+        if failed:
+            QMessageBox.warning(self, "Error", f"{filename[0]} {filename[1]}:\n{error}")
 
-        if analysis == "MSD":
-            dialog.show_plot(lambda ax: plot_msd(ax, self.avg_msd_data, self.values))
+    def apply_sample_result(self, i, filename, table, data, results=None):
+        """
+        Store the analysed data, update the sheet table and open the trajectory plot if needed.
 
-        if analysis == "Directionality_Ratio":
-            dialog.show_plot(lambda ax: plot_dir_ratio(ax, self.avg_dir_data, self.values))
-        
-        if analysis != "Trajectories":
+        Args:
+            i (int): Index of the sample.
+            filename (tuple): (filename, sheetname)
+            table (QTableView): Table showing the sheet.
+            data (pd.DataFrame | None): Analysed data, None for a sheet analysed from a
+                TrackStore, whose table keeps its model.
+            results (AnalysisResults, optional): Results kept with the sheet, for the plot,
+                the exports and the update of edited tracks.
+        """
+        analysis = self.analysis
+        self.samples_done += 1
+        if results is not None:
+            self.results.append((i, results.summary, result_label(analysis, filename)))
+
+        if analysis == "Trajectories":
+            dialog = PlotDialog(filename, analysis, title=f"{analysis} {filename[1]}")
+            dialog.show_plot(lambda ax: plot_trajectories(ax, data, self.values, filename[1]))
+            dialog.show()
+
+            # Save pointer so the dialog won't close automatically
+            self.trajectories_dialogs.append(dialog)
+
+        if data is None:
+            table.model().track_results[analysis] = TrackResults.from_results(results)
+            return
+
+        #Update table in tab, the trajectories dialog keeps plotting `data`:
+        new_model = DataModel(data, copy=analysis == "Trajectories")
+        new_model.inherit_track_results(table.model())
+        new_model.inherit_view(table.model())
+        if results is not None:
+            new_model.track_results[analysis] = TrackResults.from_results(results)
+        table.setModel(new_model)
+
+        # Reset unsaved change flags in the tree
+        tree_item = getattr(table, "tree_item", None)
+        if tree_item is not None:
+            flags = tree_item.data(0, Qt.ItemDataRole.UserRole) or {}
+            flags["unsaved_changes"] = True
+            tree_item.setData(0, Qt.ItemDataRole.UserRole, flags)
+
+    def on_analysis_finished(self, cancelled):
+        """
+        Close the progress dialog and plot the results of the analysed samples.
+
+        Args:
+            cancelled (bool): True if the user cancelled the run.
+        """
+        analysis = self.analysis
+        self.progress.close()
+
+        status = f"{analysis}: {self.samples_done}/{len(self.sample_tables)} samples analysed"
+        if self.sample_errors:
+            status += f", {len(self.sample_errors)} failed"
+        if cancelled:
+            status += ", cancelled"
+            logger.info(f"Analysis {analysis} cancelled.")
+        self.ui.statusbar.showMessage(status)
+
+        if analysis in ANALYSES and self.results:
+            # Samples may complete out of order in the process pool, plot them in selection order
+            results = [(summary, label) for _, summary, label in sorted(self.results, key=lambda result: result[0])]
+
+            # create plot Dialog
+            dialog = PlotDialog(self.worker.samples[-1][0], analysis, title=f"{analysis} Plot")
+            dialog.data = results_table(results)
+            dialog.show_plot(lambda ax: plot_results(ax, analysis, results, self.values))
             dialog.show()
             self.plot_dialogs.append(dialog)
 
         logger.info(f"Analysis {analysis} completed.")
-
-        
-        
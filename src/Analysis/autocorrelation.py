@@ -1,6 +1,8 @@
 import numpy as np
-import re
 from logs.logger import app_logger as logger
+from src.Analysis.results import condition_mean_sem, summary_table
+from src.utils.kinematics import get_kinematics
+from src.utils.track_table import TrackTable
 
 class Autocorrelation():
     """
@@ -11,15 +13,21 @@ class Autocorrelation():
         values (dict): Dictionary containing the following keys:
             - time_interval (float): Time between slices.
             - n_plot_points (int): Number of points for which to compute autocorrelation.
+        table (TrackTable, optional): Track index of `data`. Built from `data` if not given.
 
     Attributes:
-        data (pd.DataFrame): Modified dataframe with autocorrelation results added.
+        data (pd.DataFrame): Modified dataframe with the per-row direction vectors added.
         values (dict): Input parameter dictionary.
+        table (TrackTable): Track index shared by the normalization and scalar steps.
+        track_values (np.ndarray): (n_tracks, n_plot_points) average scalar product of each track.
+        summary (pd.DataFrame): Condition average and SEM of the scalar products for steps
+            1..n_plot_points, see `summary_table`.
     """
-    def __init__(self, data, values):
+    def __init__(self, data, values, table=None):
         super().__init__()
         self.data = data
         self.values = values
+        self.table = table if table is not None else TrackTable(data)
 
         self.autocorrelation()
 
@@ -35,83 +43,102 @@ class Autocorrelation():
     def norm(self):
         """
         Normalizes movement vectors per track, computing ΔX, ΔY, magnitude, cos(θ), sin(θ).
-        Adds or recalculates these columns in self.data.
+        The values come from the shared kinematics cache and are written to self.data.
         """
-        calculate_dxdy = False
-
-        if 'ΔX' not in self.data.columns or 'ΔY' not in self.data.columns:
-            self.data['ΔX'] = np.nan
-            self.data['ΔY'] = np.nan
-            calculate_dxdy = True
-
-        self.data["magnitude"] = np.nan
-        self.data["cos_theta"] = np.nan
-        self.data["sin_theta"] = np.nan
-
-        for track_id in sorted(self.data["Track n"].unique()):
-            track_df = self.data[self.data["Track n"] == track_id].sort_values("Slice n")
-            # Calculate ΔX and ΔY only if needed
-            if calculate_dxdy:
-                track_df['ΔX'] = track_df['X'].diff()
-                track_df['ΔY'] = track_df['Y'].diff()
-            self.data.loc[track_df.index, 'ΔX'] = track_df["ΔX"].values
-            self.data.loc[track_df.index, 'ΔY'] = track_df["ΔY"].values
-            
-            # Compute magnitude and angle components
-            track_df['magnitude'] = np.sqrt(track_df['ΔX']**2 + track_df['ΔY']**2)
-            self.data.loc[track_df.index, 'magnitude'] = track_df['magnitude'].values
-
-            track_df['cos_theta'] = track_df['ΔX'] / track_df['magnitude']
-            track_df['sin_theta'] = track_df['ΔY'] / track_df['magnitude']
-            self.data.loc[track_df.index, 'cos_theta'] = track_df['cos_theta'].values
-            self.data.loc[track_df.index, 'sin_theta'] = track_df['sin_theta'].values
+        table = self.table
+
+        kinematics = get_kinematics(table, self.values['time_interval'])
+        self.cos_theta = kinematics.cos_theta
+        self.sin_theta = kinematics.sin_theta
+
+        self.data['ΔX'] = table.scatter(kinematics.delta_x)
+        self.data['ΔY'] = table.scatter(kinematics.delta_y)
+        self.data["magnitude"] = table.scatter(kinematics.distance)
+        self.data["cos_theta"] = table.scatter(self.cos_theta)
+        self.data["sin_theta"] = table.scatter(self.sin_theta)
     
     def scalars(self):
         """
         Computes dot product (cosine similarity) between normalized direction vectors
-        for increasing step sizes. Stores averages and SEM in the data.
+        for increasing step sizes. Stores averages and SEM in `summary`.
         """
-        for step in range(1, self.values['n_plot_points'] + 1):
-            time_label = f"time_{step * self.values['time_interval']}"
-            col_name = f"scalar_{time_label}"
-            
-            # Инициализируем колонку
-            self.data[col_name] = np.nan
-            avg_scalars = []
-            avg_sem = []
-            for track_id in sorted(self.data["Track n"].unique()):
-                track_df = self.data[self.data["Track n"] == track_id].sort_values("Slice n").reset_index()
+        n_steps = self.values['n_plot_points']
+        self.track_scalars, self.track_scalars_sem, self.track_scalars_count = direction_scalars(
+            self.table, self.cos_theta, self.sin_theta, n_steps)
 
-                dx = track_df['cos_theta'].to_numpy()
-                dy = track_df['sin_theta'].to_numpy()
-                scalars = []
+        self.track_values = self.track_scalars
+        self.summary = scalars_summary(self.track_values, self.values)
 
-                for i in range(len(track_df) - step):
-                    v1 = np.array([dx[i], dy[i]])
-                    v2 = np.array([dx[i + step], dy[i + step]])
 
-                    if np.any(np.isnan(v1)) or np.any(np.isnan(v2)):
-                        continue
+def scalars_summary(track_values, values):
+    """
+    Computes the condition average and SEM of the scalar products from the per-track averages.
 
-                    scalar = np.dot(v1, v2)
-                    scalars.append(scalar)
+    Args:
+        track_values (np.ndarray): (n_tracks, n_plot_points) average scalar product of each track.
+        values (dict): Parameters with 'time_interval' and 'n_plot_points'.
+
+    Returns:
+        pd.DataFrame: Condition summary for steps 1..n_plot_points, see `summary_table`.
+    """
+    mean, sem, n = condition_mean_sem(track_values)
+    steps = np.arange(1, values['n_plot_points'] + 1)
+    return summary_table(steps, values['time_interval'], mean, sem, n)
 
-                if scalars:
-                    avg = np.mean(scalars)
-                    err = np.std(scalars, ddof=1) / np.sqrt(len(scalars))
 
-                    avg_scalars.append(avg)
-                    avg_sem.append(err)
+def direction_scalars(table, cos_theta, sin_theta, n_steps, block_size=2**22):
+    """
+    Computes the scalar products between direction vectors `step` frames apart for all
+    steps and all tracks at once.
 
+    For a block of steps, the partner of every row is looked up in a (rows x steps) lag
+    matrix; pairs crossing a track boundary or containing NaN are masked, and the products
+    are summed per track with a single reduction. Steps are processed in blocks so the lag
+    matrix holds at most `block_size` elements.
 
-            if avg_scalars:
-                avg = np.mean(avg_scalars)
-                err = np.std(avg_scalars, ddof=1) / np.sqrt(len(avg_scalars))
-                combined = f"{avg:.3f} ± {err:.3f}"
+    Args:
+        table (TrackTable): Track index of the data.
+        cos_theta (np.ndarray): cos(θ) of the movement vector for the sorted rows.
+        sin_theta (np.ndarray): sin(θ) of the movement vector for the sorted rows.
+        n_steps (int): Largest step (in frames) to compute.
+        block_size (int, optional): Maximum number of elements of the lag matrix.
 
-                # Save results to data (first 2 rows only used to hold mean and SEM)
-                self.data.loc[0, col_name] = avg
-                self.data.loc[1, col_name] = err
+    Returns:
+        tuple: (mean, sem, count) arrays of shape (n_tracks, n_steps). Column k holds step k + 1;
+        mean and sem are NaN where a track has no valid pair for the step.
+    """
+    n_rows = len(table)
+    sums = np.zeros((table.n_tracks, n_steps))
+    squares = np.zeros((table.n_tracks, n_steps))
+    counts = np.zeros((table.n_tracks, n_steps))
+
+    if n_rows and n_steps > 0:
+        rows = np.arange(n_rows)[:, None]
+        track_stop = np.repeat(table.offsets[1:], table.lengths)[:, None]
+        block = max(1, block_size // n_rows)
+
+        for first in range(0, n_steps, block):
+            steps = np.arange(first + 1, min(first + block, n_steps) + 1)
+            partner = rows + steps
+            inside = partner < track_stop
+            partner = np.minimum(partner, n_rows - 1)
+
+            products = cos_theta[:, None] * cos_theta[partner] + sin_theta[:, None] * sin_theta[partner]
+            valid = inside & ~np.isnan(products)
+            products = np.where(valid, products, 0.0)
+
+            columns = slice(first, first + len(steps))
+            sums[:, columns] = np.add.reduceat(products, table.starts, axis=0)
+            squares[:, columns] = np.add.reduceat(products**2, table.starts, axis=0)
+            counts[:, columns] = np.add.reduceat(valid, table.starts, axis=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = sums / counts
+        variance = np.maximum(squares - sums * mean, 0.0) / (counts - 1)
+        sem = np.sqrt(variance) / np.sqrt(counts)
+    mean[counts == 0] = np.nan
+    sem[counts < 2] = np.nan
+    return mean, sem, counts
 
 
 def plot_scalar_averages(ax, all_scalar_data):
@@ -120,33 +147,20 @@ def plot_scalar_averages(ax, all_scalar_data):
 
     Args:
         ax (matplotlib.axes.Axes): Axes to draw the plot on.
-        all_scalar_data (list of tuples): Each tuple is (DataFrame, label) containing autocorrelation results.
+        all_scalar_data (list of tuples): Each tuple is (summary, label), see `Autocorrelation.summary`.
 
     Returns:
         None
     """
     ax.clear()
-    for df, label in all_scalar_data:
-        time_points = [0]
-        scalar_values = [1]
-
-        for col in df.columns:
-            if col.startswith("scalar_time_"):
-                match = re.search(r"scalar_time_(\d+)", col)
-                if match:
-                    time_point = int(match.group(1))
-                    time_points.append(time_point)
-
-                    vals = df[col].dropna().unique()
-                    val = vals[0]
-                    scalar_values.append(float(val))
-
-        # Sort by time points
-        sorted_pairs = sorted(zip(time_points, scalar_values))
-        sorted_times, sorted_scalars = zip(*sorted_pairs)
+    for summary, label in all_scalar_data:
+        # Steps without any pair of vectors have no value; directions are fully correlated at time 0
+        summary = summary[summary["n"] > 0]
+        time_points = np.concatenate([[0], summary["time"].to_numpy()])
+        scalar_values = np.concatenate([[1], summary["mean"].to_numpy()])
 
         try:
-            ax.plot(sorted_times, sorted_scalars, marker='o', label=label)
+            ax.plot(time_points, scalar_values, marker='o', label=label)
         except Exception as e:
             logger.warning(f"Failed to plot for {label}: {e}")
 
@@ -155,4 +169,3 @@ def plot_scalar_averages(ax, all_scalar_data):
     ax.set_title("Migration Persistence")
     ax.grid(True)
     ax.legend()
-        
@@ -0,0 +1,126 @@
+# This code keeps the per-track results of an analysis so that the tracks changed
+# by cell edits can be recomputed alone and the condition average updated
+
+
+import numpy as np
+import pandas as pd
+
+from logs.logger import app_logger as logger
+
+from src.Analysis.pipeline import ANALYSES, SUMMARIES, kept_rows, prepare_tracks
+from src.Analysis.results import AnalysisResults
+from src.utils.input_data import REQUIRED_COLUMNS
+from src.utils.track_table import TrackTable
+
+
+# Editing these columns changes the values of a track, the track can be recomputed alone
+VALUE_COLUMNS = ("X", "Y")
+# Editing these columns changes which rows form a track, a full analysis is needed
+STRUCTURE_COLUMNS = ("Track n", "Slice n")
+
+
+class TrackResults(AnalysisResults):
+    """
+    Results of one analysis of a sheet, with the set of tracks edited since.
+
+    Args:
+        analysis (str): Key of ANALYSES.
+        values (dict): Parameters the analysis was run with.
+        track_ids (np.ndarray): Ids of the analysed tracks in ascending order.
+        track_values (np.ndarray): `track_values` of the analysis, one row per track.
+        summary (pd.DataFrame): Condition average and SEM, see `AnalysisResults`.
+
+    Attributes:
+        dirty (set): Ids of the tracks edited since the values were computed.
+        stale (bool): True once the track structure was edited; the results cannot be
+            updated track by track any more and the analysis has to be run again.
+    """
+    def __init__(self, analysis, values, track_ids, track_values, summary):
+        super().__init__(analysis, values, track_ids, track_values, summary)
+        self.dirty = set()
+        self.stale = False
+
+    @classmethod
+    def from_results(cls, results):
+        """
+        Tracks edits of the results returned by the analysis of a sheet.
+
+        Args:
+            results (AnalysisResults): Results of `analyse_sample`.
+        """
+        # The parameters of the GUI may change after the run, keep those the tracks were analysed with
+        return cls(results.analysis, dict(results.values), results.track_ids, results.track_values, results.summary)
+
+    def mark_edit(self, column, track_id):
+        """
+        Record an edit of one cell.
+
+        Args:
+            column (str): Name of the edited column.
+            track_id: 'Track n' of the edited row.
+        """
+        if column in STRUCTURE_COLUMNS:
+            self.stale = True
+        elif column in VALUE_COLUMNS:
+            track_id = pd.to_numeric(track_id, errors='coerce')
+            if not pd.isna(track_id):
+                self.dirty.add(float(track_id))
+
+    def update(self, data):
+        """
+        Recompute the dirty tracks of `data` in place and update the condition average and SEM.
+
+        The rows of the edited tracks are prepared like for a full run, so the sheet may
+        also be the unprepared sheet of an analysis run from a TrackStore, whose per-row
+        columns are then not written.
+
+        Args:
+            data (pd.DataFrame): Analysed sheet holding the edited values.
+
+        Returns:
+            list of float: Ids of the recomputed tracks.
+        """
+        if self.stale or not self.dirty:
+            return []
+        analysis_class, _ = ANALYSES[self.analysis]
+
+        dirty = np.array(sorted(self.dirty))
+        tracks = pd.to_numeric(data["Track n"], errors='coerce').to_numpy(dtype=float)
+        rows = np.flatnonzero(np.isin(tracks, dirty))
+
+        if len(rows):
+            # Analyse the rows of the edited tracks only. prepare_tracks sorts them by track
+            # and slice, the TrackTable of the edited rows gives the sheet row of each prepared row
+            edited = data.iloc[rows].reset_index(drop=True)
+            source = rows[kept_rows(TrackTable(edited), self.values)]
+            prepared, _, _ = prepare_tracks(edited.copy(), self.values)
+            part = analysis_class(prepared, self.values)
+
+            # Copy the columns of the analysis back to the rows they were computed for
+            keys = ["Track n", "Slice n"]
+            if len(part.data) == len(source) and np.array_equal(
+                    part.data[keys].to_numpy(dtype=float),
+                    data[keys].iloc[source].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)):
+                for column in part.data.columns.difference(REQUIRED_COLUMNS, sort=False):
+                    if column in data.columns:
+                        data.loc[data.index[source], column] = part.data[column].to_numpy()
+            else:
+                logger.warning(f"{self.analysis} : the rows of the edited tracks changed, "
+                               f"their columns in the sheet are not updated")
+            part_ids, part_values = part.table.track_ids, part.track_values
+        else:
+            part_ids, part_values = np.empty(0), self.track_values[:0]
+
+        # Replace the values of the edited tracks, keeping the tracks in ascending order
+        kept = ~np.isin(self.track_ids, dirty)
+        track_ids = np.concatenate([self.track_ids[kept], part_ids])
+        order = np.argsort(track_ids, kind='stable')
+        self.track_ids = track_ids[order]
+        self.track_values = np.concatenate([self.track_values[kept], part_values])[order]
+
+        # Condition average and SEM from the per-track values, as after a full run
+        self.summary = SUMMARIES[self.analysis](self.track_values, self.values)
+
+        self.dirty.clear()
+        logger.info(f"{self.analysis} : recomputed tracks {dirty.astype(int).tolist()}")
+        return dirty.tolist()
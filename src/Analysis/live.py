@@ -0,0 +1,321 @@
+# This code follows results files that grow while an acquisition is running and updates
+# the condition results of the analyses with the new frames only
+
+
+import glob
+import io
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+
+from logs.logger import app_logger as logger
+
+from src.Analysis.incremental import TrackResults
+from src.Analysis.pipeline import analyse_sample, plot_results, result_label
+from src.Analysis.results import results_table
+from src.utils.importers import (
+    DELIMITED_SUFFIXES, ZERO_BASED_FRAMES, normalize_name, sheet_name, table_layout, to_float
+)
+from src.utils.input_data import REQUIRED_COLUMNS, read_workbook
+from src.utils.track_table import TrackTable
+
+# Files followed in watched directories
+WATCHED_SUFFIXES = DELIMITED_SUFFIXES + (".xlsx", ".xlsm")
+# Seconds between two looks at the watched files
+POLL_INTERVAL = 5.0
+
+
+class FileTail():
+    """
+    Reads the rows added to a results file since the previous call of `read`.
+
+    Text tables are read from the byte offset reached last time, up to their last
+    complete line, so only the new lines are parsed. Workbooks cannot be appended to in
+    place: they are read again whenever they change and the rows past those already read
+    are returned. A file that shrinks was replaced, it is read again from the start.
+
+    Args:
+        file_path (str | Path): Path to the text table or workbook.
+    """
+    def __init__(self, file_path):
+        self.file_path = Path(file_path)
+        self.offset = 0 # Bytes of a text table already read
+        self.layout = None # (options of pd.read_csv, header line, mapping), see `table_layout`
+        self.n_rows = {} # Sheet name -> rows of a workbook already read
+        self.stamp = None # (size, mtime) of the file when last read
+
+    def is_delimited(self):
+        """
+        True if the file is a text table.
+        """
+        return self.file_path.suffix.lower() in DELIMITED_SUFFIXES
+
+    def read(self):
+        """
+        Reads the rows added since the previous call.
+
+        Returns:
+            tuple: (sheets, reset) where `sheets` maps sheet names to the new rows
+            ('Track n', 'Slice n', 'X', 'Y' as float) and `reset` is True if the file
+            was replaced and the rows read before are not part of it any more.
+        """
+        stat = self.file_path.stat()
+        stamp = (stat.st_size, stat.st_mtime_ns)
+        if stamp == self.stamp:
+            return {}, False
+
+        if self.is_delimited():
+            sheets, reset = self.read_lines(stat.st_size)
+        else:
+            sheets, reset = self.read_workbook()
+        if sheets is not None:
+            self.stamp = stamp
+        return sheets or {}, reset
+
+    def read_lines(self, size):
+        """
+        Parses the complete lines appended to a text table.
+        """
+        reset = size < self.offset
+        if reset:
+            logger.warning(f"Live : {self.file_path.name} is shorter than before, reading it again")
+            self.offset, self.layout = 0, None
+
+        with open(self.file_path, "rb") as file:
+            if self.layout is None:
+                header = file.readline()
+                if not header.endswith(b"\n"):
+                    return None, reset # header being written
+                try:
+                    options, _, mapping = table_layout(self.file_path)
+                except ValueError as e:
+                    logger.warning(f"Live : {self.file_path.name} skipped: {e}")
+                    return None, reset
+                self.layout = (options, header, mapping)
+                self.offset = len(header)
+            file.seek(self.offset)
+            block = file.read(size - self.offset)
+
+        # The last line may still be written, it is read next time
+        block = block[:block.rfind(b"\n") + 1]
+        if not block.strip():
+            return {}, reset
+        self.offset += len(block)
+
+        options, header, mapping = self.layout
+        chunk = pd.read_csv(io.BytesIO(header + block), usecols=list(mapping.values()), **options)
+        rows = pd.DataFrame({column: to_float(chunk[name]) for column, name in mapping.items()})
+        if normalize_name(mapping["Slice n"]) in ZERO_BASED_FRAMES:
+            rows["Slice n"] += 1
+        return {sheet_name(self.file_path): rows}, reset
+
+    def read_workbook(self):
+        """
+        Reads a workbook again and keeps the rows of each sheet past those read before.
+        """
+        try:
+            sheets, _ = read_workbook(self.file_path, extra_columns=[], cache=None, validate=False)
+        except Exception as e:
+            # Most likely saved at this moment, read again at the next poll
+            logger.info(f"Live : cannot read {self.file_path.name} yet: {e}")
+            return None, False
+
+        reset = any(len(df) < self.n_rows.get(name, 0) for name, df in sheets.items())
+        if reset:
+            logger.warning(f"Live : {self.file_path.name} has fewer rows than before, reading it again")
+            self.n_rows = {}
+        new_rows = {}
+        for name, df in sheets.items():
+            new_rows[name] = df.iloc[self.n_rows.get(name, 0):][list(REQUIRED_COLUMNS)].reset_index(drop=True)
+            self.n_rows[name] = len(df)
+        return new_rows, reset
+
+
+class LiveCondition():
+    """
+    Frames received so far for one condition (sheet) and the results of the analyses on them.
+
+    The analyses only read the first `n_time_points` slices of the tracks that have them
+    (see `prepare_tracks`), so only these frames are kept and a track is analysed once,
+    when it reaches `n_time_points` slices, later frames cannot change its values. The
+    first complete tracks are analysed with `analyse_sample`, the next ones are added to
+    the TrackResults of each analysis with `TrackResults.update`, which also updates the
+    condition average and SEM.
+
+    Args:
+        filename (tuple): (filename, sheetname)
+        analyses (list of str): Keys of ANALYSES.
+        values (dict): Analysis parameters.
+
+    Attributes:
+        rows (pd.DataFrame): Kept frames, 'Track n', 'Slice n', 'X', 'Y' sorted by track and slice.
+        results (dict): Analysis -> TrackResults, once a track is complete.
+        n_frames (int): Number of frames received.
+    """
+    def __init__(self, filename, analyses, values):
+        self.filename = filename
+        self.analyses = analyses
+        self.values = values
+        self.rows = pd.DataFrame({column: np.empty(0) for column in REQUIRED_COLUMNS})
+        self.results = {}
+        self.n_frames = 0
+
+    def add(self, rows):
+        """
+        Adds new frames and updates the results with the tracks they complete or change.
+
+        Args:
+            rows (pd.DataFrame): New rows with 'Track n', 'Slice n', 'X', 'Y'.
+
+        Returns:
+            list of float: Ids of the tracks analysed again.
+        """
+        n_time_points = self.values['n_time_points']
+        data = pd.concat([self.rows, rows[list(REQUIRED_COLUMNS)]], ignore_index=True)
+        table = TrackTable(data)
+        self.n_frames += len(rows)
+
+        # Frames past the first n_time_points slices of their track are not analysed
+        kept = table.position < n_time_points
+        is_new = table.order >= len(self.rows)
+        complete = np.repeat(table.lengths >= n_time_points, table.lengths)
+        changed = np.unique(table.track_ids[table.track_index[kept & is_new & complete]])
+        self.rows = data.iloc[table.order[kept]].reset_index(drop=True)
+        if len(changed) == 0:
+            return []
+
+        for analysis in self.analyses:
+            results = self.results.get(analysis)
+            if results is None:
+                _, results, _, error = analyse_sample(self.filename, self.rows.copy(), analysis, self.values)
+                if results is None:
+                    logger.error(f"Live : {analysis} of {self.filename} failed: {error}")
+                    continue
+                self.results[analysis] = TrackResults.from_results(results)
+            else:
+                results.dirty.update(changed.tolist())
+                results.update(self.rows)
+        return changed.tolist()
+
+
+def watched_files(patterns):
+    """
+    Lists the results files to follow: files matching the patterns and the files with
+    a WATCHED_SUFFIXES suffix in the directories among them.
+
+    Args:
+        patterns (list of str): Directories, paths or glob patterns.
+
+    Returns:
+        list of Path: Existing files, sorted.
+    """
+    paths = set()
+    for pattern in patterns:
+        for match in glob.glob(pattern, recursive=True) or [pattern]:
+            if os.path.isdir(match):
+                paths.update(path for path in Path(match).iterdir()
+                             if path.is_file() and path.suffix.lower() in WATCHED_SUFFIXES
+                             and not path.name.startswith(("~$", ".")))
+            elif os.path.isfile(match):
+                paths.add(Path(match))
+    return sorted(paths)
+
+
+def write_live_results(conditions, analysis, values, output_dir):
+    """
+    Writes `live_<analysis>.csv` (the condition averages, SEM and number of tracks of
+    every condition, see `results_table`) and `live_<analysis>.png` (the condition plot).
+    Each file replaces the previous one only once written, so it can be read at any time.
+
+    Args:
+        conditions (list of LiveCondition): Followed conditions.
+        analysis (str): Key of ANALYSES.
+        values (dict): Analysis parameters.
+        output_dir (Path): Directory where results are written.
+    """
+    summaries = [(condition.results[analysis].summary, result_label(analysis, condition.filename))
+                 for condition in conditions if analysis in condition.results]
+    if not summaries:
+        return
+    stem = output_dir / f"live_{analysis}"
+
+    temporary = output_dir / f".live_{analysis}.tmp.csv"
+    results_table(summaries).to_csv(temporary, index=False)
+    os.replace(temporary, stem.with_suffix(".csv"))
+
+    figure = Figure(figsize=(8, 6))
+    ax = figure.add_subplot(111)
+    plot_results(ax, analysis, summaries, values)
+    temporary = output_dir / f".live_{analysis}.tmp.png"
+    figure.savefig(temporary, format="png")
+    os.replace(temporary, stem.with_suffix(".png"))
+
+
+def watch(patterns, analyses, values, output_dir, interval=POLL_INTERVAL, idle_timeout=None):
+    """
+    Follows results files while they are written and keeps the condition results of the
+    analyses up to date in `output_dir` (see `write_live_results`). New files appearing
+    in the watched directories become new conditions.
+
+    Runs until interrupted (Ctrl+C), or until no file has grown for `idle_timeout` seconds.
+
+    Args:
+        patterns (list of str): Directories, paths or glob patterns, see `watched_files`.
+        analyses (list of str): Keys of ANALYSES.
+        values (dict): Analysis parameters (see `DEFAULT_VALUES`).
+        output_dir (str | Path): Directory where results are written.
+        interval (float, optional): Seconds between two looks at the files.
+        idle_timeout (float, optional): Seconds without new frames after which to stop.
+
+    Returns:
+        dict: (filename, sheetname) -> LiveCondition of every followed condition.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    tails = {}
+    conditions = {}
+    last_change = time.monotonic()
+
+    logger.info(f"Live : watching {patterns}, analyses {analyses}, parameters {values}")
+    try:
+        while True:
+            updated = set()
+            for file_path in watched_files(patterns):
+                tail = tails.setdefault(file_path, FileTail(file_path))
+                try:
+                    sheets, reset = tail.read()
+                except OSError as e:
+                    logger.warning(f"Live : cannot read {file_path.name}: {e}")
+                    continue
+
+                for name, rows in sheets.items():
+                    filename = (file_path.name, name)
+                    if reset or filename not in conditions:
+                        conditions[filename] = LiveCondition(filename, analyses, values)
+                    if len(rows):
+                        last_change = time.monotonic()
+                    if conditions[filename].add(rows):
+                        updated.update(conditions[filename].results)
+
+            for analysis in sorted(updated):
+                try:
+                    write_live_results(list(conditions.values()), analysis, values, output_dir)
+                except OSError as e:
+                    logger.warning(f"Live : cannot write the results of {analysis}: {e}")
+            if updated:
+                logger.info("Live : " + ", ".join(
+                    f"{filename[0]} {filename[1]} {condition.n_frames} frames"
+                    for filename, condition in conditions.items()))
+
+            if idle_timeout is not None and time.monotonic() - last_change > idle_timeout:
+                logger.info(f"Live : no new frames for {idle_timeout} s, stopped")
+                break
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        logger.info("Live : stopped")
+
+    return conditions
@@ -1,5 +1,72 @@
 import numpy as np
-from logs.logger import app_logger as logger
+from src.Analysis.results import condition_mean_sem, summary_table
+from src.utils.track_table import TrackTable
+
+MSD_MODES = ("fft", "loop")
+
+def msd_loop(x, y, n_lags):
+    """
+    Computes the MSD of one track with a Python loop over the lags, O(N·τ).
+
+    Args:
+        x (np.ndarray): X coordinates of the track, sorted by slice.
+        y (np.ndarray): Y coordinates of the track, sorted by slice.
+        n_lags (int): Number of lags to compute (lag 0 included).
+
+    Returns:
+        np.ndarray: MSD for lags 0..n_lags-1, NaN for lags longer than the track.
+    """
+    msd = np.zeros(n_lags)
+    for tau in range(1, n_lags):
+        if tau >= len(x):
+            msd[tau:] = np.nan
+            break
+        displacements = (x[tau:] - x[:-tau])**2 + (y[tau:] - y[:-tau])**2
+        msd[tau] = np.mean(displacements)
+    return msd
+
+def msd_fft(x, y):
+    """
+    Computes the MSD of equal-length tracks for every lag at once, O(N log N) per track.
+
+    Uses MSD(m) = S1(m) - 2·S2(m), where S1 comes from running sums of squared positions
+    and S2 is the positional autocorrelation obtained with a zero-padded FFT.
+
+    Args:
+        x (np.ndarray): X coordinates, shape (n_tracks, N) or (N,), sorted by slice.
+        y (np.ndarray): Y coordinates with the same shape as `x`.
+
+    Returns:
+        np.ndarray: MSD for lags 0..N-1 with the same shape as `x`.
+    """
+    x = np.atleast_2d(np.asarray(x, dtype=float))
+    y = np.atleast_2d(np.asarray(y, dtype=float))
+    n = x.shape[1]
+    if n == 0:
+        return np.zeros(x.shape)
+
+    # MSD does not depend on the origin, centering limits round-off in S1 - 2·S2
+    x = x - x.mean(axis=1, keepdims=True)
+    y = y - y.mean(axis=1, keepdims=True)
+    remaining = n - np.arange(n)
+
+    # S1(m) = (2·ΣD - Σ_{k<m} (D[k] + D[N-1-k])) / (N - m), D = squared distance to origin
+    d = x**2 + y**2
+    pairs = np.cumsum(d + d[:, ::-1], axis=1)
+    q = 2 * d.sum(axis=1, keepdims=True) - np.concatenate((np.zeros((d.shape[0], 1)), pairs[:, :-1]), axis=1)
+    s1 = q / remaining
+
+    # S2(m) = Σ_k r[k]·r[k+m] / (N - m), zero padding to 2N avoids circular wrap-around
+    size = 1 << int(2 * n - 1).bit_length()
+    s2 = np.zeros(x.shape)
+    for coordinate in (x, y):
+        spectrum = np.fft.rfft(coordinate, n=size, axis=1)
+        s2 += np.fft.irfft(spectrum * spectrum.conj(), n=size, axis=1)[:, :n]
+    s2 /= remaining
+
+    msd = s1 - 2 * s2
+    msd[:, 0] = 0.0
+    return msd
 
 class MSD():
     """
@@ -10,11 +77,18 @@ class MSD():
         values (dict): Parameters, must contain:
             - 'time_interval': interval between slices
             - 'n_time_points': number of time steps to analyze
+            - 'msd_mode' (optional): 'fft' (default, all lags at once) or 'loop' (lag by lag)
+        table (TrackTable, optional): Track index of `data`. Built from `data` if not given.
+
+    Attributes:
+        track_values (np.ndarray): (n_tracks, n_time_points) MSD of each cell.
+        summary (pd.DataFrame): Condition average and SEM of MSD per lag, see `summary_table`.
     """
-    def __init__(self, data, values):
+    def __init__(self, data, values, table=None):
         super().__init__()
         self.data = data
         self.values = values
+        self.table = table if table is not None else TrackTable(data)
 
         self.msd()
     
@@ -22,50 +96,80 @@ class MSD():
         """
         Main MSD computation method. Calculates:
         - Per-cell MSD over time
-        - Average MSD across all cells
-        - SEM (standard error of the mean) of MSD
+        - Average MSD across all cells and its SEM (standard error of the mean), in `summary`
         """
+        table = self.table
+        n_time_points = self.values['n_time_points']
+        mode = self.values.get('msd_mode', "fft")
+        if mode not in MSD_MODES:
+            raise ValueError(f"Unknown MSD mode '{mode}', expected one of {MSD_MODES}")
 
-        calculate_time = False
         if 'time' not in self.data.columns:
-            self.data['time'] = np.nan
-            calculate_time = True
-        
-        # Initialize result columns
-        self.data['avg_msd_by_time_cell'] = np.nan
-        self.data["avg_msd_by_time_condition"] = np.nan
-        self.data["sem_by_time_condition"] = np.nan
+            self.data['time'] = table.scatter(table.slice_n * self.values['time_interval'])
+
+        # Calculate MSD, one row per track
+        if mode == "fft":
+            avr_msd = self.msd_by_length(n_time_points)
+        else:
+            avr_msd = np.zeros((table.n_tracks, n_time_points))
+            for i in range(table.n_tracks):
+                rows = table.track(i)
+                avr_msd[i] = msd_loop(table.x[rows], table.y[rows], n_time_points)
+
+        # Row j of a track holds the MSD at lag j
+        position = table.position
+        kept = position < n_time_points
+        by_cell = np.full(len(table), np.nan)
+        by_cell[kept] = avr_msd[table.track_index[kept], position[kept]]
 
-        avr_msd = []
-
-        for track_id in sorted(self.data["Track n"].unique()):
-            track_df = self.data[self.data["Track n"] == track_id].sort_values("Slice n")
+        # Initialize result columns
+        self.data['avg_msd_by_time_cell'] = table.scatter(by_cell)
 
-            if calculate_time:
-                track_df['time'] = track_df['Slice n'] * self.values['time_interval']
-                self.data.loc[track_df.index, 'time'] = track_df["time"].values
+        self.track_values = avr_msd
+        self.summary = msd_summary(avr_msd, self.values)
 
-            # Calculate MSD
-            msd = np.zeros(self.values['n_time_points'])
+    def msd_by_length(self, n_lags):
+        """
+        Runs the FFT kernel on batches of tracks sharing the same length.
 
-            dx = track_df['X'].to_numpy()
-            dy = track_df['Y'].to_numpy()
+        Args:
+            n_lags (int): Number of lags to keep (lag 0 included).
 
-            for tau in range(1, self.values['n_time_points']):
-                displacements = (dx[tau:] - dx[:-tau])**2 + (dy[tau:] - dy[:-tau])**2
-                msd[tau] = np.mean(displacements)
+        Returns:
+            np.ndarray: (n_tracks, n_lags) MSD matrix, NaN for lags longer than the track.
+        """
+        table = self.table
+        result = np.full((table.n_tracks, n_lags), np.nan)
+        lengths = table.lengths
+
+        # A missing coordinate would spread over every lag through the FFT, use the loop there
+        missing = table.mean(np.isnan(table.x) | np.isnan(table.y)) > 0
+        for i in np.flatnonzero(missing):
+            rows = table.track(i)
+            result[i] = msd_loop(table.x[rows], table.y[rows], n_lags)
+
+        for length in np.unique(lengths[~missing]):
+            tracks = np.flatnonzero((lengths == length) & ~missing)
+            rows = table.starts[tracks, None] + np.arange(length)
+            msd = msd_fft(table.x[rows], table.y[rows])
+            kept = min(length, n_lags)
+            result[tracks, :kept] = msd[:, :kept]
+        return result
+
+def msd_summary(track_values, values):
+    """
+    Computes the condition average and SEM of MSD from the per-cell MSD.
 
-            track_df['avg_msd_by_time_cell'] = msd
-            self.data.loc[track_df.index, 'avg_msd_by_time_cell'] = track_df["avg_msd_by_time_cell"].values
-            
-            avr_msd.append(msd)
+    Args:
+        track_values (np.ndarray): (n_tracks, n_time_points) MSD of each cell.
+        values (dict): Parameters with 'time_interval' and 'n_time_points'.
 
-        if avr_msd:
-            avr_msd = np.array(avr_msd)
-            avg = np.mean(avr_msd, axis=0)
-            err = np.std(avr_msd, axis=0, ddof=1) / np.sqrt(avr_msd.shape[0])
-            self.data.loc[:self.values['n_time_points']-1, "avg_msd_by_time_condition"] = avg
-            self.data.loc[:self.values['n_time_points']-1, "sem_by_time_condition"] = err
+    Returns:
+        pd.DataFrame: Condition summary, see `summary_table`.
+    """
+    n_time_points = values['n_time_points']
+    avg, err, n = condition_mean_sem(np.reshape(track_values, (-1, n_time_points)))
+    return summary_table(np.arange(n_time_points), values['time_interval'], avg, err, n)
 
 def plot_msd(ax, avg_msd_data, values):
     """
@@ -73,19 +177,12 @@ def plot_msd(ax, avg_msd_data, values):
 
     Args:
         ax (matplotlib.axes.Axes): Axes to plot on.
-        avg_msd_data (list of tuples): Each tuple = (DataFrame, label).
-        values (dict): Must contain 'time_interval'.
+        avg_msd_data (list of tuples): Each tuple = (summary, label), see `MSD.summary`.
+        values (dict): Analysis parameters.
     """
-    for df, label in avg_msd_data:
-        if 'avg_msd_by_time_condition' not in df.columns or 'sem_by_time_condition' not in df.columns:
-            logger.warning(f"Skipping {label} — required MSD columns missing.")
-            continue  
-
-        y = df['avg_msd_by_time_condition'].dropna().values
-        yerr = df['sem_by_time_condition'].dropna().values
-        x = np.arange(len(y)) * values['time_interval'] 
-
-        ax.errorbar(x, y, yerr=yerr, fmt='o-', capsize=4, label=label)
+    for summary, label in avg_msd_data:
+        summary = summary.dropna(subset=["mean"])
+        ax.errorbar(summary["time"], summary["mean"], yerr=summary["sem"], fmt='o-', capsize=4, label=label)
 
     ax.set_xlabel("Time (step × interval)")
     ax.set_ylabel("Mean Squared Displacement (MSD)")
@@ -0,0 +1,617 @@
+import glob
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+
+from logs.logger import app_logger as logger
+
+from src.Analysis.autocorrelation import Autocorrelation, plot_scalar_averages, scalars_summary
+from src.Analysis.speed import Speed, plot_speed, speed_summary
+from src.Analysis.msd import MSD, msd_summary, plot_msd
+from src.Analysis.dir_ratio import DirRatio, dir_ratio_summary, plot_dir_ratio
+from src.Analysis.results import AnalysisResults, results_table, tracks_table, with_sheet_columns
+from src.utils.input_data import read_track_stores, read_workbook
+from src.utils.workbook_cache import workbook_cache
+from src.utils.track_store import LARGE_ROWS, STORE_CHUNK_ROWS, TrackStore
+from src.utils.track_table import TrackTable
+
+# Analysis name -> (class computing it, function plotting the collected results)
+ANALYSES = {
+    "Autocorrelation": (Autocorrelation, lambda ax, results, values: plot_scalar_averages(ax, results)),
+    "MSD": (MSD, plot_msd),
+    "Speed": (Speed, lambda ax, results, values: plot_speed(ax, results)),
+    "Directionality_Ratio": (DirRatio, plot_dir_ratio),
+}
+
+# Analysis name -> function computing the condition summary from the per-track values
+SUMMARIES = {
+    "Autocorrelation": scalars_summary,
+    "MSD": msd_summary,
+    "Speed": speed_summary,
+    "Directionality_Ratio": dir_ratio_summary,
+}
+
+DEFAULT_VALUES = {
+    "time_interval": 10.0,
+    "n_time_points": 40,
+    "n_tracks": 20,
+    "n_plot_points": 6,
+    "n_workers": 1,
+}
+
+# Sheets with more rows than this are split into chunks of tracks when running in parallel
+CHUNK_ROWS = 500_000
+
+# Sheet of the batch outputs holding the condition averages and SEM of every sheet
+SUMMARY_SHEET = "Summary"
+
+
+def prepare_tracks(df, values):
+    """
+    Clean the input DataFrame and keep the first `n_time_points` slices of every track.
+
+    Args:
+        df (pd.DataFrame): Raw input data, modified in place while casting.
+        values (dict): Parameters, must contain 'n_time_points' and 'n_tracks'.
+
+    Returns:
+        tuple: (data, table, warnings) with the cleaned DataFrame, its TrackTable and
+        a list of messages about short tracks or a track count mismatch.
+
+    Raises:
+        ValueError: If 'Track n' or 'Slice n' cannot be converted to integers.
+    """
+    try:
+        df.dropna(subset=["Track n", "Slice n"], inplace=True)
+        df["Track n"] = df["Track n"].astype(int)
+        df["Slice n"] = df["Slice n"].astype(int)
+        df["X"] = pd.to_numeric(df["X"], errors='coerce')
+        df["Y"] = pd.to_numeric(df["Y"], errors='coerce')
+    except Exception as e:
+        raise ValueError(f"Incorrect type of data in columns Track n or Slice n:\n{e}") from e
+
+    # Treat track: keep the first n_time_points slices of every long enough track
+    table = TrackTable(df)
+    short = table.lengths < values['n_time_points']
+    missing_tracks = table.track_ids[short].astype(int).tolist()
+
+    data = df.iloc[kept_rows(table, values)].reset_index(drop=True)
+
+    warnings = []
+    # Check number of tracks
+    if table.n_tracks < values['n_tracks']:
+        warnings.append(f"expected {values['n_tracks']} tracks, found {table.n_tracks}.")
+
+    if missing_tracks:
+        warnings.append(f"Folowing tracks have less than {values['n_time_points']} slices: {missing_tracks}")
+
+    return data, TrackTable(data), warnings
+
+
+def kept_rows(table, values):
+    """
+    Rows of a sheet that `prepare_tracks` keeps, in the order of the prepared data: the
+    first `n_time_points` slices of every track that has them, sorted by track and slice.
+
+    Args:
+        table (TrackTable): Track index of the sheet.
+        values (dict): Parameters, must contain 'n_time_points'.
+
+    Returns:
+        np.ndarray: Positions of the kept rows in the sheet.
+    """
+    n_time_points = values['n_time_points']
+    kept = (table.position < n_time_points) & np.repeat(table.lengths >= n_time_points, table.lengths)
+    return table.order[kept]
+
+
+def run_sheet_analysis(data, analysis, values, table=None):
+    """
+    Run one analysis on prepared track data.
+
+    Args:
+        data (pd.DataFrame): Data returned by `prepare_tracks`, results are added to it.
+        analysis (str): One of the keys of `ANALYSES`.
+        values (dict): Analysis parameters.
+        table (TrackTable, optional): Track index of `data`.
+
+    Returns:
+        object: The analysis instance (MSD, Speed, DirRatio or Autocorrelation).
+    """
+    analysis_class, _ = ANALYSES[analysis]
+    return analysis_class(data, values, table)
+
+
+def analyse_sample(filename, df, analysis, values):
+    """
+    Prepare and analyse one sample. Module-level so it can run in a worker process.
+
+    Args:
+        filename (tuple): (filename, sheetname)
+        df (pd.DataFrame): Raw sheet data.
+        analysis (str): Key of `ANALYSES` or "Trajectories" (preparation only).
+        values (dict): Analysis parameters.
+
+    Returns:
+        tuple: (data, results, warnings, error) where data is None if the sample failed,
+        results is the AnalysisResults of the sheet (None for "Trajectories")
+        and error is an empty string on success.
+    """
+    try:
+        data, table, warnings = prepare_tracks(df, values)
+    except ValueError as e:
+        logger.error(f"Error while treating data: {e}")
+        return None, None, [], f"{e}"
+
+    for warning in warnings:
+        logger.warning(f"{filename}: {warning}")
+
+    results = None
+    try:
+        # Perform the selected analysis
+        if analysis in ANALYSES:
+            result = run_sheet_analysis(data, analysis, values, table)
+            data = result.data
+            results = AnalysisResults(analysis, values, result.table.track_ids, result.track_values, result.summary)
+    except Exception as e:
+        logger.exception(f"Analysis Module : problem with {analysis} : {e}")
+        return None, None, warnings, f"{e}"
+
+    return data, results, warnings, ""
+
+
+def analyse_chunk(data, analysis, values):
+    """
+    Analyse a chunk of whole tracks of a prepared sheet. Module-level so it can run
+    in a worker process.
+
+    Args:
+        data (pd.DataFrame): Prepared rows of some tracks, see `split_tracks`.
+        analysis (str): Key of `ANALYSES`.
+        values (dict): Analysis parameters.
+
+    Returns:
+        tuple: (data, track_ids, track_values) of the analysis of the chunk.
+    """
+    result = run_sheet_analysis(data, analysis, values)
+    return result.data, result.table.track_ids, result.track_values
+
+
+def store_tracks(store, values):
+    """
+    Selects the tracks of a TrackStore that `prepare_tracks` keeps: those with at least
+    `n_time_points` slices, of which the first `n_time_points` are analysed.
+
+    Args:
+        store (TrackStore): Trajectories of the sheet.
+        values (dict): Parameters, must contain 'n_time_points' and 'n_tracks'.
+
+    Returns:
+        tuple: (tracks, warnings) with the positions of the kept tracks in `store.track_ids`
+        and the messages of `prepare_tracks`.
+    """
+    short = store.lengths < values['n_time_points']
+    warnings = []
+    if store.n_tracks < values['n_tracks']:
+        warnings.append(f"expected {values['n_tracks']} tracks, found {store.n_tracks}.")
+    if short.any():
+        warnings.append(f"Folowing tracks have less than {values['n_time_points']} slices: "
+                        f"{store.track_ids[short].astype(int).tolist()}")
+    return np.flatnonzero(~short), warnings
+
+
+def analyse_store_chunk(store, tracks, analysis, values):
+    """
+    Analyse some tracks of a TrackStore, reading only their rows. Module-level so it can
+    run in a worker process, which opens the store from its directory.
+
+    Args:
+        store (TrackStore): Trajectories of the sheet.
+        tracks (np.ndarray): Positions of the tracks, all with at least `n_time_points` slices.
+        analysis (str): Key of `ANALYSES`.
+        values (dict): Analysis parameters.
+
+    Returns:
+        tuple: (None, track_ids, track_values), like `analyse_chunk` without the per-row data.
+    """
+    result = run_sheet_analysis(store.chunk(tracks, values['n_time_points']), analysis, values)
+    return None, result.table.track_ids, result.track_values
+
+
+def store_chunks(store, tracks, values):
+    """
+    Groups the kept tracks of a store into chunks of about STORE_CHUNK_ROWS analysed rows.
+    """
+    return store.track_chunks(tracks, STORE_CHUNK_ROWS, values['n_time_points']) or [tracks]
+
+
+def analyse_store(filename, store, analysis, values, cancelled=None):
+    """
+    Analyse a sheet held in a TrackStore one chunk of tracks at a time, so memory use
+    depends on the chunk size and not on the size of the sheet. Only the per-track
+    values are kept from each chunk; the per-row columns the analyses add to a sheet
+    are not produced.
+
+    Args:
+        filename (tuple): (filename, sheetname)
+        store (TrackStore): Trajectories of the sheet, validated.
+        analysis (str): Key of `ANALYSES`.
+        values (dict): Analysis parameters.
+        cancelled (callable, optional): Returns True when the run should stop, checked between chunks.
+
+    Returns:
+        tuple: (None, results, warnings, error), see `analyse_sample`; results is None
+        if the run was cancelled.
+    """
+    if analysis not in ANALYSES:
+        return None, None, [], f"{analysis} is not available for sheets of more than {LARGE_ROWS} rows"
+    tracks, warnings = store_tracks(store, values)
+    for warning in warnings:
+        logger.warning(f"{filename}: {warning}")
+
+    chunks = []
+    try:
+        for part in store_chunks(store, tracks, values):
+            if cancelled is not None and cancelled():
+                return None, None, warnings, "cancelled"
+            chunks.append(analyse_store_chunk(store, part, analysis, values))
+        _, results = merge_chunks(analysis, chunks, values)
+    except Exception as e:
+        logger.exception(f"Analysis Module : problem with {analysis} : {e}")
+        return None, None, warnings, f"{e}"
+    return None, results, warnings, ""
+
+
+def split_tracks(data, table, n_chunks):
+    """
+    Split prepared data into contiguous chunks of whole tracks with similar row counts.
+
+    Args:
+        data (pd.DataFrame): Data returned by `prepare_tracks` (sorted by track).
+        table (TrackTable): Track index of `data`.
+        n_chunks (int): Number of chunks wanted.
+
+    Returns:
+        list of pd.DataFrame: Chunks in track order, each with a fresh index.
+    """
+    targets = np.linspace(0, len(table), n_chunks + 1)[1:-1]
+    cuts = np.unique(table.starts[np.searchsorted(table.starts, targets)] if table.n_tracks else [])
+    bounds = [0, *cuts[cuts > 0].tolist(), len(table)]
+    return [data.iloc[a:b].reset_index(drop=True) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def merge_chunks(analysis, chunks, values):
+    """
+    Merge the chunk results of one sheet and recompute the condition average and SEM
+    over all of its tracks.
+
+    Args:
+        analysis (str): Key of `ANALYSES`.
+        chunks (list of tuples): (data, track_ids, track_values) of each chunk, in track order,
+            data being None for the chunks of a TrackStore.
+        values (dict): Analysis parameters.
+
+    Returns:
+        tuple: (data, results) with the analysed data of the whole sheet (None for a
+        TrackStore) and the AnalysisResults of all of its tracks.
+    """
+    track_values = np.concatenate([track_values for _, _, track_values in chunks])
+    summary = SUMMARIES[analysis](track_values, values)
+    frames = [data for data, _, _ in chunks if data is not None]
+    data = pd.concat(frames, ignore_index=True) if frames else None
+    track_ids = np.concatenate([track_ids for _, track_ids, _ in chunks])
+    return data, AnalysisResults(analysis, values, track_ids, track_values, summary)
+
+
+def analyse_samples(samples, analysis, values, executor=None, cancelled=None, on_start=None):
+    """
+    Analyse several samples, in a process pool if an executor is given.
+
+    Sheets are independent, so each one is submitted to the pool as a whole. Sheets with
+    more than `CHUNK_ROWS` rows are prepared here, split into chunks of tracks that are
+    analysed in parallel, and merged back when all chunks are done.
+
+    Samples given as a TrackStore are analysed chunk by chunk from the store (see
+    `analyse_store`); in the pool, the chunks are read by the worker processes.
+
+    Args:
+        samples (list of tuples): (filename, DataFrame or TrackStore) for each sample.
+        analysis (str): Key of `ANALYSES` or "Trajectories".
+        values (dict): Analysis parameters, 'n_workers' gives the number of chunks.
+        executor (concurrent.futures.Executor, optional): Pool to run on, sequential if None.
+        cancelled (callable, optional): Returns True when the run should stop.
+        on_start (callable, optional): Called with the sample index when it starts or is submitted.
+
+    Yields:
+        tuple: (index, data, results, warnings, error) for each sample, in order of completion,
+        see `analyse_sample`.
+    """
+    cancelled = cancelled or (lambda: False)
+
+    if executor is None:
+        for i, (filename, df) in enumerate(samples):
+            if cancelled():
+                return
+            if on_start is not None:
+                on_start(i)
+            if isinstance(df, TrackStore):
+                result = analyse_store(filename, df, analysis, values, cancelled)
+                if result[1] is None and cancelled():
+                    return
+                yield (i, *result)
+                continue
+            yield (i, *analyse_sample(filename, df, analysis, values))
+        return
+
+    pending = {}
+    chunked = {}
+    for i, (filename, df) in enumerate(samples):
+        if on_start is not None:
+            on_start(i)
+        if isinstance(df, TrackStore):
+            if analysis not in ANALYSES:
+                yield (i, *analyse_store(filename, df, analysis, values))
+                continue
+            tracks, warnings = store_tracks(df, values)
+            parts = store_chunks(df, tracks, values)
+            chunked[i] = {"warnings": warnings, "results": [None] * len(parts), "left": len(parts)}
+            for j, part in enumerate(parts):
+                pending[executor.submit(analyse_store_chunk, df, part, analysis, values)] = (i, j)
+            continue
+        if analysis not in ANALYSES or len(df) <= CHUNK_ROWS:
+            pending[executor.submit(analyse_sample, filename, df, analysis, values)] = (i, None)
+            continue
+
+        try:
+            data, table, warnings = prepare_tracks(df, values)
+        except ValueError as e:
+            yield i, None, None, [], f"{e}"
+            continue
+        parts = split_tracks(data, table, values.get('n_workers', 1))
+        chunked[i] = {"warnings": warnings, "results": [None] * len(parts), "left": len(parts)}
+        for j, part in enumerate(parts):
+            pending[executor.submit(analyse_chunk, part, analysis, values)] = (i, j)
+        if not parts:
+            del chunked[i]
+            yield i, data, None, warnings, ""
+
+    for future in as_completed(pending):
+        if cancelled():
+            for other in pending:
+                other.cancel()
+            return
+
+        i, j = pending[future]
+        if j is None:
+            try:
+                result = future.result()
+            except Exception as e:
+                # e.g. BrokenProcessPool when the worker process died
+                logger.exception(f"Analysis Module : problem with {analysis} : {e}")
+                yield i, None, None, [], f"{e}"
+                continue
+            yield (i, *result)
+            continue
+
+        sample = chunked.get(i)
+        if sample is None:
+            continue  # another chunk of this sample already failed
+        try:
+            sample["results"][j] = future.result()
+        except Exception as e:
+            logger.exception(f"Analysis Module : problem with {analysis} : {e}")
+            del chunked[i]
+            yield i, None, None, sample["warnings"], f"{e}"
+            continue
+        sample["left"] -= 1
+        if sample["left"] == 0:
+            del chunked[i]
+            try:
+                merged = merge_chunks(analysis, sample["results"], values)
+            except Exception as e:
+                logger.exception(f"Analysis Module : problem with {analysis} : {e}")
+                yield i, None, None, sample["warnings"], f"{e}"
+                continue
+            yield (i, *merged, sample["warnings"], "")
+
+
+def create_executor(values):
+    """
+    Create a process pool for the configured number of workers.
+
+    Args:
+        values (dict): Analysis parameters with an optional 'n_workers'.
+
+    Returns:
+        ProcessPoolExecutor | None: Pool if 'n_workers' is greater than 1, None otherwise.
+    """
+    n_workers = values.get('n_workers', 1)
+    if n_workers > 1:
+        # Forking a process that runs Qt threads is unsafe, start fresh interpreters instead
+        return ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context("spawn"))
+    return None
+
+
+def result_label(analysis, filename):
+    """
+    Label used for a sample in the plot legend.
+
+    Args:
+        analysis (str): Analysis name.
+        filename (tuple): (filename, sheetname)
+
+    Returns:
+        str: Legend label.
+    """
+    if analysis == "Autocorrelation":
+        return f"{filename[0]} {filename[1]}"
+    return f"{filename[1]}"
+
+
+def plot_results(ax, analysis, results, values):
+    """
+    Draw the collected results of an analysis on a matplotlib Axes.
+
+    Args:
+        ax (matplotlib.axes.Axes): Axes to draw on.
+        analysis (str): Analysis name.
+        results (list of tuples): Each tuple = (summary, label), see `AnalysisResults.summary`.
+        values (dict): Analysis parameters.
+    """
+    _, plot_func = ANALYSES[analysis]
+    plot_func(ax, results, values)
+
+
+def expand_paths(patterns):
+    """
+    Expand file names and glob patterns into a sorted list of existing files.
+
+    Args:
+        patterns (list of str): Paths or glob patterns.
+
+    Returns:
+        list of Path: Matching files, without duplicates.
+    """
+    paths = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True)
+        if not matches and os.path.isfile(pattern):
+            matches = [pattern]
+        paths.update(Path(match) for match in matches if os.path.isfile(match))
+    return sorted(paths)
+
+
+def run_batch(file_paths, analyses, values, output_dir, extra_columns=None, use_cache=True, wide_results=False,
+              memory_mapped=False):
+    """
+    Run analyses over every sheet of every workbook without any GUI.
+
+    For each workbook and analysis, writes `<stem>_<analysis>.xlsx` with one analysed
+    sheet per condition followed by a `Summary` sheet holding the condition averages
+    and SEM in long format, and `<stem>_<analysis>.png` with the condition plot. With
+    'n_workers' > 1 in `values`, the sheets are analysed in a process pool.
+
+    Sheets of more than `LARGE_ROWS` rows, or every sheet with `memory_mapped`, are
+    analysed from a TrackStore (see `analyse_store`): only their condition results are
+    written, in the Summary sheet. The values of the tracks of every sheet are written
+    to `<stem>_<analysis>_tracks.csv`.
+
+    Args:
+        file_paths (list of Path): Workbooks to analyse.
+        analyses (list of str): Keys of `ANALYSES`.
+        values (dict): Analysis parameters (see `DEFAULT_VALUES`).
+        output_dir (str | Path): Directory where results are written.
+        extra_columns (list of str, optional): Columns read besides the required ones,
+            every column if None (see `read_workbook`).
+        use_cache (bool, optional): Load known workbooks from the on-disk cache of read workbooks.
+        wide_results (bool, optional): Also write the condition averages and SEM into the
+            analysed sheets, in the columns the analyses used to add (see `AnalysisResults.sheet_columns`).
+        memory_mapped (bool, optional): Read every sheet into a TrackStore instead of a
+            DataFrame (`read_track_stores`), text tables being streamed to disk.
+
+    Returns:
+        list of str: Warnings and errors collected along the way.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    messages = []
+    executor = create_executor(values)
+
+    try:
+        for file_path in file_paths:
+            file_path = Path(file_path)
+            cache = workbook_cache if use_cache else None
+            try:
+                if memory_mapped:
+                    sheets, errors = read_track_stores(file_path, cache)
+                else:
+                    sheets, errors = read_workbook(file_path, extra_columns, cache=cache)
+            except Exception as e:
+                logger.error(f"Batch : cannot open {file_path}: {e}")
+                messages.append(f"{file_path.name}: cannot open the file: {e}")
+                continue
+
+            for sheet_name, e in errors.items():
+                logger.error(f"Batch : not correct data in {file_path.name} '{sheet_name}': {e}")
+                messages.append(f"{file_path.name} {sheet_name}: not correct data, sheet skipped: {e}")
+
+            samples = []
+            for sheet_name in [name for name in sheets if name not in errors]:
+                df = sheets.pop(sheet_name)
+                if not isinstance(df, TrackStore) and len(df) > LARGE_ROWS:
+                    df = TrackStore.from_frame(df)
+                samples.append(((file_path.name, sheet_name), df))
+            del sheets
+
+            try:
+                for analysis in analyses:
+                    run_batch_analysis(file_path, samples, analysis, values, output_dir, executor, wide_results, messages)
+            finally:
+                for _, df in samples:
+                    if isinstance(df, TrackStore):
+                        df.remove()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return messages
+
+
+def run_batch_analysis(file_path, samples, analysis, values, output_dir, executor, wide_results, messages):
+    """
+    Run one analysis over the sheets of a workbook and write its results, see `run_batch`.
+
+    Args:
+        file_path (Path): Workbook the samples were read from.
+        samples (list of tuples): ((filename, sheetname), DataFrame or TrackStore) of the valid sheets.
+        analysis (str): Key of `ANALYSES`.
+        values (dict): Analysis parameters.
+        output_dir (Path): Directory where results are written.
+        executor (concurrent.futures.Executor | None): Pool to run on.
+        wide_results (bool): Also write the condition results into the analysed sheets.
+        messages (list of str): Warnings and errors, appended to.
+    """
+    results = {}
+    # Analyses modify the sheets they get, stores are read-only
+    copies = [(filename, df if isinstance(df, TrackStore) else df.copy()) for filename, df in samples]
+    for i, data, sheet_results, warnings, error in analyse_samples(copies, analysis, values, executor):
+        filename = samples[i][0]
+        for warning in warnings:
+            messages.append(f"{filename[0]} {filename[1]} {warning}")
+        if sheet_results is None:
+            messages.append(f"{filename[0]} {filename[1]}: {analysis} failed: {error}")
+            continue
+        results[i] = (data, sheet_results, result_label(analysis, filename), filename[1])
+
+    if not results:
+        return
+    results = [results[i] for i in sorted(results)]
+
+    stem = output_dir / f"{file_path.stem}_{analysis}"
+    summaries = [(sheet_results.summary, label) for _, sheet_results, label, _ in results]
+    with pd.ExcelWriter(stem.with_suffix(".xlsx"), engine='openpyxl') as writer:
+        for data, sheet_results, _, sheet_name in results:
+            if data is None:
+                continue  # analysed from a TrackStore, only the summary is written
+            if wide_results:
+                data = with_sheet_columns(data, [sheet_results])
+            data.to_excel(writer, sheet_name=sheet_name, index=False)
+        summary_sheet = SUMMARY_SHEET
+        while summary_sheet in writer.sheets:
+            summary_sheet = f"{summary_sheet}_"
+        results_table(summaries).to_excel(writer, sheet_name=summary_sheet, index=False)
+
+    # Values of every track, also for the sheets analysed from a TrackStore; a CSV has no row limit
+    tracks_table([(sheet_results, label) for _, sheet_results, label, _ in results]).to_csv(
+        stem.with_name(f"{stem.name}_tracks.csv"), index=False)
+
+    figure = Figure(figsize=(8, 6))
+    ax = figure.add_subplot(111)
+    plot_results(ax, analysis, summaries, values)
+    figure.savefig(stem.with_suffix(".png"))
+    logger.info(f"Batch : {analysis} of {file_path.name} written to {stem}")
@@ -0,0 +1,186 @@
+# This code keeps the results of an analysis of one condition apart from the analysed
+# sheet, in long format (one row per lag), and exports them to the in-sheet layout
+
+
+import numpy as np
+import pandas as pd
+
+# Columns of the condition summary of every analysis
+SUMMARY_COLUMNS = ("lag", "time", "mean", "sem", "n")
+
+
+def summary_table(lags, time_interval, mean, sem, n):
+    """
+    Builds the condition summary of an analysis.
+
+    Args:
+        lags (np.ndarray): Lag of each row, in slices.
+        time_interval (float): Time between slices.
+        mean (np.ndarray): Condition average at each lag.
+        sem (np.ndarray): Standard error of the mean at each lag.
+        n (np.ndarray): Number of tracks with a value at each lag.
+
+    Returns:
+        pd.DataFrame: One row per lag with the columns of SUMMARY_COLUMNS.
+    """
+    lags = np.asarray(lags)
+    return pd.DataFrame({
+        "lag": lags,
+        "time": lags * time_interval,
+        "mean": np.asarray(mean, dtype=float),
+        "sem": np.asarray(sem, dtype=float),
+        "n": np.asarray(n, dtype=np.int64),
+    })
+
+
+def condition_mean_sem(track_values):
+    """
+    Averages per-track values over the tracks of a condition, ignoring NaN, so that the
+    number of tracks reported at each lag is the number of values averaged.
+
+    Args:
+        track_values (np.ndarray): (n_tracks, n_steps) array of per-track values.
+
+    Returns:
+        tuple: (mean, sem, n) arrays of length n_steps, n being the number of tracks
+        with a value. SEM uses ddof=1 and is NaN when fewer than 2 tracks have a value.
+    """
+    valid = ~np.isnan(track_values)
+    n = valid.sum(axis=0)
+    values = np.where(valid, track_values, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = values.sum(axis=0) / n
+        deviations = np.where(valid, track_values - mean, 0.0)
+        sem = np.sqrt((deviations**2).sum(axis=0) / (n - 1)) / np.sqrt(n)
+    mean[n == 0] = np.nan
+    sem[n < 2] = np.nan
+    return mean, sem, n
+
+
+def results_table(summaries):
+    """
+    Stacks the summaries of several conditions, e.g. to export the data of a plot.
+
+    Args:
+        summaries (list of tuples): (summary, condition label) for each condition.
+
+    Returns:
+        pd.DataFrame: 'condition' followed by SUMMARY_COLUMNS.
+    """
+    frames = [summary.assign(condition=label) for summary, label in summaries]
+    if not frames:
+        return pd.DataFrame(columns=["condition", *SUMMARY_COLUMNS])
+    return pd.concat(frames, ignore_index=True)[["condition", *SUMMARY_COLUMNS]]
+
+
+def tracks_table(results):
+    """
+    Stacks the per-track values of several conditions in long format.
+
+    Args:
+        results (list of tuples): (AnalysisResults, condition label) for each condition.
+
+    Returns:
+        pd.DataFrame: 'condition' followed by the columns of `AnalysisResults.track_table`.
+    """
+    frames = [result.track_table().assign(condition=label) for result, label in results]
+    columns = ["condition", "Track n", "lag", "time", "value"]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)[columns]
+
+
+class AnalysisResults():
+    """
+    Results of one analysis of one condition (sheet): the values of every track and
+    the condition summary computed from them. Analyses produce it, plots read the
+    summary and `sheet_columns` gives the former in-sheet layout for exports.
+
+    Args:
+        analysis (str): Key of ANALYSES.
+        values (dict): Parameters the analysis was run with.
+        track_ids (np.ndarray): Ids of the analysed tracks in ascending order.
+        track_values (np.ndarray): `track_values` of the analysis, one row per track
+            and one column per row of `summary` (a single value per track for Speed).
+        summary (pd.DataFrame): Condition average, SEM and number of tracks per lag,
+            see `summary_table`.
+    """
+    def __init__(self, analysis, values, track_ids, track_values, summary):
+        self.analysis = analysis
+        self.values = values
+        self.track_ids = np.asarray(track_ids)
+        self.track_values = np.asarray(track_values)
+        self.summary = summary
+
+    def track_table(self):
+        """
+        Per-track values in long format.
+
+        Returns:
+            pd.DataFrame: One row per track and lag with 'Track n', 'lag', 'time' and 'value'.
+        """
+        # A sheet without tracks has no lags to reshape to
+        n_lags = self.track_values.size // len(self.track_ids) if len(self.track_ids) else 0
+        values = self.track_values.reshape(len(self.track_ids), n_lags)
+        return pd.DataFrame({
+            "Track n": np.repeat(self.track_ids, n_lags),
+            "lag": np.tile(self.summary["lag"].to_numpy()[:n_lags], len(self.track_ids)),
+            "time": np.tile(self.summary["time"].to_numpy()[:n_lags], len(self.track_ids)),
+            "value": values.ravel(),
+        })
+
+    def sheet_columns(self, n_rows):
+        """
+        The summary in the layout the analyses used to write in the sheet: the averages
+        and SEM down the first rows (MSD, directionality ratio), in the first two rows
+        (speed), or one column per step with the average and SEM in the first two rows
+        (autocorrelation). Other rows are NaN.
+
+        Args:
+            n_rows (int): Number of rows of the sheet.
+
+        Returns:
+            dict: Column name -> array of length `n_rows`.
+        """
+        mean = self.summary["mean"].to_numpy()
+        sem = self.summary["sem"].to_numpy()
+        if self.analysis == "MSD":
+            return {"avg_msd_by_time_condition": padded(mean, n_rows), "sem_by_time_condition": padded(sem, n_rows)}
+        if self.analysis == "Directionality_Ratio":
+            return {"average_dir_ratio": padded(mean, n_rows), "sem_average_dir_ratio": padded(sem, n_rows)}
+        if self.analysis == "Speed":
+            return {"avg_speed_of_condition": padded(np.concatenate([mean[:1], sem[:1]]), n_rows)}
+
+        columns = {}
+        for row in self.summary.itertuples(index=False):
+            pair = [row.mean, row.sem] if row.n > 0 else []
+            columns[f"scalar_time_{row.lag * self.values['time_interval']}"] = padded(pair, n_rows)
+        return columns
+
+
+def padded(values, n_rows):
+    """
+    Writes values at the top of a NaN column of `n_rows` rows, truncating them if needed.
+    """
+    column = np.full(n_rows, np.nan)
+    values = np.asarray(values, dtype=float)[:n_rows]
+    column[:len(values)] = values
+    return column
+
+
+def with_sheet_columns(data, results):
+    """
+    Copy of an analysed sheet with the condition results in the in-sheet layout.
+
+    Args:
+        data (pd.DataFrame): Analysed sheet.
+        results (iterable of AnalysisResults): Results of the analyses of the sheet.
+
+    Returns:
+        pd.DataFrame: `data` with the columns of `AnalysisResults.sheet_columns` added.
+    """
+    data = data.copy()
+    for result in results:
+        for name, column in result.sheet_columns(len(data)).items():
+            data[name] = column
+    return data
@@ -1,5 +1,7 @@
 import numpy as np
-from logs.logger import app_logger as logger
+from src.Analysis.results import condition_mean_sem, summary_table
+from src.utils.kinematics import get_kinematics
+from src.utils.track_table import TrackTable
 
 class Speed():
     """
@@ -9,11 +11,18 @@ class Speed():
         data (pd.DataFrame): Trajectory data containing at least 'X', 'Y', 'Track n', 'Slice n'.
         values (dict): Parameters, must contain:
             - 'time_interval': interval between slices
+        table (TrackTable, optional): Track index of `data`. Built from `data` if not given.
+
+    Attributes:
+        track_values (np.ndarray): Average speed of each cell.
+        summary (pd.DataFrame): Condition average and SEM of speed, one row for the
+            lag of one slice the speeds are measured over, see `summary_table`.
     """
-    def __init__(self, data, values):
+    def __init__(self, data, values, table=None):
         super().__init__()
         self.data = data
         self.values = values
+        self.table = table if table is not None else TrackTable(data)
 
         self.speed()
 
@@ -24,98 +33,60 @@ class Speed():
         - Distance between points
         - Instantaneous speed (distance / time)
         - Average speed per cell
-        - Average and SEM speed per condition
+        - Average and SEM speed per condition, in `summary`
         """
-        # Flags to control which columns need to be computed
-        calculate_dxdy = False
-        calculate_time = False
-        calculate_dbp = False
-        calculate_speed = False
-
-        if 'ΔX' not in self.data.columns or 'ΔY' not in self.data.columns:
-            self.data['ΔX'] = np.nan
-            self.data['ΔY'] = np.nan
-            calculate_dxdy = True
-        
-        if 'time' not in self.data.columns:
-            self.data['time'] = np.nan
-            calculate_time = True
-
-        if 'distance_bw_points' not in self.data.columns:
-            self.data['distance_bw_points'] = np.nan
-            calculate_dbp = True
-
-        if 'instant_speed' not in self.data.columns:
-            self.data["instant_speed"] = np.nan
-            calculate_speed = True
-            
-        self.data["avg_speed_by_cell"] = np.nan
-        self.data["avg_speed_of_condition"] = np.nan
-
-        avg_speeds = []
-
-        for track_id in sorted(self.data["Track n"].unique()):
-            track_df = self.data[self.data["Track n"] == track_id].sort_values("Slice n")
-
-            if calculate_dxdy:
-                track_df['ΔX'] = track_df['X'].diff()
-                track_df['ΔY'] = track_df['Y'].diff()
-            
-            if calculate_dbp:
-                track_df['distance_bw_points'] = np.sqrt(track_df['ΔX']**2 + track_df['ΔY']**2)
-
-            if calculate_time:
-                track_df["time"] = track_df["Slice n"] * self.values['time_interval']
-
-            if calculate_speed:
-                dx = track_df['distance_bw_points'].to_numpy()
-                dy = track_df['time'].to_numpy()
-                
-                track_df["instant_speed"] = dx / dy
-
-            # Average speed per track (ignoring NaNs)
-            avg = track_df["instant_speed"].mean(skipna=True)
-            avg_speeds.append(avg)
-            
-            # Save computed columns back to the main DataFrame
-            self.data.loc[track_df.index, ['ΔX', 'ΔY', 'distance_bw_points', 'time', 'instant_speed']] = \
-                track_df[['ΔX', 'ΔY', 'distance_bw_points', 'time', 'instant_speed']]
-
-            # Store average speed in the first row of the track
-            self.data.loc[track_df.index[0], "avg_speed_by_cell"] = avg
-
-        if avg_speeds:
-            avg = np.mean(avg_speeds)
-            err = np.std(avg_speeds, ddof=1) / np.sqrt(len(avg_speeds))
-            combined = f"{avg:.3f} ± {err:.3f}"
-
-            self.data.loc[0, "avg_speed_of_condition"] = avg
-            self.data.loc[1, "avg_speed_of_condition"] = err
-                    
+        table = self.table
+
+        kinematics = get_kinematics(table, self.values['time_interval'])
+        instant_speed = kinematics.instant_speed
+
+        # Save computed columns back to the main DataFrame
+        self.data['ΔX'] = table.scatter(kinematics.delta_x)
+        self.data['ΔY'] = table.scatter(kinematics.delta_y)
+        self.data['time'] = table.scatter(kinematics.time)
+        self.data['distance_bw_points'] = table.scatter(kinematics.distance)
+        self.data['instant_speed'] = table.scatter(instant_speed)
+
+        # Average speed per track (ignoring NaNs), stored in the first row of the track
+        avg_speeds = table.mean(instant_speed)
+        avg_by_cell = np.full(len(table), np.nan)
+        avg_by_cell[table.starts] = avg_speeds
+        self.data["avg_speed_by_cell"] = table.scatter(avg_by_cell)
+
+        self.track_values = avg_speeds
+        self.summary = speed_summary(avg_speeds, self.values)
+
+def speed_summary(track_values, values):
+    """
+    Computes the condition average and SEM of speed from the per-cell averages.
+
+    Args:
+        track_values (np.ndarray): Average speed of each cell.
+        values (dict): Parameters with 'time_interval'.
+
+    Returns:
+        pd.DataFrame: Condition summary with one row, see `summary_table`.
+    """
+    avg, err, n = condition_mean_sem(np.reshape(track_values, (-1, 1)))
+    return summary_table([1], values['time_interval'], avg, err, n)
+
 def plot_speed(ax, speed_data_by_condition):
     """
     Plots average speed per condition as a bar chart.
 
     Args:
         ax (matplotlib.axes.Axes): Axis to draw on.
-        speed_data_by_condition (list): List of tuples (DataFrame, label).
+        speed_data_by_condition (list): List of tuples (summary, label), see `Speed.summary`.
     """
 
     labels = []
     avg_values = []
     errors = []
 
-    for df, label in speed_data_by_condition:
-        try:
-            vals = df["avg_speed_of_condition"].dropna().unique()
-
-            avg_str = float(vals[0])
-            err = float(vals[1])
-            labels.append(label)
-            avg_values.append(avg_str)
-            errors.append(err)
-        except Exception as e:
-            logger.exception(f"Error processing condition '{label}': {e}")
+    for summary, label in speed_data_by_condition:
+        labels.append(label)
+        avg_values.append(float(summary["mean"].iloc[0]))
+        errors.append(float(summary["sem"].iloc[0]))
 
     x = np.arange(len(labels))
 
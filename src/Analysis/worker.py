@@ -0,0 +1,88 @@
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+from logs.logger import app_logger as logger
+
+from src.Analysis.pipeline import analyse_samples, create_executor
+from src.utils.track_store import TrackStore
+
+
+class AnalysisWorkerSignals(QObject):
+    """
+    Signals emitted by AnalysisWorker. They are delivered to the GUI thread,
+    so slots connected to them may touch widgets and models.
+
+    Signals:
+        sample_started (int, str): Index and description of the sample being analysed.
+        sample_done (int, object, object, list, str): Index, analysed DataFrame (None on failure),
+            AnalysisResults of the analysis (or None), warnings and error message
+            (empty string on success).
+        finished (bool): Emitted once at the end, True if the run was cancelled.
+    """
+    sample_started = pyqtSignal(int, str)
+    sample_done = pyqtSignal(int, object, object, list, str)
+    finished = pyqtSignal(bool)
+
+
+class AnalysisWorker(QRunnable):
+    """
+    Runs one analysis over several samples outside of the GUI thread.
+
+    Only plain data goes in and out: the worker never touches Qt widgets, results are
+    sent back through `signals`. Samples may complete out of order when a process pool is used.
+
+    Args:
+        analysis (str): Analysis name (key of ANALYSES or "Trajectories").
+        samples (list of tuples): (filename, DataFrame or TrackStore) for each sample, filename = (file, sheet).
+            TrackStores are removed when the run ends.
+        values (dict): Analysis parameters.
+    """
+    def __init__(self, analysis, samples, values):
+        super().__init__()
+        self.analysis = analysis
+        self.samples = samples
+        self.values = values
+        self.signals = AnalysisWorkerSignals()
+        self.cancelled = False
+
+    def cancel(self):
+        """
+        Ask the worker to stop after the sample in progress.
+        """
+        self.cancelled = True
+
+    def run(self):
+        """
+        Analyse the samples, checking for cancellation between them. With 'n_workers' > 1
+        in the parameters, samples are spread over a process pool.
+        """
+        executor = create_executor(self.values)
+        try:
+            results = analyse_samples(
+                self.samples, self.analysis, self.values, executor,
+                cancelled=lambda: self.cancelled, on_start=self.on_start)
+            for i, data, sample_results, warnings, error in results:
+                self.signals.sample_done.emit(i, data, sample_results, warnings, error)
+        except Exception as e:
+            # The run still finishes, so that the progress dialog is closed
+            logger.exception(f"Analysis {self.analysis} stopped: {e}")
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+            # Memory-mapped copies of large sheets are only needed by the run
+            for _, sample in self.samples:
+                if isinstance(sample, TrackStore):
+                    sample.remove()
+
+        if self.cancelled:
+            logger.info(f"Analysis {self.analysis} cancelled")
+        self.signals.finished.emit(self.cancelled)
+
+    def on_start(self, i):
+        """
+        Report that a sample started (or was submitted to the process pool).
+
+        Args:
+            i (int): Index of the sample.
+        """
+        filename = self.samples[i][0]
+        self.signals.sample_started.emit(i, f"{filename[0]} {filename[1]}")
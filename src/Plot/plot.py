@@ -8,6 +8,9 @@ from logs.logger import app_logger as logger
 
 import os
 
+# Save filter of the plotted values
+CSV_FILTER = "CSV Files, plotted values (*.csv)"
+
 class PlotDialog(QDialog):
     """
     A custom dialog window for displaying and saving matplotlib plots
@@ -18,6 +21,7 @@ class PlotDialog(QDialog):
         analysis (str): Description or type of the analysis (e.g., "Speed", "MSD").
         figure (Figure): Matplotlib Figure object used for plotting.
         canvas (FigureCanvas): Canvas to embed the matplotlib figure into Qt widget.
+        data (pd.DataFrame | None): Plotted values, offered as CSV when saving if set.
     """
     def __init__(self, filename, analysis, title="Plot", parent=None):
         """
@@ -32,6 +36,7 @@ class PlotDialog(QDialog):
         super().__init__(parent)
         self.filename = filename
         self.analysis = analysis
+        self.data = None
         self.ui = Ui_Plot()
         self.ui.setupUi(self)
         self.setWindowTitle(title)
@@ -49,14 +54,23 @@ class PlotDialog(QDialog):
 
     def save_figure(self):
         """
-        Opens a file dialog to save the current figure as PNG or PDF.
+        Opens a file dialog to save the current figure as PNG or PDF, or the plotted
+        values as CSV when the dialog has data.
         """
         # Use base name of the input file for default name
         file = os.path.basename(self.filename[0])
-        path, _ = QFileDialog.getSaveFileName(self, "Save Plot", f"{file} {self.analysis}", "PNG Files (*.png);;PDF Files (*.pdf);;All Files (*)")
-        if path:
-            self.figure.savefig(path)
-            logger.info(f"Plot Module : Figure saved at {path}")
+        filters = ["PNG Files (*.png)", "PDF Files (*.pdf)", *([CSV_FILTER] if self.data is not None else []), "All Files (*)"]
+        path, selected = QFileDialog.getSaveFileName(self, "Save Plot", f"{file} {self.analysis}", ";;".join(filters))
+        if not path:
+            return
+        if self.data is not None and (selected == CSV_FILTER or path.lower().endswith(".csv")):
+            if not path.lower().endswith(".csv"):
+                path += ".csv"
+            self.data.to_csv(path, index=False)
+            logger.info(f"Plot Module : Data saved at {path}")
+            return
+        self.figure.savefig(path)
+        logger.info(f"Plot Module : Figure saved at {path}")
 
     def show_plot(self, plot_func):
         """
@@ -0,0 +1,199 @@
+import numpy as np
+import pandas as pd
+
+from logs.logger import app_logger as logger
+
+from src.Analysis.autocorrelation import direction_scalars
+from src.Analysis.dir_ratio import directionality_ratio
+from src.utils.kinematics import get_kinematics
+from src.utils.track_table import TrackTable
+
+# Steps (in frames) of the autocorrelation curve fitted for the persistence
+PERSISTENCE_STEPS = 9
+# Lags (in frames) averaged for the per-cell MSD
+MSD_LAGS = (1, 2)
+
+
+def cell_features(data, condition, time_interval):
+    """
+    Computes the per-cell parameters compared by the statistical tests:
+    - Mean Squared Displacement (MSD)
+    - Instantaneous Speed
+    - Directionality Ratio
+    - Autocorrelation (Migration Persistence)
+
+    All cells of the sheet are processed together with array operations.
+    Module-level and Qt-free so it can run in a worker process.
+
+    Args:
+        data (pd.DataFrame): Sheet data with 'Track n', 'Slice n', 'X', 'Y'.
+        condition (str): Condition name (sheet name) stored with every cell.
+        time_interval (float): Time between slices.
+
+    Returns:
+        pd.DataFrame: One row per cell.
+    """
+    table = TrackTable(data)
+    kinematics = get_kinematics(table, time_interval)
+
+    # Calculate Speed
+    avg_speed = table.mean(kinematics.instant_speed)
+
+    # Calculate MSD, averaged over the first lags
+    avg_msd = np.mean([lag_msd(table, lag) for lag in MSD_LAGS], axis=0)
+
+    # Calculate Directionality
+    _, _, dir_ratio = directionality_ratio(table, kinematics.distance)
+    avg_dir = table.mean(dir_ratio)
+
+    # Calculate Autocorrelation and fit A(t) = exp(-alpha * t)
+    scalars, _, _ = direction_scalars(table, kinematics.cos_theta, kinematics.sin_theta, PERSISTENCE_STEPS)
+    times = np.arange(1, PERSISTENCE_STEPS + 1) * time_interval
+    alpha, quality = fit_persistence(times, scalars)
+
+    # Cells without any point have no fit, their alpha is NaN
+    failed = int((~quality['converged'] & (quality['n_points'] > 0)).sum())
+    if failed:
+        logger.warning(f"Stats Module : {condition}: persistence fit did not converge for {failed} of {table.n_tracks} cells")
+
+    return pd.DataFrame({
+        'cell_id': table.track_ids,
+        'condition': condition,
+        'Speed': avg_speed,
+        'MSD': avg_msd,
+        'Directionality Ratio': avg_dir,
+        'Migration Persistence (Autocorrelation)': alpha,
+        'Persistence fit R2': quality['r2'],
+        'Persistence fit RMSE': quality['rmse'],
+        'Persistence fit points': quality['n_points'],
+        'Persistence fit converged': quality['converged']
+    })
+
+
+def lag_msd(table, lag):
+    """
+    Mean squared displacement of every track for one lag.
+
+    Args:
+        table (TrackTable): Track index of the data.
+        lag (int): Lag in frames.
+
+    Returns:
+        np.ndarray: One value per track, NaN if the track is not longer than `lag`
+        or a displacement involves a missing coordinate.
+    """
+    rows = np.flatnonzero(table.position + lag < np.repeat(table.lengths, table.lengths))
+    squares = (table.x[rows + lag] - table.x[rows])**2 + (table.y[rows + lag] - table.y[rows])**2
+
+    track = table.track_index[rows]
+    sums = np.bincount(track, weights=squares, minlength=table.n_tracks)
+    counts = np.bincount(track, minlength=table.n_tracks)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return sums / counts
+
+
+def persistence_start(times, scalars):
+    """
+    Closed-form estimate of alpha for every cell: weighted least squares of
+    log A(t) = -alpha * t on the positive points, weighted by A(t)^2 to undo the
+    stretching of small values by the logarithm.
+
+    Args:
+        times (np.ndarray): Time of each step, length n_steps.
+        scalars (np.ndarray): (n_cells, n_steps) average scalar products, NaN where missing.
+
+    Returns:
+        np.ndarray: alpha of each cell, NaN for cells without a positive point.
+    """
+    positive = scalars > 0
+    y = np.where(positive, scalars, 1.0)
+    weights = np.where(positive, y**2, 0.0)
+    numerator = (weights * times * np.log(y)).sum(axis=1)
+    denominator = (weights * times**2).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, -numerator / denominator, np.nan)
+
+
+def fit_persistence(times, scalars, alpha0=0.01, max_iter=100, tol=1.49e-8):
+    """
+    Least-squares fit of A(t) = exp(-alpha * t) to the autocorrelation curves of all cells
+    at once. The closed-form `persistence_start` estimate is refined with Gauss-Newton steps
+    inside a trust region (the Levenberg-Marquardt scheme of scipy's curve_fit).
+
+    Args:
+        times (np.ndarray): Time of each step, length n_steps.
+        scalars (np.ndarray): (n_cells, n_steps) average scalar products, NaN where missing.
+        alpha0 (float, optional): Start for cells without a positive point.
+        max_iter (int, optional): Maximum number of refinement steps.
+        tol (float, optional): Relative reduction of the squared error, or relative size of
+            the trust region, below which a cell has converged (curve_fit's defaults).
+
+    Returns:
+        tuple: (alpha, quality) where alpha is NaN for cells without any point and quality
+        is a dict of per-cell arrays: 'r2' (coefficient of determination), 'rmse', 'n_points'
+        and 'converged' (False for cells without any point, which are not fitted).
+    """
+    valid = ~np.isnan(scalars)
+    y = np.where(valid, scalars, 0.0)
+    t = np.broadcast_to(times, y.shape)
+
+    def residuals(alpha, rows):
+        with np.errstate(over='ignore', invalid='ignore'):
+            model = np.exp(-alpha[:, None] * t[rows])
+        return model, np.where(valid[rows], model - y[rows], 0.0)
+
+    everything = np.arange(len(y))
+    alpha = persistence_start(times, np.where(valid, scalars, np.nan))
+    alpha = np.where(np.isnan(alpha), alpha0, alpha)
+    radius = 100 * np.where(alpha != 0, np.abs(alpha), 1.0)
+    model, residual = residuals(alpha, everything)
+    cost = (residual**2).sum(axis=1)
+    converged = np.zeros(len(y), dtype=bool)
+    rows = np.flatnonzero(valid.any(axis=1))
+
+    for _ in range(max_iter):
+        if not len(rows):
+            break
+        # Only the cells that have not converged yet are updated
+        a, r, c = alpha[rows], radius[rows], cost[rows]
+        jacobian = np.where(valid[rows], -t[rows] * model[rows], 0.0)
+        gradient = (jacobian * residual[rows]).sum(axis=1)
+        hessian = (jacobian**2).sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = np.where(hessian > 0, -gradient / hessian, 0.0)
+        step = np.clip(step, -r, r)
+
+        trial = a + step
+        trial_model, trial_residual = residuals(trial, rows)
+        trial_cost = (trial_residual**2).sum(axis=1)
+
+        # Reduction of the squared error: actual, and predicted by the linearized model
+        actual = c - trial_cost
+        predicted = -(2 * gradient * step + hessian * step**2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.where(predicted > 0, actual / predicted, 0.0)
+
+        # Shrink the region after poor steps, grow it after good ones
+        radius[rows] = np.where(ratio < 0.25, 0.5 * np.abs(step), np.where(ratio > 0.75, np.maximum(r, 2 * np.abs(step)), r))
+        done = ((np.abs(actual) <= tol * c) & (predicted <= tol * c) & (ratio <= 2)) | (radius[rows] <= tol * np.abs(a))
+
+        accepted = ratio > 1e-4
+        kept = rows[accepted]
+        alpha[kept] = trial[accepted]
+        cost[kept] = trial_cost[accepted]
+        model[kept] = trial_model[accepted]
+        residual[kept] = trial_residual[accepted]
+
+        finished = done | (hessian == 0)
+        converged[rows[finished]] = True
+        rows = rows[~finished]
+
+    n_points = valid.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = y.sum(axis=1) / n_points
+        total = np.where(valid, y - mean[:, None], 0.0)
+        r2 = 1 - cost / (total**2).sum(axis=1)
+        rmse = np.sqrt(cost / n_points)
+
+    alpha[n_points == 0] = np.nan
+    return alpha, {'r2': r2, 'rmse': rmse, 'n_points': n_points, 'converged': converged}
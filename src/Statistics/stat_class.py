@@ -2,16 +2,16 @@ from ui.configuration.choose_sample_window import Ui_ChooseSampleWindow
 from ui.stats.result_window import Ui_StatsWindow
 from ui.stats.parameters_window import Ui_Stat_parameters_window
 
-from src.data_model import DataModel
+from src.data_model import CellDelegate, DataModel
 from src.Statistics.ttest import run_ttest
 from src.Statistics.anova import run_anova
+from src.Statistics.features import cell_features
+from src.Analysis.pipeline import create_executor
 
 from logs.logger import app_logger as logger
 
 import pandas as pd
-import numpy as np
 from scipy.stats import shapiro
-from scipy.optimize import curve_fit
 
 from PyQt6.QtWidgets import QMessageBox
 
@@ -33,6 +33,7 @@ class UIStat(QWidget):
         super().__init__()
         self.ui = ui
         self.parameter = None
+        self.n_workers = 1
         self.ui.actionANOVA.triggered.connect(lambda: self.run("ANOVA"))
         self.ui.actionTtest.triggered.connect(lambda: self.run("TTest")) 
 
@@ -73,11 +74,11 @@ class UIStat(QWidget):
 
     def open_parameter_windows(self):
         """
-        Opens the parameter selection dialog, where the user chooses the time interval
-        and the measurement parameter for analysis.
+        Opens the parameter selection dialog, where the user chooses the time interval,
+        the number of processes and the measurement parameter for analysis.
 
         Returns:
-            None if cancelled, otherwise sets `self.parameter` and `self.time_interval`.
+            None if cancelled, otherwise sets `self.parameter`, `self.time_interval` and `self.n_workers`.
         """
         dialog = QDialog(self)
         ui = Ui_Stat_parameters_window()
@@ -86,6 +87,9 @@ class UIStat(QWidget):
         if dialog.exec() == QDialog.DialogCode.Accepted:
             try:
                 self.time_interval = float(ui.lineEdit_2.text())
+                self.n_workers = int(ui.lineEdit_n_workers.text())
+                if self.n_workers < 1:
+                    raise ValueError(f"Number of processes must be at least 1, got {self.n_workers}")
                 self.parameter = str(ui.comboBox.currentText())
             except Exception as e:
                 logger.warning(f"Error Stats module open_parameter_windows: {e}")
@@ -158,7 +162,7 @@ class UIStat(QWidget):
 
         The results are stored in `self.cell_data` as a DataFrame.
         """
-        cells = []
+        samples = []
 
         for filename in self.selected_samples:
             # Set stacked widget to correct file
@@ -181,93 +185,27 @@ class UIStat(QWidget):
             data_model = table.model()
             if not hasattr(data_model, "get_dataframe"):
                 continue
+            error = data_model.validate()
+            if error is not None:
+                logger.error(f"Stats Module : not correct data in the sheet '{filename[1]}', sheet skipped: {error}")
+                QMessageBox.critical(self, "Error", f"Not correct data in the sheet '{filename[1]}', sheet skipped: {error}")
+                continue
             data = data_model.get_dataframe()
             if data is None:
                 logger.error("Stats Module : pretreat_data None data")
                 continue
 
-            for track_id in sorted(data["Track n"].unique()):
-                try:
-                    track_df = data[data["Track n"] == track_id].sort_values("Slice n")
-
-                    track_df['time'] = track_df['Slice n'] * 10
-                    dx = track_df['X'].to_numpy()
-                    dy = track_df['Y'].to_numpy()
-
-                    track_df['ΔX'] = track_df['X'].diff()
-                    track_df['ΔY'] = track_df['Y'].diff()
-
-                    track_df['distance_bw_points'] = np.sqrt(track_df['ΔX']**2 + track_df['ΔY']**2)
-
-                    # Calculate MSD
-                    msd = np.zeros(3)
-                    for tau in range(1, 3):
-                        displacements = (dx[tau:] - dx[:-tau])**2 + (dy[tau:] - dy[:-tau])**2
-                        msd[tau] = np.mean(displacements)
-                    avg_msd_1 = np.mean(msd[1:])
-
-                    # Calculate Speed
-                    track_df["instant_speed"] = track_df['distance_bw_points'].to_numpy() / track_df['time'].to_numpy()
-                    avg_speed = track_df["instant_speed"].mean(skipna=True)
-
-                    # Calculate Directionality
-                    track_df['Δ(xi-x0)'] = dx - dx[0]
-                    track_df['Δ(yi-y0)'] = dy - dy[0]
-
-                    track_df['distance_to_start'] = np.sqrt(track_df['Δ(xi-x0)']**2 + track_df['Δ(yi-y0)']**2)
-                    track_df['cumulative_distance'] = track_df['distance_bw_points'].fillna(0).cumsum()
-
-                    track_df["dir_ratio"] = track_df["distance_to_start"] / track_df["cumulative_distance"]
-                    track_df["dir_ratio"] = track_df["dir_ratio"].replace([np.inf, -np.inf], np.nan)
-                    avg_dir = track_df['dir_ratio'].mean(skipna=True)
+            samples.append((data, filename[1], self.time_interval))
 
-                    # Calculate Autocorrelation
-                    track_df['magnitude'] = np.sqrt(track_df['ΔX']**2 + track_df['ΔY']**2)
-                    track_df['cos_theta'] = track_df['ΔX'] / track_df['magnitude']
-                    track_df['sin_theta'] = track_df['ΔY'] / track_df['magnitude']
-
-                    dx = track_df['cos_theta'].to_numpy()
-                    dy = track_df['sin_theta'].to_numpy()
-                    avg_scalars = []
-                    steps = []
-                    for step in range(1, 10):
-                        scalars = []
-                        for i in range(len(track_df) - step):
-                            v1 = np.array([dx[i], dy[i]])
-                            v2 = np.array([dx[i + step], dy[i + step]])
-                            if np.any(np.isnan(v1)) or np.any(np.isnan(v2)):
-                                continue
-                            scalar = np.dot(v1, v2)
-                            scalars.append(scalar)
-
-                        if scalars:
-                            avg = np.mean(scalars)
-                            avg_scalars.append(avg)
-                            steps.append(step * self.time_interval)
-                except Exception as e:
-                    logger.error(f"Stats Module : calculation error {e}")
-
-                # Exponential fit: A(t) = exp(-alpha * t)
-                def exp_model(t, alpha):
-                    return np.exp(-alpha * t)
-
-                try:
-                    popt, _ = curve_fit(exp_model, steps, avg_scalars, p0=[0.01])
-                    alpha = popt[0]
-                except Exception as e:
-                    logger.error(f"Stats Module : exponential fit error {e}")
-                    alpha = np.nan  # Fitting failed
-
-                cells.append({
-                    'cell_id': track_id,
-                    'condition': filename[1],
-                    'Speed': avg_speed,
-                    'MSD': avg_msd_1,
-                    'Directionality Ratio': avg_dir,
-                    'Migration Persistence (Autocorrelation)': alpha
-                })
+        # Conditions are independent, spread them over processes if asked to
+        executor = create_executor({"n_workers": self.n_workers})
+        if executor is None:
+            features = [cell_features(*sample) for sample in samples]
+        else:
+            with executor:
+                features = list(executor.map(cell_features, *zip(*samples)))
 
-        self.cell_data = pd.DataFrame(cells)
+        self.cell_data = pd.concat(features, ignore_index=True) if features else pd.DataFrame()
 
     def check_norm_dist(self):
         """
@@ -295,5 +233,6 @@ class UIStat(QWidget):
 
         data = DataModel(data)
         ui.tableView.setModel(data)
+        ui.tableView.setItemDelegate(CellDelegate(ui.tableView))
 
         dialog.exec()
@@ -0,0 +1,189 @@
+# This code converts, compares, formats and sorts the cell values of the sheet
+# models, one column (NumPy array) at a time
+
+
+import re
+
+import numpy as np
+import pandas as pd
+
+
+def format_values(values):
+    """
+    Returns the display strings of an array of cells: values as `str` prints them
+    (numbers with all their digits), '' for NaN, None and NaT.
+
+    Args:
+        values (np.ndarray): Cells of a column.
+
+    Returns:
+        list of str: Display strings.
+    """
+    kind = values.dtype.kind
+    if kind == "f":
+        items = values.tolist() if values.dtype == np.float64 else list(values)
+        return ["" if item != item else str(item) for item in items]
+    if kind in "iub":
+        return [str(item) for item in values.tolist()]
+    if kind in "mM":
+        return ["" if pd.isna(item) else str(item) for item in pd.Index(values)]
+    return ["" if is_missing(item) else str(item) for item in values]
+
+
+def column_strings(values):
+    """
+    Returns the display strings of many cells of a column, as `format_values`, formatting
+    each distinct value once when the column repeats its values (e.g. Track n, Slice n).
+
+    Args:
+        values (np.ndarray): Cells of a column.
+
+    Returns:
+        list of str: Display strings.
+    """
+    codes, uniques = pd.factorize(values)
+    if len(uniques) > len(values) // 2:
+        return format_values(values)
+    strings = np.array(format_values(np.asarray(uniques)) + [""], dtype=object)
+    return strings[codes].tolist()
+
+
+def sort_order(values, descending=False):
+    """
+    Returns the stable order of the rows sorting a column: numbers first, then text,
+    then empty cells, which stay last in descending order too (as in Excel).
+
+    Args:
+        values (np.ndarray): Cells of a column.
+        descending (bool, optional): Sort in descending order.
+
+    Returns:
+        np.ndarray: Rows of the column in sorted order.
+    """
+    sign = -1.0 if descending else 1.0
+    kind = values.dtype.kind
+    if kind in "fiub":
+        # NaN is sorted last by argsort, also once negated
+        return np.argsort(sign * values.astype(np.float64), kind='stable')
+    if kind == "M" or kind == "m":
+        keys = values.view(np.int64).astype(np.float64)
+        keys[np.isnat(values)] = np.nan
+        return np.argsort(sign * keys, kind='stable')
+
+    # Keys of the distinct values only, followed by those of the empty cells (code -1)
+    codes, uniques = pd.factorize(values)
+    uniques = np.append(np.asarray(uniques, dtype=object), None)
+    numbers = pd.to_numeric(pd.Series(uniques), errors='coerce').to_numpy(dtype=np.float64)
+    missing = pd.isna(uniques) | (uniques == "")
+    is_text = ~missing & np.isnan(numbers)
+    group = np.where(missing, 2, np.where(is_text, 1, 0))
+    text_rank = np.zeros(len(uniques))
+    text_rank[is_text] = np.argsort(np.argsort(uniques[is_text].astype(str), kind='stable'), kind='stable')
+    return np.lexsort((sign * text_rank[codes], np.nan_to_num(sign * numbers)[codes], group[codes]))
+
+
+def quote_columns(expression, columns):
+    """
+    Puts back quotes around the column names of a filter expression that are not valid
+    Python names (e.g. Track n), so that `DataFrame.eval` reads them as columns.
+
+    Args:
+        expression (str): Filter expression.
+        columns (pd.Index): Column names of the sheet.
+
+    Returns:
+        str: Expression for `DataFrame.eval`.
+    """
+    names = sorted((str(name) for name in columns if not str(name).isidentifier()), key=len, reverse=True)
+    for name in names:
+        expression = re.sub(rf"(?<![\w`]){re.escape(name)}(?![\w`])", f"`{name}`", expression)
+    return expression
+
+
+def python_value(value):
+    """
+    Returns a cell value as a Python (or pandas) scalar, for the edit role.
+    """
+    if isinstance(value, np.datetime64):
+        return pd.Timestamp(value)
+    if isinstance(value, np.timedelta64):
+        return pd.Timedelta(value)
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def is_missing(value):
+    """
+    True for the values of empty cells: None, NaN, NaT and pd.NA.
+    """
+    if value is None:
+        return True
+    if isinstance(value, str):
+        return False
+    try:
+        return bool(pd.isna(value))
+    except (TypeError, ValueError):
+        return False
+
+
+def same_value(old_value, value):
+    """
+    True if storing `value` in a cell holding `old_value` changes nothing.
+    """
+    if is_missing(old_value) or is_missing(value):
+        return is_missing(old_value) and is_missing(value)
+    try:
+        return bool(old_value == value)
+    except (TypeError, ValueError):
+        return False
+
+
+def fits(dtype, value):
+    """
+    True if `value` can be stored in an array of `dtype` without changing its type.
+    """
+    if dtype.kind == "O":
+        return True
+    if isinstance(value, (bool, np.bool_)):
+        return dtype.kind == "b"
+    if dtype.kind == "f":
+        return isinstance(value, (int, float, np.integer, np.floating))
+    if dtype.kind in "iu":
+        return isinstance(value, (int, np.integer))
+    return False
+
+
+def fits_dtype(dtype, values_dtype):
+    """
+    True if values of `values_dtype` can be stored in an array of `dtype` without changing its type.
+    """
+    if dtype.kind == "O":
+        return True
+    if dtype.kind == "f":
+        return values_dtype.kind in "fiu"
+    if dtype.kind in "iu":
+        return values_dtype.kind in "iu" and np.can_cast(values_dtype, dtype)
+    return values_dtype == dtype
+
+
+def changed_cells(old_values, values):
+    """
+    Vectorized `same_value`: True where storing `values` over `old_values` changes the cell.
+
+    Args:
+        old_values (np.ndarray): Cells of a column.
+        values (np.ndarray): New values of these cells.
+
+    Returns:
+        np.ndarray: Boolean mask of the changed cells.
+    """
+    old_missing = np.asarray(pd.isna(old_values), dtype=bool)
+    missing = np.asarray(pd.isna(values), dtype=bool)
+    try:
+        equal = np.asarray(old_values == values)
+    except (TypeError, ValueError):
+        equal = None
+    if equal is None or equal.shape != missing.shape:
+        # Values that cannot be compared, e.g. text with dates
+        equal = np.zeros(len(values), dtype=bool)
+    equal = equal.astype(bool) & ~old_missing & ~missing
+    return ~(equal | (old_missing & missing))
@@ -1,35 +1,106 @@
-from PyQt6.QtCore import Qt, QAbstractTableModel
-from PyQt6.QtGui import QUndoStack, QUndoCommand
+from collections import OrderedDict
+
+from PyQt6.QtCore import Qt, QAbstractTableModel, QTimer
+from PyQt6.QtWidgets import QLineEdit, QStyledItemDelegate
+
+import numpy as np
+import pandas as pd
+import pandera.pandas as pa
 
 from logs.logger import app_logger as logger
 
+from src.cell_values import (
+    changed_cells, column_strings, fits, fits_dtype, format_values, is_missing, python_value,
+    quote_columns, same_value, sort_order
+)
+from src.edit_commands import EditBlockCommand, EditCellCommand
+from src.utils.importers import to_float
+from src.utils.input_data import REQUIRED_COLUMNS, SliceContinuityError, validate_sheet
+from src.utils.track_store import TrackStore
+
+# Display strings are formatted and cached by blocks of rows of one column
+FORMAT_BLOCK_ROWS = 256
+# Blocks kept in the cache, about 130,000 cells: several screens of a wide sheet
+FORMAT_CACHE_BLOCKS = 512
+
 
 class DataModel(QAbstractTableModel):
     """
     A Qt data model for displaying and editing a pandas DataFrame in a QTableView.
     Includes support for undoable edits via QUndoStack.
+
+    The cells are held in one NumPy array per column. Display strings are formatted by
+    blocks of FORMAT_BLOCK_ROWS rows of a column according to its dtype (see
+    `format_values`) and kept in a cache of FORMAT_CACHE_BLOCKS blocks, so painting the
+    visible cells costs the same whatever the size of the sheet. The edit role holds the
+    typed value; entered text is converted to the type of the column (see `typed_value`),
+    a column receiving text that is not a number becoming an object column.
+
+    The view can be sorted by a column (`sort`) and filtered by an expression over the
+    columns (`set_filter`) without copying the data: the rows shown are a permutation
+    of the sheet rows (`source_row`), while `frame`, the analyses and the save keep the
+    rows of the sheet in their order.
+
+    When the sheet holds analysis results, `track_results` maps the analysis name to its
+    TrackResults. Edits of coordinates (including undo/redo) mark the track as dirty and
+    only the dirty tracks are recomputed once control returns to the event loop.
+
+    Sheets are validated on demand by `validate`, the first time they are analysed.
+    Every edit increments `revision`; `saved_revision` is the revision last written to
+    the file, so `edited` tells whether the sheet has unsaved edits.
     """
-    def __init__(self, df):
+    def __init__(self, df, copy=False):
         """
         Initialize the model with a pandas DataFrame.
 
         Args:
-            df (pandas.DataFrame): The data to be shown in the table.
+            df (pandas.DataFrame): The data to be shown in the table. Unless `copy` is
+                set, the model takes over its column arrays and writes the edits into
+                them in place, so `df` is not to be used any more by the caller.
+            copy (bool, optional): Copy the columns, for a caller that keeps using `df`.
         """
         super().__init__()
-        self._df = df
+        self._columns = [df.iloc[:, i].to_numpy(copy=copy) for i in range(df.shape[1])]
+        self._names = df.columns
+        self._index = df.index
+        self._formatted = OrderedDict() # (column, block) -> display strings of the block
+        self._rows = None # Sheet row of every view row, None when the view shows the sheet as it is
+        self._view_rows = None # View row of every sheet row, -1 for the filtered out rows
+        self.sort_column = None
+        self.sort_order = Qt.SortOrder.AscendingOrder
+        self.filter_expression = ""
+        self.track_results = {}
+        self._update_scheduled = False
+        self._validated = False
+        self._validation_error = None
+        self.revision = 0
+        self.saved_revision = 0
+
+    @property
+    def edited(self):
+        """
+        True if the sheet was edited since it was read or last saved.
+        """
+        return self.revision != self.saved_revision
+
+    @property
+    def n_rows(self):
+        """
+        Number of rows of the sheet, shown or not.
+        """
+        return len(self._index)
 
     def rowCount(self, parent=None):
         """
         Returns the number of rows in the table.
         """
-        return self._df.shape[0]
+        return self.n_rows if self._rows is None else len(self._rows)
 
     def columnCount(self, parent=None):
         """
         Returns the number of columns in the table.
         """
-        return self._df.shape[1]
+        return len(self._columns)
 
     def data(self, index, role=Qt.ItemDataRole.DisplayRole):
         """
@@ -40,14 +111,146 @@ class DataModel(QAbstractTableModel):
             role (Qt.ItemDataRole): Display role or edit role.
 
         Returns:
-            str | None: Cell value as string or None if not applicable.
+            str | float | int | bool | None: Display string of the cell, its typed value
+            for the edit role (None if empty) or None if not applicable.
         """
         if not index.isValid():
             return None
-        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
-            return str(self._df.iat[index.row(), index.column()])
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.text(index.row(), index.column())
+        if role == Qt.ItemDataRole.EditRole:
+            value = self.cell(self.source_row(index.row()), index.column())
+            if is_missing(value):
+                return None
+            return python_value(value)
         return None
-    
+
+    def cell(self, row, column):
+        """
+        Returns the value of a cell.
+
+        Args:
+            row (int): Row of the sheet, see `source_row`.
+            column (int): Position of the column.
+        """
+        return self._columns[column][row]
+
+    def source_row(self, row):
+        """
+        Returns the row of the sheet shown at a row of the view.
+        """
+        return row if self._rows is None else int(self._rows[row])
+
+    def source_rows(self, rows):
+        """
+        Returns the rows of the sheet shown at an array of rows of the view.
+        """
+        return rows if self._rows is None else self._rows[rows]
+
+    def view_row(self, row):
+        """
+        Returns the row of the view showing a row of the sheet, None if it is filtered out.
+        """
+        if self._view_rows is None:
+            return row
+        row = int(self._view_rows[row])
+        return row if row >= 0 else None
+
+    def text(self, row, column):
+        """
+        Returns the display string of a cell of the view, formatting its block of rows
+        if it is not cached.
+        """
+        block = row // FORMAT_BLOCK_ROWS
+        strings = self._formatted.get((column, block))
+        if strings is None:
+            start = block * FORMAT_BLOCK_ROWS
+            values = self._columns[column]
+            if self._rows is None:
+                strings = format_values(values[start:start + FORMAT_BLOCK_ROWS])
+            else:
+                strings = format_values(values[self._rows[start:start + FORMAT_BLOCK_ROWS]])
+            self._formatted[(column, block)] = strings
+            if len(self._formatted) > FORMAT_CACHE_BLOCKS:
+                self._formatted.popitem(last=False)
+        else:
+            self._formatted.move_to_end((column, block))
+        return strings[row % FORMAT_BLOCK_ROWS]
+
+    def block_text(self, rows, columns):
+        """
+        Returns the display strings of a block of cells as tab separated text, one line
+        per row, e.g. to copy it to the clipboard. Each column is formatted at once (see
+        `column_strings`) instead of cell by cell.
+
+        Args:
+            rows (np.ndarray): Rows of the view, in the order of the lines.
+            columns (list of int): Positions of the columns, in the order of the fields.
+
+        Returns:
+            str: Text of the block.
+        """
+        rows = self.source_rows(rows)
+        strings = [column_strings(self._columns[column][rows]) for column in columns]
+        return '\n'.join(map('\t'.join, zip(*strings)))
+
+    def typed_value(self, column, value):
+        """
+        Converts a value entered in a column to the type of the column: text of a number
+        becomes a number in numeric columns, empty text becomes NaN. Other values are kept.
+
+        Args:
+            column (int): Position of the column.
+            value: Entered value, usually text.
+
+        Returns:
+            Value to store in the column.
+        """
+        if not isinstance(value, str) or self._columns[column].dtype.kind not in "fiu":
+            return value
+        text = value.strip()
+        if not text:
+            return np.nan
+        try:
+            number = float(text)
+        except ValueError:
+            return value
+        return int(number) if number.is_integer() and self._columns[column].dtype.kind in "iu" else number
+
+    def typed_values(self, column, texts):
+        """
+        Converts a block of text entered in a column at once, as `typed_value` converts
+        one cell: in numeric columns the numbers are parsed in one vectorized pass and
+        empty text becomes NaN. If some text is not a number the block keeps it and the
+        column will become an object column.
+
+        Args:
+            column (int): Position of the column.
+            texts (np.ndarray): Entered text, object array.
+
+        Returns:
+            np.ndarray: Values to store in the column.
+        """
+        kind = self._columns[column].dtype.kind
+        if kind not in "fiu":
+            return texts
+        strings = pd.Series(texts, dtype=object).str.strip()
+        numbers = to_float(strings)
+        is_text = np.isnan(numbers) & (strings != "").to_numpy()
+        if is_text.any():
+            values = numbers.astype(object)
+            values[is_text] = texts[is_text]
+            return values
+        if kind in "iu" and np.all(numbers == np.round(numbers)):
+            return numbers.astype(np.int64)
+        return numbers
+
+    def values_at(self, column, rows):
+        """
+        Returns a copy of the cells of a column at rows of the sheet.
+        """
+        return self._columns[column][rows]
+
     def setDataWithUndo(self, index, value, undo_stack):
         """
         Set the data at the given index using an undoable command.
@@ -61,30 +264,335 @@ class DataModel(QAbstractTableModel):
             bool: True if value changed and command pushed, False otherwise.
         """
         if index.isValid():
-            old_value = self._df.iat[index.row(), index.column()]
-            if old_value != value:
-                command = EditCellCommand(self, index, old_value, value)
+            row = self.source_row(index.row())
+            old_value = python_value(self.cell(row, index.column()))
+            value = self.typed_value(index.column(), value)
+            if not same_value(old_value, value):
+                command = EditCellCommand(self, row, index.column(), old_value, value)
                 undo_stack.push(command)
                 return True
         return False
 
+    def setBlockWithUndo(self, parts, undo_stack, text="Edit"):
+        """
+        Set blocks of cells with a single undoable command, e.g. to paste a range or
+        to clear the selection. Cells whose value does not change are left out.
+
+        Args:
+            parts (list of tuple): (column, rows, texts) with the position of a column,
+                the rows of the sheet (np.ndarray, see `source_rows`) and the entered
+                text for these rows, converted with `typed_values`.
+            undo_stack (QUndoStack): Undo stack to store the operation.
+            text (str, optional): Name of the command in the undo stack.
+
+        Returns:
+            bool: True if some value changed and the command was pushed, False otherwise.
+        """
+        old_parts, new_parts = [], []
+        for column, rows, texts in parts:
+            values = self.typed_values(column, texts)
+            old_values = self.values_at(column, rows)
+            changed = changed_cells(old_values, values)
+            if changed.any():
+                old_parts.append((column, rows[changed], old_values[changed]))
+                new_parts.append((column, rows[changed], values[changed]))
+        if not new_parts:
+            return False
+        undo_stack.push(EditBlockCommand(self, old_parts, new_parts, text))
+        return True
+
     def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
         """
         Directly set data at the specified index.
 
         Args:
             index (QModelIndex): Target cell.
-            value (str): New value.
+            value (str): New value, converted with `typed_value`.
             role (Qt.ItemDataRole): Role (should be EditRole).
 
         Returns:
             bool: True if data was updated, False otherwise.
         """
         if index.isValid() and role == Qt.ItemDataRole.EditRole:
-            self._df.iat[index.row(), index.column()] = value
-            self.dataChanged.emit(index, index)
-            return True
+            return self.set_cell(self.source_row(index.row()), index.column(), value)
         return False
+
+    def set_cell(self, row, column, value):
+        """
+        Set the value of a cell of the sheet, shown or not.
+
+        Args:
+            row (int): Row of the sheet, see `source_row`.
+            column (int): Position of the column.
+            value: New value, converted with `typed_value`.
+
+        Returns:
+            bool: True once the value is set.
+        """
+        value = self.typed_value(column, value)
+        values = self._columns[column]
+        if not fits(values.dtype, value):
+            # The column changes type, the formatted strings of its other rows may change too
+            if values.dtype.kind in "iu" and isinstance(value, float):
+                values = values.astype(float)
+            else:
+                # Through pandas so that dates become Timestamps, not integers
+                values = pd.Series(values, copy=False).astype(object).to_numpy()
+            self._columns[column] = values
+            self.forget_formatted(column)
+        elif not values.flags.writeable:
+            values = self._columns[column] = values.copy()
+        values[row] = value
+        self._validated = False
+        self.revision += 1
+        view_row = self.view_row(row)
+        if view_row is not None:
+            self._formatted.pop((column, view_row // FORMAT_BLOCK_ROWS), None)
+            index = self.index(view_row, column)
+            self.dataChanged.emit(index, index)
+        self.mark_edit(row, column)
+        return True
+
+    def set_values(self, parts):
+        """
+        Set blocks of cells of the sheet, each with one vectorized assignment, and emit
+        a single dataChanged over the range of the view they span.
+
+        Args:
+            parts (list of tuple): (column, rows, values) with the position of a column,
+                the rows of the sheet (np.ndarray) and the values to store there, already
+                converted (see `typed_values`).
+        """
+        view_rows = []
+        for column, rows, values in parts:
+            array = self._columns[column]
+            if not fits_dtype(array.dtype, values.dtype):
+                if array.dtype.kind in "iu" and values.dtype.kind in "fiu":
+                    array = array.astype(np.result_type(array.dtype, values.dtype))
+                else:
+                    array = pd.Series(array, copy=False).astype(object).to_numpy()
+                self._columns[column] = array
+            elif not array.flags.writeable:
+                array = self._columns[column] = array.copy()
+            if array.dtype.kind == "O" and values.dtype.kind in "mM":
+                values = pd.Series(values, copy=False).astype(object).to_numpy()
+            array[rows] = values
+            self.forget_formatted(column)
+            view_rows.append(rows if self._view_rows is None else self._view_rows[rows])
+        self._validated = False
+        self.revision += 1
+
+        view_rows = np.concatenate(view_rows) if view_rows else np.empty(0, dtype=np.int64)
+        view_rows = view_rows[view_rows >= 0]
+        if len(view_rows):
+            columns = [column for column, _, _ in parts]
+            self.dataChanged.emit(self.index(int(view_rows.min()), min(columns)),
+                                  self.index(int(view_rows.max()), max(columns)))
+        for column, rows, _ in parts:
+            self.mark_edit(rows, column)
+
+    def forget_formatted(self, column=None):
+        """
+        Drops the cached display strings of a column, of every column if None.
+        """
+        if column is None:
+            self._formatted.clear()
+            return
+        for key in [key for key in self._formatted if key[0] == column]:
+            del self._formatted[key]
+
+    def column_position(self, name):
+        """
+        Returns the position of the first column named `name`, None if there is none.
+        """
+        positions = np.flatnonzero(self._names == name)
+        return int(positions[0]) if len(positions) else None
+
+    def validate(self):
+        """
+        Validate the sheet as input data (see `validate_sheet`), on a copy of the required
+        columns converted to numbers since edited cells may hold strings. The result is kept
+        until the next edit.
+
+        Returns:
+            Exception | None: SchemaError or SliceContinuityError, None if the sheet is valid.
+        """
+        if not self._validated:
+            df = self.frame()
+            typed = pd.DataFrame({column: pd.to_numeric(df[column], errors='coerce').astype(float)
+                                  for column in REQUIRED_COLUMNS if column in df.columns})
+            try:
+                validate_sheet(typed)
+                self._validation_error = None
+            except (pa.errors.SchemaError, SliceContinuityError) as e:
+                self._validation_error = e
+            self._validated = True
+        return self._validation_error
+
+    def mark_edit(self, rows, column):
+        """
+        Record edited cells in the stored analysis results and schedule the update
+        of the edited tracks. Results whose track structure changed are dropped.
+
+        Args:
+            rows (int | np.ndarray): Row(s) of the sheet of the edited cells.
+            column (int): Position of the column of the edited cells.
+        """
+        track_column = self.column_position("Track n")
+        if not self.track_results or track_column is None:
+            return
+
+        column = self._names[column]
+        track_ids = pd.unique(np.atleast_1d(self._columns[track_column][rows]))
+        for analysis, results in list(self.track_results.items()):
+            for track_id in track_ids:
+                results.mark_edit(column, track_id)
+            if results.stale:
+                logger.info(f"{analysis} : track structure edited, the analysis has to be run again")
+                del self.track_results[analysis]
+        self.schedule_update()
+
+    def schedule_update(self):
+        """
+        Update the dirty tracks once control returns to the event loop, so a paste or
+        a series of undos recomputes each track only once.
+        """
+        if not self._update_scheduled and any(results.dirty for results in self.track_results.values()):
+            self._update_scheduled = True
+            QTimer.singleShot(0, self.update_results)
+
+    def update_results(self):
+        """
+        Recompute the dirty tracks of every stored analysis and refresh the view.
+        """
+        self._update_scheduled = False
+        updated = False
+        data = self.frame()
+        for analysis, results in self.track_results.items():
+            try:
+                updated |= bool(results.update(data))
+            except Exception as e:
+                logger.exception(f"{analysis} : cannot update edited tracks: {e}")
+        if updated:
+            # The updated per-row columns may have been written to new arrays
+            self._columns = [data.iloc[:, i].to_numpy() for i in range(data.shape[1])]
+            self.forget_formatted()
+            if self.rowCount() and self.columnCount():
+                self.dataChanged.emit(self.index(0, 0), self.index(self.rowCount() - 1, self.columnCount() - 1))
+
+    def inherit_track_results(self, model):
+        """
+        Keep the analysis results of the model previously shown for the same sheet,
+        as long as the sheet still has the same rows.
+
+        Args:
+            model (QAbstractItemModel | None): Previous model of the table.
+        """
+        previous = getattr(model, "track_results", {})
+        if previous and model.n_rows == self.n_rows:
+            self.track_results.update(previous)
+            self.schedule_update()
+
+    def inherit_view(self, model):
+        """
+        Sort and filter the rows like the model previously shown for the same sheet,
+        e.g. before an analysis: the sort column is found by its name and the filter
+        expression is evaluated on the new rows.
+
+        Args:
+            model (QAbstractItemModel | None): Previous model of the table.
+        """
+        if not isinstance(model, DataModel) or (model.sort_column is None and not model.filter_expression):
+            return
+        if model.sort_column is not None:
+            self.sort_column = self.column_position(model._names[model.sort_column])
+            self.sort_order = model.sort_order
+        self.filter_expression = model.filter_expression
+        try:
+            self.apply_view()
+        except Exception as e:
+            logger.warning(f"Filter : '{self.filter_expression}' cannot be applied any more, removed: {e}")
+            self.filter_expression = ""
+            self.apply_view()
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        """
+        Sort the view by a column (see `sort_order`), the filtered out rows staying hidden.
+        The sheet itself is not reordered.
+
+        Args:
+            column (int): Position of the column, -1 to show the rows in the order of the sheet.
+            order (Qt.SortOrder): Ascending or descending order.
+        """
+        self.sort_column = column if 0 <= column < self.columnCount() else None
+        self.sort_order = order
+        self.apply_view()
+
+    def set_filter(self, expression):
+        """
+        Show only the rows for which an expression over the columns is true, e.g.
+        "Track n >= 10 and Track n <= 20", "X > 100 & Y < 500" or "Track n in [1, 5, 7]"
+        (see `row_mask`). An empty expression shows every row.
+
+        Args:
+            expression (str): Filter expression.
+
+        Raises:
+            ValueError: If the expression cannot be evaluated or does not give one truth
+                value per row. The previous filter is then kept.
+        """
+        expression = expression.strip()
+        if expression:
+            self.row_mask(expression)
+        self.filter_expression = expression
+        self.apply_view()
+        logger.info(f"Filter : '{expression}' shows {self.rowCount()} of {self.n_rows} rows")
+
+    def row_mask(self, expression):
+        """
+        Evaluates a filter expression over the columns of the sheet with `DataFrame.eval`,
+        in one vectorized pass. Column names holding spaces or symbols (e.g. Track n)
+        may be written as they are.
+
+        Args:
+            expression (str): Filter expression.
+
+        Returns:
+            np.ndarray: True for the rows to show.
+
+        Raises:
+            ValueError: If the expression cannot be evaluated or does not give one truth value per row.
+        """
+        df = self.frame()
+        try:
+            mask = np.asarray(df.eval(quote_columns(expression, df.columns)))
+        except Exception as e:
+            raise ValueError(f"Cannot evaluate '{expression}': {e}") from e
+        if mask.dtype != bool or mask.shape != (len(df),):
+            raise ValueError(f"'{expression}' does not compare the columns, e.g. 'Track n >= 10 and X < 500'")
+        return mask
+
+    def apply_view(self):
+        """
+        Compute the rows shown from `sort_column`, `sort_order` and `filter_expression`.
+        """
+        mask = self.row_mask(self.filter_expression) if self.filter_expression else None
+        order = None
+        if self.sort_column is not None:
+            order = sort_order(self._columns[self.sort_column], self.sort_order == Qt.SortOrder.DescendingOrder)
+
+        self.beginResetModel()
+        if order is None:
+            self._rows = None if mask is None else np.flatnonzero(mask)
+        else:
+            self._rows = order if mask is None else order[mask[order]]
+        if self._rows is None:
+            self._view_rows = None
+        else:
+            self._view_rows = np.full(self.n_rows, -1, dtype=np.int64)
+            self._view_rows[self._rows] = np.arange(len(self._rows))
+        self._formatted.clear()
+        self.endResetModel()
     
     def flags(self, index):
         return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEditable
@@ -92,11 +600,30 @@ class DataModel(QAbstractTableModel):
     def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
         if role == Qt.ItemDataRole.DisplayRole:
             if orientation == Qt.Orientation.Horizontal:
-                return str(self._df.columns[section])
+                return str(self._names[section])
             elif orientation == Qt.Orientation.Vertical:
-                return str(self._df.index[section])
+                return str(self._index[self.source_row(section)])
         return None
 
+    def to_track_store(self):
+        """
+        Writes the trajectories of the sheet to a memory-mapped TrackStore, a chunk of rows
+        at a time, instead of copying the sheet (see `get_dataframe`) for large sheets.
+
+        Returns:
+            TrackStore: Snapshot of 'Track n', 'Slice n', 'X' and 'Y', removed by the caller.
+        """
+        return TrackStore.from_frame(self.frame())
+
+    def frame(self):
+        """
+        Returns a DataFrame over the arrays of the columns, without copying them: it is
+        not to be modified, except by `update_results`.
+        """
+        df = pd.DataFrame(dict(enumerate(self._columns)), index=self._index, copy=False)
+        df.columns = self._names
+        return df
+
     def get_dataframe(self):
         """
         Returns a copy of the underlying DataFrame.
@@ -104,38 +631,23 @@ class DataModel(QAbstractTableModel):
         Returns:
             pandas.DataFrame: Copy of internal data.
         """
-        return self._df.copy()
-    
+        return self.frame().copy()
+
 
-class EditCellCommand(QUndoCommand):
+
+class CellDelegate(QStyledItemDelegate):
     """
-    Command object representing an editable cell change,
-    used with QUndoStack to support undo/redo functionality.
+    Edits every cell of a DataModel as text, starting from its display string: the
+    default editor of a float edit value is a spin box rounding it to two decimals.
+    The model converts the text to the type of the column.
     """
-    def __init__(self, model, index, old_value, new_value):
-        """
-        Create an undoable cell edit command.
+    def createEditor(self, parent, option, index):
+        editor = QLineEdit(parent)
+        editor.setFrame(False)
+        return editor
 
-        Args:
-            model (DataModel): The data model where the change happens.
-            index (QModelIndex): Target cell.
-            old_value (str): Previous value.
-            new_value (str): New value.
-        """
-        super().__init__()
-        self.model = model
-        self.index = index
-        self.old_value = old_value
-        self.new_value = new_value
+    def setEditorData(self, editor, index):
+        editor.setText(index.data(Qt.ItemDataRole.DisplayRole) or "")
 
-    def undo(self):
-        """
-        Undo the cell edit by restoring the old value.
-        """
-        self.model.setData(self.index, self.old_value)
-
-    def redo(self):
-        """
-        Redo the cell edit by setting the new value again.
-        """
-        self.model.setData(self.index, self.new_value)
+    def setModelData(self, editor, model, index):
+        model.setData(index, editor.text(), Qt.ItemDataRole.EditRole)
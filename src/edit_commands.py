@@ -0,0 +1,76 @@
+# This code holds the undoable edits of the sheet models, pushed to the QUndoStack
+# of the editor
+
+
+from PyQt6.QtGui import QUndoCommand
+
+
+class EditCellCommand(QUndoCommand):
+    """
+    Command object representing an editable cell change,
+    used with QUndoStack to support undo/redo functionality.
+    """
+    def __init__(self, model, row, column, old_value, new_value):
+        """
+        Create an undoable cell edit command.
+
+        Args:
+            model (DataModel): The data model where the change happens.
+            row (int): Row of the sheet of the target cell, which stays the same cell
+                when the view is sorted or filtered.
+            column (int): Position of the column of the target cell.
+            old_value (str): Previous value.
+            new_value (str): New value.
+        """
+        super().__init__()
+        self.model = model
+        self.row = row
+        self.column = column
+        self.old_value = old_value
+        self.new_value = new_value
+
+    def undo(self):
+        """
+        Undo the cell edit by restoring the old value.
+        """
+        self.model.set_cell(self.row, self.column, self.old_value)
+
+    def redo(self):
+        """
+        Redo the cell edit by setting the new value again.
+        """
+        self.model.set_cell(self.row, self.column, self.new_value)
+
+
+class EditBlockCommand(QUndoCommand):
+    """
+    Command object setting blocks of cells at once, e.g. a paste or the deletion of
+    a range, undone and redone as a whole.
+    """
+    def __init__(self, model, old_parts, new_parts, text="Edit"):
+        """
+        Create an undoable block edit command.
+
+        Args:
+            model (DataModel): The data model where the change happens.
+            old_parts (list of tuple): (column, rows, values) of the previous values,
+                rows of the sheet, see `DataModel.set_values`.
+            new_parts (list of tuple): (column, rows, values) of the new values.
+            text (str, optional): Name of the command.
+        """
+        super().__init__(text)
+        self.model = model
+        self.old_parts = old_parts
+        self.new_parts = new_parts
+
+    def undo(self):
+        """
+        Undo the edit by restoring the old values.
+        """
+        self.model.set_values(self.old_parts)
+
+    def redo(self):
+        """
+        Redo the edit by setting the new values again.
+        """
+        self.model.set_values(self.new_parts)
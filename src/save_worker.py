@@ -0,0 +1,48 @@
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+from logs.logger import app_logger as logger
+
+from src.utils.xlsx_writer import save_workbook
+
+
+class SaveWorkerSignals(QObject):
+    """
+    Signals emitted by SaveWorker, delivered to the GUI thread.
+
+    Signals:
+        progress (int): Percentage of the rows written.
+        finished (str): Error message, empty string on success.
+    """
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(str)
+
+
+class SaveWorker(QRunnable):
+    """
+    Saves a workbook outside of the GUI thread with `save_workbook`.
+
+    Only plain data goes in: copies of the changed sheets and None for the unchanged ones.
+
+    Args:
+        file_path (Path): Destination workbook.
+        sheets (dict): Sheet name -> DataFrame, or None for a sheet unchanged since it was read from `source`.
+        source (Path | None): File the unchanged sheets were read from.
+        read_sheet (callable): Sheet name -> DataFrame of that sheet in `source`.
+    """
+    def __init__(self, file_path, sheets, source, read_sheet):
+        super().__init__()
+        self.file_path = file_path
+        self.sheets = sheets
+        self.source = source
+        self.read_sheet = read_sheet
+        self.signals = SaveWorkerSignals()
+
+    def run(self):
+        try:
+            save_workbook(self.file_path, self.sheets, self.source, self.read_sheet,
+                          progress=lambda fraction: self.signals.progress.emit(int(fraction * 100)))
+        except Exception as e:
+            logger.exception(f"Save : cannot save {self.file_path}: {e}")
+            self.signals.finished.emit(str(e) or type(e).__name__)
+            return
+        self.signals.finished.emit("")
@@ -0,0 +1,241 @@
+# This code shows the sheets of opened files in table views that read their data only
+# when it is first needed, and releases the sheets that were not used for a while
+
+
+from collections import OrderedDict
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt6.QtWidgets import QMessageBox, QTableView
+
+from logs.logger import app_logger as logger
+
+from src.data_model import CellDelegate, DataModel
+
+# Memory the loaded sheets may use before the least recently used unedited ones are released
+MEMORY_BUDGET = 512 * 1024 ** 2
+
+
+class SheetLoaderSignals(QObject):
+    """
+    Signals emitted by SheetLoader, delivered to the GUI thread.
+
+    Signals:
+        loaded (object): DataFrame of the sheet.
+        failed (str): Error message.
+    """
+    loaded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+
+class SheetLoader(QRunnable):
+    """
+    Reads a sheet outside of the GUI thread.
+
+    Args:
+        loader (callable): Returns the DataFrame of the sheet.
+    """
+    def __init__(self, loader):
+        super().__init__()
+        self.loader = loader
+        self.signals = SheetLoaderSignals()
+
+    def run(self):
+        try:
+            df = self.loader()
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+            return
+        self.signals.loaded.emit(df)
+
+
+class SheetView(QTableView):
+    """
+    Table view of one sheet whose DataModel is created on first use: when the tab is
+    shown, or when `model()` is called by the analysis, the statistics, the edit actions
+    or the save. Until then only the sheet name is known.
+
+    When a sheet is shown, the next sheet of the file is read in the background so that
+    switching tabs does not wait. Loaded sheets are registered in `loaded_sheets`, which
+    releases the hidden ones that were never edited nor analysed when the memory budget
+    is exceeded; they are read again (from the workbook cache) when needed.
+
+    Args:
+        loader (callable): Returns the DataFrame of the sheet.
+        sheet_name (str): Name of the sheet, used in messages.
+    """
+    def __init__(self, loader, sheet_name):
+        super().__init__()
+        self.loader = loader
+        self.sheet_name = sheet_name
+        self.next_view = None
+        self.loaded_model = None
+        self.load_error = None
+        self.prefetching = None
+        self.setSortingEnabled(True)
+        self.setItemDelegate(CellDelegate(self))
+
+    def model(self):
+        """
+        Returns the model of the sheet, reading the sheet first if it is not loaded.
+
+        Returns:
+            DataModel | None: Model, None if the sheet cannot be read.
+        """
+        if super().model() is None and self.load_error is None:
+            self.load()
+        model = super().model()
+        if model is not None:
+            loaded_sheets.touch(self)
+        return model
+
+    def is_loaded(self):
+        """
+        True if the sheet has a model.
+        """
+        return super().model() is not None
+
+    def load(self, df=None):
+        """
+        Creates the model of the sheet.
+
+        Args:
+            df (pd.DataFrame, optional): Sheet already read in the background, read with `loader` if None.
+        """
+        try:
+            if df is None:
+                df = self.loader()
+        except Exception as e:
+            self.load_error = e
+            logger.error(f"Sheet view : cannot load the sheet '{self.sheet_name}': {e}")
+            QMessageBox.critical(self, "Error", f"Cannot load the sheet '{self.sheet_name}':\n{e}")
+            return
+
+        self.loaded_model = DataModel(df)
+        self.setModel(self.loaded_model)
+        self.resizeColumnsToContents()
+        logger.info(f"Sheet view : sheet '{self.sheet_name}' loaded ({len(df)} rows)")
+        loaded_sheets.add(self, int(df.memory_usage(index=False).sum()))
+
+    def prefetch(self):
+        """
+        Reads the sheet in the background if it is not loaded yet.
+        """
+        if self.is_loaded() or self.prefetching is not None or self.load_error is not None:
+            return
+        self.prefetching = SheetLoader(self.loader)
+        self.prefetching.signals.loaded.connect(self.on_prefetched)
+        self.prefetching.signals.failed.connect(self.on_prefetch_failed)
+        QThreadPool.globalInstance().start(self.prefetching)
+
+    def on_prefetched(self, df):
+        """
+        Uses the sheet read in the background unless it was loaded meanwhile.
+        """
+        self.prefetching = None
+        if not self.is_loaded():
+            self.load(df)
+
+    def on_prefetch_failed(self, message):
+        """
+        Leaves the error to be reported when the sheet is used.
+        """
+        self.prefetching = None
+        logger.info(f"Sheet view : sheet '{self.sheet_name}' not prefetched: {message}")
+
+    def is_dirty(self):
+        """
+        True if the sheet was edited, or replaced by analysis results, since it was read or saved.
+        """
+        model = super().model()
+        return model is not None and (model is not self.loaded_model or model.edited)
+
+    def mark_saved(self, model, revision):
+        """
+        Records that `model`, at `revision`, is what the file of the sheet now holds.
+        Edits made since then still count as unsaved.
+
+        Args:
+            model (DataModel): Model whose data was saved.
+            revision (int): Revision of the model when its data was copied for saving.
+        """
+        model.saved_revision = revision
+        if super().model() is model:
+            self.loaded_model = model
+
+    def release(self):
+        """
+        Drops the model of a hidden sheet that was neither edited nor replaced by analysis results.
+
+        Returns:
+            bool: True if the model was released.
+        """
+        model = super().model()
+        if self.isVisible() or model is None or model is not self.loaded_model or model.edited or model.track_results:
+            return False
+        self.setModel(None)
+        self.loaded_model = None
+        model.deleteLater()
+        logger.info(f"Sheet view : sheet '{self.sheet_name}' released")
+        return True
+
+    def showEvent(self, event):
+        """
+        Loads the sheet when its tab is shown and prefetches the next one.
+        """
+        super().showEvent(event)
+        if not self.is_loaded() and self.load_error is None:
+            self.load()
+        if self.next_view is not None:
+            self.next_view.prefetch()
+
+
+class LoadedSheets():
+    """
+    Least recently used registry of the sheets loaded by SheetView, with their size.
+
+    Args:
+        budget (int, optional): Bytes the loaded sheets may use before some are released.
+    """
+    def __init__(self, budget=MEMORY_BUDGET):
+        self.budget = budget
+        self.sizes = OrderedDict()
+
+    def add(self, view, size):
+        """
+        Registers a loaded sheet and releases the least recently used ones over the budget.
+        """
+        self.sizes[view] = size
+        self.sizes.move_to_end(view)
+        self.release(keep=view)
+
+    def touch(self, view):
+        """
+        Marks a sheet as the most recently used.
+        """
+        if view in self.sizes:
+            self.sizes.move_to_end(view)
+
+    def release(self, keep=None):
+        """
+        Releases sheets, least recently used first, until the loaded ones fit in the budget.
+        Sheets that cannot be released (shown, edited, analysed) are kept.
+
+        Args:
+            keep (SheetView, optional): Sheet being loaded, never released.
+        """
+        total = sum(self.sizes.values())
+        for view in list(self.sizes):
+            if total <= self.budget:
+                break
+            if view is keep:
+                continue
+            try:
+                released = view.release() or not view.is_loaded()
+            except RuntimeError:
+                # The view was deleted with its file
+                released = True
+            if released:
+                total -= self.sizes.pop(view)
+
+
+loaded_sheets = LoadedSheets()
@@ -0,0 +1,194 @@
+# This code shows new blank sheets, holding only their filled cells until the file
+# is saved
+
+
+from PyQt6.QtCore import Qt, QModelIndex
+
+import numpy as np
+import pandas as pd
+
+from src.data_model import DataModel
+
+# Size of a new blank sheet, also the number of rows added when its last row is reached
+BLANK_ROWS = 1000
+BLANK_COLUMNS = 26
+# Cells kept empty past the last filled row and column of a blank sheet
+GROW_MARGIN = 10
+
+
+class SparseDataModel(DataModel):
+    """
+    Model of a blank sheet, holding only the filled cells in a dict and not written to
+    disk until the file is saved. The sheet shows at least BLANK_ROWS x BLANK_COLUMNS
+    empty cells, named like Excel columns, and grows as the view is scrolled to its last
+    row (see `fetchMore`) and as cells near its edges are filled (see `grow`).
+
+    `frame` and `get_dataframe` build the DataFrame of the filled range, '' in empty cells.
+    """
+    def __init__(self, rows=BLANK_ROWS, columns=BLANK_COLUMNS):
+        """
+        Initialize an empty sheet.
+
+        Args:
+            rows (int, optional): Number of rows shown.
+            columns (int, optional): Number of columns shown.
+        """
+        super().__init__(pd.DataFrame())
+        self._cells = {} # (row, column) -> value of the filled cells
+        self._n_rows = rows
+        self._n_columns = columns
+
+    @property
+    def n_rows(self):
+        return self._n_rows
+
+    def rowCount(self, parent=None):
+        return self._n_rows
+
+    def columnCount(self, parent=None):
+        return self._n_columns
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if index.isValid() and role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return self.cell(index.row(), index.column())
+        return None
+
+    def cell(self, row, column):
+        return self._cells.get((row, column), "")
+
+    def typed_value(self, column, value):
+        # Blank sheets hold the entered text, typed when they are saved and read again
+        return value
+
+    def typed_values(self, column, texts):
+        return texts
+
+    def block_text(self, rows, columns):
+        return '\n'.join('\t'.join(str(self.cell(row, column)) for column in columns) for row in rows.tolist())
+
+    def values_at(self, column, rows):
+        return np.array([self._cells.get((row, column), "") for row in rows.tolist()], dtype=object)
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        """
+        Fill or clear a cell, growing the sheet when the cell is near its edges.
+
+        Args:
+            index (QModelIndex): Target cell.
+            value (str): New value, '' clears the cell.
+            role (Qt.ItemDataRole): Role (should be EditRole).
+
+        Returns:
+            bool: True if data was updated, False otherwise.
+        """
+        if index.isValid() and role == Qt.ItemDataRole.EditRole:
+            return self.set_cell(index.row(), index.column(), value)
+        return False
+
+    def set_cell(self, row, column, value):
+        if value == "" or value is None:
+            self._cells.pop((row, column), None)
+        else:
+            self._cells[(row, column)] = value
+        self._validated = False
+        self.revision += 1
+        index = self.index(row, column)
+        self.dataChanged.emit(index, index)
+        self.grow(row + GROW_MARGIN, column + GROW_MARGIN)
+        return True
+
+    def set_values(self, parts):
+        for column, rows, values in parts:
+            for row, value in zip(rows.tolist(), values.tolist()):
+                if value == "" or value is None:
+                    self._cells.pop((row, column), None)
+                else:
+                    self._cells[(row, column)] = value
+        self._validated = False
+        self.revision += 1
+        parts = [(column, rows) for column, rows, _ in parts if len(rows)]
+        if parts:
+            top = min(int(rows.min()) for _, rows in parts)
+            bottom = max(int(rows.max()) for _, rows in parts)
+            left = min(column for column, _ in parts)
+            right = max(column for column, _ in parts)
+            self.dataChanged.emit(self.index(top, left), self.index(bottom, right))
+            self.grow(bottom + GROW_MARGIN, right + GROW_MARGIN)
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        # Blank sheets are shown as they are filled, they are sorted once saved and opened again
+        return
+
+    def grow(self, rows, columns):
+        """
+        Makes the sheet at least `rows` x `columns`, e.g. before pasting a block of cells.
+
+        Args:
+            rows (int): Minimum number of rows.
+            columns (int): Minimum number of columns.
+        """
+        if rows > self._n_rows:
+            self.beginInsertRows(QModelIndex(), self._n_rows, rows - 1)
+            self._n_rows = rows
+            self.endInsertRows()
+        if columns > self._n_columns:
+            self.beginInsertColumns(QModelIndex(), self._n_columns, columns - 1)
+            self._n_columns = columns
+            self.endInsertColumns()
+
+    def canFetchMore(self, parent):
+        return not parent.isValid()
+
+    def fetchMore(self, parent):
+        """
+        Adds BLANK_ROWS empty rows when the view reaches the last row.
+        """
+        if not parent.isValid():
+            self.grow(self._n_rows + BLANK_ROWS, self._n_columns)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole:
+            if orientation == Qt.Orientation.Horizontal:
+                return column_name(section)
+            elif orientation == Qt.Orientation.Vertical:
+                return str(section)
+        return None
+
+    def frame(self):
+        """
+        Builds the DataFrame of the filled range, from the first cell to the last filled
+        row and column, with '' in the empty cells.
+
+        Returns:
+            pandas.DataFrame: Filled range, columns named like Excel columns.
+        """
+        n_rows = max((row for row, _ in self._cells), default=-1) + 1
+        n_columns = max((column for _, column in self._cells), default=-1) + 1
+        values = np.full((n_rows, n_columns), "", dtype=object)
+        for (row, column), value in self._cells.items():
+            values[row, column] = value
+        return pd.DataFrame(values, columns=[column_name(i) for i in range(n_columns)])
+
+    def get_dataframe(self):
+        """
+        Returns the DataFrame of the filled range, see `frame`.
+
+        Returns:
+            pandas.DataFrame: New DataFrame.
+        """
+        return self.frame()
+
+
+def column_name(column):
+    """
+    Returns the Excel name of a column: A, B, ..., Z, AA, AB...
+
+    Args:
+        column (int): Position of the column, from 0.
+    """
+    name = ""
+    column += 1
+    while column:
+        column, rest = divmod(column - 1, 26)
+        name = chr(ord("A") + rest) + name
+    return name
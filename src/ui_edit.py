@@ -1,4 +1,5 @@
 
+import numpy as np
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QTabWidget
 )
@@ -52,6 +53,14 @@ class UIEdit(QWidget):
             logger.error("copy_selection : no table or not has focus")
             return
 
+        # A grid of cells (e.g. a range, or a whole sheet) is formatted column by column
+        model = table.model()
+        grid = self.selection_grid(table)
+        if grid is not None and hasattr(model, "block_text"):
+            rows, columns = grid
+            QApplication.clipboard().setText(model.block_text(rows, columns))
+            return
+
         selection = table.selectionModel().selectedIndexes()
         if not selection:
             logger.error("copy_selection : no selection")
@@ -91,30 +100,42 @@ class UIEdit(QWidget):
             return
 
         model = table.model()
-        if not model or not hasattr(model, "setDataWithUndo"):
+        if not model or not hasattr(model, "setBlockWithUndo"):
             return
 
-        selected = table.selectedIndexes()
-        if not selected:
+        selection = table.selectionModel().selection()
+        if selection.isEmpty():
             logger.error("paste_selection : no selection")
             return
 
         # Choose the top left cell as a start for pasting
-        top_left = selected[0].row(), selected[0].column()
+        top = min(selection_range.top() for selection_range in selection)
+        left = min(selection_range.left() for selection_range in selection)
 
         # Reading from buffer (clipboard)
         clipboard = QApplication.clipboard()
-        text = clipboard.text()
-        rows = text.strip().split('\n')
-        data = [r.split('\t') for r in rows]
-
-        # Writing into the model in QTabWidget
-        for i, row in enumerate(data):
-            for j, value in enumerate(row):
-                r = top_left[0] + i
-                c = top_left[1] + j
-                index = model.index(r, c)
-                model.setDataWithUndo(index, value, self.undo_stack)
+        text = clipboard.text().rstrip('\r\n')
+        if not text:
+            return
+        data = [r.rstrip('\r').split('\t') for r in text.split('\n')]
+        width = max(len(row) for row in data)
+
+        # Blank sheets grow to fit the pasted block
+        if hasattr(model, "grow"):
+            model.grow(top + len(data), left + width)
+
+        # Cells past the edges of the sheet are not pasted
+        height = min(len(data), model.rowCount() - top)
+        width = min(width, model.columnCount() - left)
+        if height <= 0 or width <= 0:
+            return
+        block = np.empty((height, width), dtype=object)
+        block[:] = [(row + [''] * width)[:width] for row in data[:height]]
+
+        # Writing the whole block into the model as one undoable command
+        rows = model.source_rows(np.arange(top, top + height))
+        parts = [(left + j, rows, block[:, j]) for j in range(width)]
+        model.setBlockWithUndo(parts, self.undo_stack, "Paste")
 
     def cut_selection(self):
         """
@@ -132,14 +153,54 @@ class UIEdit(QWidget):
             logger.error("delete_selection : no table or not has focus")
             return
         
-        selection = table.selectionModel().selectedIndexes()
-
         model = table.model()
+        if not model or not hasattr(model, "setBlockWithUndo"):
+            return
 
-        for index in selection:
-            if index.isValid():
-                # Change the content of the cell to "" and store in Undo Stack
-                model.setDataWithUndo(index, "", self.undo_stack)
+        # Change the content of the cells to "" and store in Undo Stack as one command
+        parts = []
+        for column, rows in self.selected_rows(table).items():
+            rows = model.source_rows(rows)
+            parts.append((column, rows, np.full(len(rows), "", dtype=object)))
+        model.setBlockWithUndo(parts, self.undo_stack, "Delete")
+
+    def selected_rows(self, table):
+        """
+        Returns the rows of the view selected in each column, from the rectangular
+        ranges the selection is made of.
+
+        Args:
+            table (QTableView): Table view.
+
+        Returns:
+            dict: Column -> sorted np.ndarray of rows.
+        """
+        selected = {}
+        for selection_range in table.selectionModel().selection():
+            rows = np.arange(selection_range.top(), selection_range.bottom() + 1)
+            for column in range(selection_range.left(), selection_range.right() + 1):
+                selected.setdefault(column, []).append(rows)
+        return {column: np.unique(np.concatenate(rows)) for column, rows in selected.items()}
+
+    def selection_grid(self, table):
+        """
+        Returns the rows and columns of the selection if the same rows are selected in
+        every selected column, as for a rectangular range.
+
+        Args:
+            table (QTableView): Table view.
+
+        Returns:
+            tuple | None: (rows, columns) sorted, None if the selection is empty or irregular.
+        """
+        selected = self.selected_rows(table)
+        if not selected:
+            return None
+        columns = sorted(selected)
+        rows = selected[columns[0]]
+        if any(not np.array_equal(selected[column], rows) for column in columns[1:]):
+            return None
+        return rows, columns
 
     def undo_action(self):
         """
@@ -1,20 +1,39 @@
-import os
+from functools import partial
 from pathlib import Path
-import string
 
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QThreadPool
 from PyQt6.QtWidgets import (
-    QFileDialog, QMessageBox, QWidget, QTableView, QTreeWidgetItem, QTabWidget, QVBoxLayout, QHeaderView
+    QFileDialog, QMessageBox, QWidget, QTableView, QTreeWidgetItem, QTabWidget, QVBoxLayout, QHeaderView,
+    QProgressDialog, QLineEdit
 )
 
-import pandas as pd
-import pandera.pandas as pa
-
 from logs.logger import app_logger as logger
 
-from src.data_model import DataModel
-from src.utils.input_data import input_schema
-
+from src.Analysis.results import with_sheet_columns
+from src.sparse_data_model import SparseDataModel
+from src.save_worker import SaveWorker
+from src.sheet_view import SheetView
+from src.utils.input_data import read_workbook, workbook_sheet_names
+
+# File types offered by the Open File dialog
+OPEN_FILE_FILTER = ("Tracking files (*.xlsx *.xls *.xlsm *.csv *.tsv *.txt *.xml);;"
+                    "Excel files (*.xlsx *.xls *.xlsm);;"
+                    "Text tables (*.csv *.tsv *.txt *.xls);;"
+                    "TrackMate files (*.xml)")
+# Files the application saves in place; files of other formats are saved as a new workbook
+SAVED_SUFFIXES = (".xlsx", ".xlsm")
+# Save As filter exporting the condition results into the analysed sheets
+WIDE_RESULTS_FILTER = "Excel files, condition results in the sheets (*.xlsx)"
+# Hint of the line edit filtering the rows of a sheet
+ROW_FILTER_PLACEHOLDER = "Filter rows, e.g. Track n >= 10 and Track n <= 20 and X < 500 (Enter to apply)"
+
+
+def read_sheet(file_path, sheet_name):
+    """
+    Reads one sheet of a file without validation, for SheetView.
+    """
+    sheets, _ = read_workbook(file_path, validate=False, sheet_names=[sheet_name])
+    return sheets[sheet_name]
 
 
 class UIFile(QWidget):
@@ -30,6 +49,7 @@ class UIFile(QWidget):
         super().__init__()
         self.ui = ui
         self.tabs_data_models = {} # Store DataModels for each sheet
+        self.save_worker = None
         
         # Connect UI actions and tree widget signals to the appropriate handlers.
         self.ui.actionNew_File.triggered.connect(self.new_file)
@@ -40,11 +60,12 @@ class UIFile(QWidget):
 
     def open_file(self):
         """
-        Open and load Excel files selected by the user. Each sheet is added as a tab,
-        and the file/sheet structure is displayed in a tree widget.
+        Open and load Excel files, text tables (CSV/TSV, ImageJ results) or TrackMate XML files
+        selected by the user. Each sheet is added as a tab, and the file/sheet structure is
+        displayed in a tree widget.
         """
         try:
-            file_paths, _ = QFileDialog.getOpenFileNames(self, "Open Excel File", "", "Excel files (*.xlsx *.xls *.xlsm)")
+            file_paths, _ = QFileDialog.getOpenFileNames(self, "Open File", "", OPEN_FILE_FILTER)
         except Exception as e:
             logger.exception(f"Could not receive file paths to open: {e}")
 
@@ -61,21 +82,9 @@ class UIFile(QWidget):
         for file_path in file_paths:
             file_path = Path(file_path)
             try:
-                # Load all sheets
-                excel_data = pd.read_excel(file_path, sheet_name=None, engine='openpyxl')
-                for sheet_name, df in excel_data.items():
-                    try:
-                        # Cast and validate required columns
-                        df["Track n"] = df["Track n"].astype(float)
-                        df["Slice n"] = df["Slice n"].astype(float)
-                        df["X"] = df["X"].astype(float)
-                        df["Y"] = df["Y"].astype(float)
-                        df = df.dropna(how="all")
-                        validated = input_schema.validate(df)
-                        # do something with validated data if needed
-                    except pa.errors.SchemaError as e:
-                        logger.error(f"Not correct data in the sheet '{sheet_name}': {e}")
-                        QMessageBox.critical(self, "Error", f"Not correct data in the sheet '{sheet_name}': {e}")
+                # Only the sheet names are read here, each sheet is read when first shown or
+                # used (SheetView) and validated when first analysed (DataModel.validate)
+                sheet_names = workbook_sheet_names(file_path)
                 logger.info(f"Opened file {file_path}")
 
             except Exception as e:
@@ -91,22 +100,23 @@ class UIFile(QWidget):
             # Create new widget for the page and tab widget for sheets
             page = QWidget()
             page.filename = file_path
+            page.source = file_path # File the unchanged sheets are read (and copied when saving) from
             layout = QVBoxLayout(page)
         
             tab_widget = QTabWidget()
+            row_filter = self.create_row_filter(tab_widget)
+            layout.addWidget(row_filter)
             layout.addWidget(tab_widget)
             
             page.tree_item = file_root
             
             # Create a tab and tree item for each sheet
-            for sheet_name, df in excel_data.items():
-                table = QTableView()
-                data_model = DataModel(df)
-                table.setModel(data_model)
-                table.setSortingEnabled(True)
-                table.resizeColumnsToContents()
-
-                self.tabs_data_models[sheet_name] = data_model
+            previous = None
+            for sheet_name in sheet_names:
+                table = SheetView(partial(read_sheet, file_path, sheet_name), sheet_name)
+                if previous is not None:
+                    previous.next_view = table
+                previous = table
 
                 tab_widget.addTab(table, sheet_name)
 
@@ -129,6 +139,54 @@ class UIFile(QWidget):
         if self.ui.stackedWidget.count() > 0:
             self.ui.stackedWidget.setCurrentWidget(page)
 
+    def create_row_filter(self, tab_widget):
+        """
+        Create the line edit filtering the rows of the sheet shown in a tab widget
+        (see `DataModel.set_filter`), applied when Enter is pressed or the text is cleared.
+
+        Args:
+            tab_widget (QTabWidget): Sheet tabs of a page.
+
+        Returns:
+            QLineEdit: The filter line edit.
+        """
+        row_filter = QLineEdit()
+        row_filter.setPlaceholderText(ROW_FILTER_PLACEHOLDER)
+        row_filter.setClearButtonEnabled(True)
+        row_filter.returnPressed.connect(lambda: self.filter_rows(row_filter, tab_widget))
+        row_filter.textChanged.connect(lambda text: None if text else self.filter_rows(row_filter, tab_widget))
+        # Each sheet keeps its own filter
+        tab_widget.currentChanged.connect(lambda _: self.show_row_filter(row_filter, tab_widget))
+        return row_filter
+
+    def filter_rows(self, row_filter, tab_widget):
+        """
+        Apply the expression of the filter line edit to the sheet of the current tab.
+
+        Args:
+            row_filter (QLineEdit): Filter line edit of the page.
+            tab_widget (QTabWidget): Sheet tabs of the page.
+        """
+        table = tab_widget.currentWidget()
+        model = table.model() if table is not None else None
+        if not hasattr(model, "set_filter"):
+            return
+        try:
+            model.set_filter(row_filter.text())
+        except ValueError as e:
+            logger.warning(f"Filter : {e}")
+            QMessageBox.warning(self, "Warning", f"Cannot filter the rows:\n{e}")
+
+    def show_row_filter(self, row_filter, tab_widget):
+        """
+        Show the filter of the sheet of the current tab in the filter line edit.
+        """
+        table = tab_widget.currentWidget()
+        loaded = table is not None and getattr(table, "is_loaded", lambda: True)()
+        row_filter.blockSignals(True)
+        row_filter.setText(getattr(table.model(), "filter_expression", "") if loaded else "")
+        row_filter.blockSignals(False)
+
     def on_tree_item_clicked(self, item):
         """
         Handle clicks on tree items to switch to the correct file tab or sheet tab.
@@ -174,22 +232,21 @@ class UIFile(QWidget):
                     return i
         return None
 
-    def get_new_filename(self, base_dir, prefix="new_file_", extension=".xlsx"):
+    def get_new_filename(self, prefix="new_file_", extension=".xlsx"):
         """
-        Generate a new unique filename in the given directory.
+        Generate a name for a new file that no open file has.
 
         Args:
-            base_dir (str): Directory where the new file will be created.
             prefix (str): Prefix for the new file name.
             extension (str): File extension.
 
         Returns:
-            str: Path to the new file.
+            str: Name of the new file.
         """
-        existing = os.listdir(base_dir)
         used_numbers = set()
-
-        for name in existing:
+        for i in range(self.ui.stackedWidget.count()):
+            file_path = getattr(self.ui.stackedWidget.widget(i), 'filename', None)
+            name = file_path.name if file_path is not None else ""
             if name.startswith(prefix) and name.endswith(extension):
                 num_part = name[len(prefix):-len(extension)].strip()
                 if num_part.isdigit():
@@ -198,30 +255,13 @@ class UIFile(QWidget):
         # Find the minimal free number
         for i in range(1, len(used_numbers) + 2):
             if i not in used_numbers:
-                logger.info(f"New temporary file was created: {os.path.join(base_dir, f"{prefix}{i}{extension}")}")
-                return os.path.join(base_dir, f"{prefix}{i}{extension}")
+                return f"{prefix}{i}{extension}"
     
     def new_file(self):
         """
-        Create a new empty Excel file with a single blank sheet and load it into the UI.
+        Create a new file with a single blank sheet, kept in memory until it is saved.
         """
-        try:
-            temp_dir = os.path.join(os.getcwd(), "tmp")
-            os.makedirs(temp_dir, exist_ok=True)
-            new_file_path = Path(self.get_new_filename(temp_dir))
-
-            # Create empty DataFrame
-            columns = list(string.ascii_uppercase)
-            empty_df = pd.DataFrame('', index=range(1000), columns=columns)
-
-            # Save as Excel
-            with pd.ExcelWriter(new_file_path, engine='openpyxl') as writer:
-                empty_df.to_excel(writer, sheet_name='Sheet1', index=False)
-
-        except Exception as e:
-            logger.error(f"Cannot create new file:\n{e}")
-            QMessageBox.critical(self, "Error", f"Cannot create new file:\n{e}")
-            return
+        new_file_path = Path(self.get_new_filename())
 
         # Show and adjust the tree
         self.ui.treeWidget.show()
@@ -233,16 +273,17 @@ class UIFile(QWidget):
         # Create page and tab
         page = QWidget()
         page.filename = new_file_path
+        page.source = None # Not written yet, saved with Save As
         layout = QVBoxLayout(page)
         tab_widget = QTabWidget()
         layout.addWidget(tab_widget)
 
         # Create TableView and model
         table_view = QTableView()
-        data_model = DataModel(empty_df)
+        data_model = SparseDataModel()
         table_view.setModel(data_model)
         table_view.setSortingEnabled(True)
-        table_view.resizeColumnsToContents()
+        # The columns of a blank sheet keep their default width, no need to measure its cells
         table_view.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
         table_view.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
         table_view.horizontalHeader().setStretchLastSection(True)
@@ -265,7 +306,7 @@ class UIFile(QWidget):
 
     def save_file(self):
         """
-        Save the currently active file. If it's a temporary file, prompt for a new file path.
+        Save the currently active file. If it's a new file, prompt for a new file path.
         """
         page = self.ui.stackedWidget.currentWidget()
         if not hasattr(page, "filename"):
@@ -274,20 +315,25 @@ class UIFile(QWidget):
             return
 
         file_path = page.filename 
-        temp_dir = Path.cwd() / "tmp"
 
-        if temp_dir in file_path.parents:
-            # If file is from temp directory, ask user to save as a new file
+        if getattr(page, "source", None) is None:
+            # New files only exist in memory, ask user to save as a new file
+            self.save_as_file()
+            return
+        elif file_path.suffix.lower() not in SAVED_SUFFIXES:
+            # Imported files (CSV, TrackMate...) are kept as they are, the data is saved as a workbook
             self.save_as_file()
-            try:
-                file_path.unlink(missing_ok=True)
-            except Exception as e:
-                logger.warning(f"Warning: could not delete temp file: {e}")
             return
         else:
             self._save_page_to_file(page, file_path)
 
-        # Reset unsaved change flags in the tree
+    def reset_unsaved_flags(self, page):
+        """
+        Reset the unsaved change flags of a file and its sheets in the tree.
+
+        Args:
+            page (QWidget): The UI page representing the file.
+        """
         tree_item = getattr(page, "tree_item", None)
         if tree_item is not None:
             # Change flag for root
@@ -308,40 +354,114 @@ class UIFile(QWidget):
         """
         page = self.ui.stackedWidget.currentWidget()
         try:
-            file_path, _ = QFileDialog.getSaveFileName(
-                self, "Save As", "", "Excel files (*.xlsx *.xls)"
+            file_path, selected = QFileDialog.getSaveFileName(
+                self, "Save As", "", f"Excel files (*.xlsx *.xls);;{WIDE_RESULTS_FILTER}"
             )
         except Exception as e:
             logger.warning(f"Could not create a file_path : {e}")
             QMessageBox.warning(self, "Warning", f"Could not create a file_path : {e}")
             return
 
+        if not file_path:
+            return
+
         # Update file path
         file_path = Path(file_path)
         page.filename = file_path
-        self._save_page_to_file(page, file_path)
+        self._save_page_to_file(page, file_path, wide_results=selected == WIDE_RESULTS_FILTER)
 
-    def _save_page_to_file(self, page, file_path):
+    def _save_page_to_file(self, page, file_path, wide_results=False):
         """
-        Save the content of a page (with multiple sheet tabs) to an Excel file.
+        Save the content of a page (with multiple sheet tabs) to an Excel file, in the background.
+
+        Sheets that were not edited nor analysed since the file was read are copied from it
+        instead of being written again (see `save_workbook`), and the file is replaced only
+        once completely written.
 
         Args:
             page (QWidget): The UI page representing the file.
             file_path (Path): Destination path to save the Excel file.
+            wide_results (bool, optional): Write the condition average and SEM of the analysed
+                sheets into them, in the columns of earlier versions (see `with_sheet_columns`).
         """
+        if self.save_worker is not None:
+            QMessageBox.warning(self, "Warning", "Another file is being saved, try again when it is done.")
+            return
+
+        source = getattr(page, "source", None)
+        # Analysed sheets are copied from the source only if it holds their results in the same layout
+        same_layout = wide_results == getattr(page, "wide_results", False)
+        sheets = {}
+        saved = [] # (table, model, revision) of the sheets written
         try:
             tab_widget = page.findChild(QTabWidget)
             if not tab_widget:
                 logger.error("_save_page_to_file : Tab widget not found.")
 
-            with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
-                for i in range(tab_widget.count()):
-                    table_view = tab_widget.widget(i)
-                    model = table_view.model()
-                    df = model.get_dataframe()
-                    sheet_name = tab_widget.tabText(i)
-                    df.to_excel(writer, sheet_name=sheet_name, index=False)
+            for i in range(tab_widget.count()):
+                table_view = tab_widget.widget(i)
+                sheet_name = tab_widget.tabText(i)
+                if source is not None and isinstance(table_view, SheetView) and not table_view.is_dirty() \
+                        and (same_layout or not (table_view.is_loaded() and table_view.model().track_results)):
+                    sheets[sheet_name] = None
+                    continue
+                model = table_view.model()
+                # Copy in the GUI thread, the sheet may be edited while it is saved
+                sheets[sheet_name] = model.get_dataframe()
+                results = getattr(model, "track_results", None)
+                if wide_results and results:
+                    sheets[sheet_name] = with_sheet_columns(sheets[sheet_name], results.values())
+                saved.append((table_view, model, getattr(model, "revision", 0)))
 
         except Exception as e:
             logger.critical(f"Failed to save file:\n{e}")
             QMessageBox.critical(self, "Error", f"Failed to save file:\n{e}")
+            return
+
+        logger.info(f"Saving {file_path}: {len(saved)} of {len(sheets)} sheets written")
+        self.save_worker = SaveWorker(file_path, sheets, source, partial(read_sheet, source))
+        self.save_worker.signals.finished.connect(
+            lambda error: self.on_save_finished(page, file_path, tab_widget, saved, error, wide_results))
+
+        self.save_progress = QProgressDialog(f"Saving {file_path.name}...", None, 0, 100, self)
+        self.save_progress.setWindowTitle("Save")
+        self.save_progress.setMinimumDuration(500)
+        self.save_worker.signals.progress.connect(self.save_progress.setValue)
+        self.save_progress.setValue(0)
+
+        QThreadPool.globalInstance().start(self.save_worker)
+
+    def on_save_finished(self, page, file_path, tab_widget, saved, error, wide_results=False):
+        """
+        Report a failed save, or record the saved sheets and reset the unsaved change flags.
+
+        Args:
+            page (QWidget): The UI page representing the file.
+            file_path (Path): Saved file.
+            tab_widget (QTabWidget): Sheet tabs of the page.
+            saved (list of tuples): (table, model, revision) of the sheets written.
+            error (str): Error message, empty on success.
+            wide_results (bool, optional): The analysed sheets were saved with their condition results.
+        """
+        self.save_worker = None
+        self.save_progress.close()
+        if error:
+            logger.critical(f"Failed to save file:\n{error}")
+            QMessageBox.critical(self, "Error", f"Failed to save file:\n{error}")
+            return
+
+        # The unchanged sheets are now read from the saved file
+        page.source = file_path
+        page.wide_results = wide_results
+        for i in range(tab_widget.count()):
+            table_view = tab_widget.widget(i)
+            if isinstance(table_view, SheetView):
+                table_view.loader = partial(read_sheet, file_path, tab_widget.tabText(i))
+        for table_view, model, revision in saved:
+            if isinstance(table_view, SheetView):
+                table_view.mark_saved(model, revision)
+            elif hasattr(model, "saved_revision"):
+                model.saved_revision = revision
+
+        self.reset_unsaved_flags(page)
+        logger.info(f"Saved {file_path}")
@@ -0,0 +1,267 @@
+# This code imports tracking results saved as text tables (CSV/TSV, ImageJ Manual Tracking,
+# TrackMate spot tables) or as TrackMate XML into the 'Track n', 'Slice n', 'X', 'Y' layout
+
+
+import csv
+import re
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from logs.logger import app_logger as logger
+
+# Rows read at once from text tables
+CHUNK_ROWS = 100_000
+# Suffixes of the files read as text tables
+DELIMITED_SUFFIXES = (".csv", ".tsv", ".tab", ".txt")
+# First bytes of the binary (OLE) .xls format; ImageJ saves its tables as tab-separated .xls text
+OLE_SIGNATURE = b"\xd0\xcf\x11\xe0"
+
+# Header names of the trackers, compared lower case and without punctuation (e.g. 'Track n°' -> 'trackn')
+COLUMN_ALIASES = {
+    "Track n": ("trackn", "track", "trackid", "tracknumber"),
+    "Slice n": ("slicen", "slice", "slicenumber", "frame"),
+    "X": ("x", "positionx"),
+    "Y": ("y", "positiony"),
+}
+# TrackMate numbers frames from 0, slices are numbered from 1
+ZERO_BASED_FRAMES = ("frame",)
+
+
+def normalize_name(name):
+    """
+    Lower case column name without spaces, punctuation and symbols.
+    """
+    return re.sub(r"[^a-z0-9]", "", str(name).lower())
+
+
+def sheet_name(file_path):
+    """
+    Name of the single sheet of an imported file: the file name without the characters
+    Excel forbids in sheet names, at most 31 characters.
+    """
+    return re.sub(r"[\[\]:*?/\\]", "_", Path(file_path).stem)[:31] or "Sheet1"
+
+
+def is_text_xls(file_path):
+    """
+    True if an .xls file is a text table (as saved by ImageJ) rather than a binary workbook.
+    """
+    with open(file_path, "rb") as file:
+        return file.read(len(OLE_SIGNATURE)) != OLE_SIGNATURE
+
+
+def detect_separator(file_path):
+    """
+    Guesses the separator of a text table from its first lines: tab, comma or semicolon.
+    """
+    if Path(file_path).suffix.lower() in (".tsv", ".tab"):
+        return "\t"
+    with open(file_path, encoding="utf-8", errors="replace") as file:
+        sample = file.read(1 << 16)
+    try:
+        return csv.Sniffer().sniff(sample, delimiters="\t,;").delimiter
+    except csv.Error:
+        return ","
+
+
+def map_columns(header):
+    """
+    Finds the column of the file holding each required column.
+
+    Args:
+        header (list): Column names of the file.
+
+    Returns:
+        dict: Required column -> column name in the file.
+
+    Raises:
+        ValueError: If a required column is not found.
+    """
+    mapping = {}
+    for column, aliases in COLUMN_ALIASES.items():
+        if column in header:
+            mapping[column] = column
+            continue
+        for name in header:
+            if normalize_name(name) in aliases:
+                mapping[column] = name
+                break
+    missing = [column for column in COLUMN_ALIASES if column not in mapping]
+    if missing:
+        raise ValueError(f"No column for {missing} among {list(header)}")
+    return mapping
+
+
+def to_float(values):
+    """
+    Converts a column to float, with NaN for the cells that are not numbers.
+
+    Text cells are parsed with `float` because pd.to_numeric may round the last digit.
+
+    Args:
+        values (pd.Series): Column read from a text table.
+
+    Returns:
+        np.ndarray: float64 values.
+    """
+    if values.dtype != object:
+        return values.to_numpy(dtype=float)
+    numeric = pd.to_numeric(values, errors='coerce').notna().to_numpy()
+    result = np.full(len(values), np.nan)
+    result[numeric] = values[numeric].astype(float).to_numpy()
+    return result
+
+
+def read_delimited(file_path, columns=None, chunksize=CHUNK_ROWS):
+    """
+    Reads a text table in chunks of rows.
+
+    A table already in the layout of the application (columns 'Track n', 'Slice n', 'X',
+    'Y') keeps all its columns, like a workbook. Tracker exports (ImageJ Manual Tracking
+    'Track n°', 'Slice n°'; TrackMate 'TRACK_ID', 'FRAME', 'POSITION_X', 'POSITION_Y') keep
+    the required columns only: values are converted to numbers, rows without a track
+    (untracked spots, unit lines below the header) are dropped and rows are sorted.
+
+    Args:
+        file_path (str | Path): Path to the table.
+        columns (collection, optional): Columns to keep besides the required ones for a
+            table in the layout of the application, all if None.
+        chunksize (int, optional): Number of rows parsed at once.
+
+    Returns:
+        dict: One sheet named after the file -> DataFrame.
+
+    Raises:
+        ValueError: If a required column is not found.
+    """
+    options, header, mapping = table_layout(file_path)
+    native = all(mapping[column] == column for column in mapping)
+
+    if native:
+        usecols = header if columns is None else [name for name in header if name in columns or name in mapping]
+    else:
+        usecols = list(mapping.values())
+
+    parts = []
+    for chunk in pd.read_csv(file_path, usecols=usecols, chunksize=chunksize, **options):
+        if native:
+            parts.append(chunk)
+            continue
+        part = pd.DataFrame({column: to_float(chunk[name]) for column, name in mapping.items()})
+        parts.append(part[~np.isnan(part["Track n"].to_numpy())])
+
+    df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=usecols)
+    if not native:
+        if normalize_name(mapping["Slice n"]) in ZERO_BASED_FRAMES:
+            df["Slice n"] += 1
+        df = df.sort_values(["Track n", "Slice n"], kind='stable', ignore_index=True)
+    logger.info(f"Importers : {len(df)} rows read from {file_path} (separator {options['sep']!r})")
+    return {sheet_name(file_path): df}
+
+
+def table_layout(file_path):
+    """
+    Reads the separator and the header of a text table.
+
+    Returns:
+        tuple: (options of pd.read_csv, header, mapping of the required columns, see `map_columns`).
+
+    Raises:
+        ValueError: If a required column is not found.
+    """
+    options = {"sep": detect_separator(file_path), "encoding": "utf-8", "encoding_errors": "replace",
+               "float_precision": "round_trip"}
+    header = list(pd.read_csv(file_path, nrows=0, **options).columns)
+    return options, header, map_columns(header)
+
+
+def delimited_chunks(file_path, chunksize=CHUNK_ROWS):
+    """
+    Reads the required columns of a text table in chunks of rows, without ever holding the
+    whole table, e.g. to write it to a TrackStore. Values are converted like `read_delimited`
+    does for tracker exports, but rows are neither dropped nor sorted.
+
+    Args:
+        file_path (str | Path): Path to the table.
+        chunksize (int, optional): Number of rows parsed at once.
+
+    Yields:
+        pd.DataFrame: 'Track n', 'Slice n', 'X', 'Y' as float.
+
+    Raises:
+        ValueError: If a required column is not found.
+    """
+    options, _, mapping = table_layout(file_path)
+    zero_based = normalize_name(mapping["Slice n"]) in ZERO_BASED_FRAMES
+    for chunk in pd.read_csv(file_path, usecols=list(mapping.values()), chunksize=chunksize, **options):
+        part = pd.DataFrame({column: to_float(chunk[name]) for column, name in mapping.items()})
+        if zero_based:
+            part["Slice n"] += 1
+        yield part
+
+
+def read_trackmate_xml(file_path):
+    """
+    Reads the tracks of a TrackMate XML file, streaming the elements so the document
+    is never held in memory. Only the tracks kept by TrackMate's track filters are read.
+
+    Args:
+        file_path (str | Path): Path to the TrackMate file.
+
+    Returns:
+        dict: One sheet named after the file -> DataFrame with 'Track n' (TRACK_ID),
+        'Slice n' (FRAME + 1), 'X' and 'Y'.
+
+    Raises:
+        ValueError: If the file is not a TrackMate file.
+    """
+    spot_ids, frames, x, y = [], [], [], []
+    spot_tracks = {}
+    filtered = None
+    track_id = None
+    root = None
+
+    for event, element in ET.iterparse(file_path, events=("start", "end")):
+        if root is None:
+            root = element
+            if root.tag != "TrackMate":
+                raise ValueError(f"{file_path} is not a TrackMate file")
+        if event == "start":
+            if element.tag == "Track":
+                track_id = float(element.get("TRACK_ID"))
+            elif element.tag == "FilteredTracks":
+                filtered = set()
+            continue
+
+        if element.tag == "Spot":
+            spot_ids.append(int(element.get("ID")))
+            frames.append(float(element.get("FRAME")))
+            x.append(float(element.get("POSITION_X")))
+            y.append(float(element.get("POSITION_Y")))
+            element.clear()
+        elif element.tag == "Edge":
+            spot_tracks[int(element.get("SPOT_SOURCE_ID"))] = track_id
+            spot_tracks[int(element.get("SPOT_TARGET_ID"))] = track_id
+        elif element.tag == "Track":
+            element.clear()
+        elif element.tag == "TrackID" and filtered is not None:
+            filtered.add(float(element.get("TRACK_ID")))
+        elif element.tag == "SpotsInFrame":
+            element.clear()
+
+    tracks = np.array([spot_tracks.get(spot_id, np.nan) for spot_id in spot_ids], dtype=float)
+    keep = ~np.isnan(tracks)
+    if filtered is not None:
+        keep &= np.isin(tracks, list(filtered))
+
+    df = pd.DataFrame({
+        "Track n": tracks[keep],
+        "Slice n": np.asarray(frames, dtype=float)[keep] + 1,
+        "X": np.asarray(x, dtype=float)[keep],
+        "Y": np.asarray(y, dtype=float)[keep],
+    }).sort_values(["Track n", "Slice n"], kind='stable', ignore_index=True)
+    logger.info(f"Importers : {len(df)} spots of {len(np.unique(df['Track n']))} tracks read from {file_path}")
+    return {sheet_name(file_path): df}
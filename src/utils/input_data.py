@@ -1,9 +1,102 @@
 # This code uses pandera library to validate the input data in the application
 
 
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
 import pandera.pandas as pa
-from pandera.pandas import Column, DataFrameSchema, Check
+from pandera.pandas import Column, DataFrameSchema
+
+from logs.logger import app_logger as logger
+
+from src.utils.importers import (DELIMITED_SUFFIXES, delimited_chunks, is_text_xls, read_delimited,
+                                 read_trackmate_xml, sheet_name)
+from src.utils.track_store import STORE_CHUNK_ROWS, TrackStore
+from src.utils.workbook_cache import workbook_cache
+from src.utils.xlsx_reader import UnsupportedWorkbook, read_xlsx, sheet_names as xlsx_sheet_names
+
+# Columns every sheet must have, read as float
+REQUIRED_COLUMNS = ("Track n", "Slice n", "X", "Y")
+
+class SliceContinuityError(ValueError):
+    """
+    Raised when the 'Slice n' values of some tracks are not a continuous sequence.
+
+    Args:
+        issues (dict): Track id -> {'missing': list of (first, last) missing slices,
+            'duplicated': list of slices present more than once}, see `slice_issues`.
+    """
+    # Number of tracks detailed in the message, all of them are in `issues`
+    MAX_REPORTED = 20
+
+    def __init__(self, issues):
+        self.issues = issues
+        lines = [f"track {format_number(track)}: {describe_issue(issue)}"
+                 for track, issue in list(issues.items())[:self.MAX_REPORTED]]
+        if len(issues) > self.MAX_REPORTED:
+            lines.append(f"... and {len(issues) - self.MAX_REPORTED} more tracks")
+        super().__init__(f"'Slice n' is not continuous in {len(issues)} tracks "
+                         f"(make sure each track has a unique id):\n" + "\n".join(lines))
+
+
+def format_number(value):
+    """
+    Formats a track or slice number without a trailing '.0'.
+    """
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+
+def describe_issue(issue):
+    """
+    Describes the missing and duplicated slices of one track, e.g. "missing slices 5-7, 12; duplicated slices 3".
+    """
+    parts = []
+    if issue["missing"]:
+        ranges = [str(first) if first == last else f"{first}-{last}" for first, last in issue["missing"]]
+        parts.append("missing slices " + ", ".join(ranges))
+    if issue["duplicated"]:
+        parts.append("duplicated slices " + ", ".join(str(slice_n) for slice_n in issue["duplicated"]))
+    return "; ".join(parts)
+
+
+def slice_issues(df):
+    """
+    Finds the tracks whose 'Slice n' values have gaps or duplicates, with one sort of all
+    rows by track and slice and a comparison of consecutive slices.
+
+    Rows without 'Track n' or 'Slice n' are ignored and slices are truncated to integers.
+
+    Args:
+        df (pd.DataFrame): Input DataFrame.
+
+    Returns:
+        dict: Track id -> {'missing': list of (first, last) ranges of missing slices,
+        'duplicated': sorted list of slices present more than once}, in ascending track
+        order. Empty if every track is continuous.
+    """
+    tracks = pd.to_numeric(df["Track n"], errors='coerce').to_numpy(dtype=float)
+    slices = pd.to_numeric(df["Slice n"], errors='coerce').to_numpy(dtype=float)
+    valid = ~(np.isnan(tracks) | np.isnan(slices))
+    tracks, slices = tracks[valid], np.trunc(slices[valid]).astype(np.int64)
+
+    order = np.lexsort((slices, tracks))
+    tracks, slices = tracks[order], slices[order]
+    same_track = tracks[1:] == tracks[:-1]
+    step = np.diff(slices)
+    duplicated = np.flatnonzero(same_track & (step == 0))
+    gaps = np.flatnonzero(same_track & (step > 1))
+
+    issues = {}
+    for i in np.union1d(duplicated, gaps):
+        issue = issues.setdefault(tracks[i].item(), {"missing": [], "duplicated": []})
+        if step[i] == 0:
+            if slices[i] not in issue["duplicated"]:
+                issue["duplicated"].append(slices[i].item())
+        else:
+            issue["missing"].append((slices[i].item() + 1, slices[i + 1].item() - 1))
+    return issues
+
 
 def is_slice_continuous(df: pd.DataFrame) -> bool:
     """
@@ -16,22 +109,215 @@ def is_slice_continuous(df: pd.DataFrame) -> bool:
     Returns:
         bool: True if all 'Track n' groups have continuous 'Slice n' values, False otherwise.
     """
-    # For each track n
-    for _, group in df.groupby("Track n"):
-        # Sort and drop NaN values
-        slices = group["Slice n"].dropna().sort_values().astype(int)
-        # Create thelist of expected values in the slice column (continuous)
-        expected = list(range(slices.min(), slices.max() + 1))
-        if slices.tolist() != expected:
-            return False
-    return True
+    return not slice_issues(df)
 
+# Types of the required columns; the continuity of the slices is checked by `validate_sheet`
 input_schema = DataFrameSchema({
     "Track n": Column(pa.Float, nullable=False),
     "Slice n": Column(pa.Float, nullable=False),
     "X": Column(pa.Float, nullable=False),
     "Y": Column(pa.Float, nullable=False),
-    },
-    checks=[
-        Check(is_slice_continuous ,error="Doubled Track n. Make sure each track has unique id.")
-    ])
+    })
+
+
+def validate_sheet(df):
+    """
+    Validates a sheet whose required columns were cast to float: column types and missing
+    values with `input_schema`, then the continuity of the slices of every track.
+
+    Args:
+        df (pd.DataFrame): Sheet data.
+
+    Raises:
+        pa.errors.SchemaError: If a required column is missing, not float or has missing values.
+        SliceContinuityError: If some tracks have missing or duplicated slices, all of them reported.
+    """
+    input_schema.validate(df.dropna(how="all"))
+    issues = slice_issues(df)
+    if issues:
+        raise SliceContinuityError(issues)
+
+
+def validate_sheets(sheets):
+    """
+    Validates every sheet of a workbook.
+
+    Args:
+        sheets (dict): Sheet name -> DataFrame.
+
+    Returns:
+        dict: Names of the sheets that failed validation -> SchemaError or SliceContinuityError.
+    """
+    errors = {}
+    for name, df in sheets.items():
+        try:
+            validate_sheet(df)
+        except (pa.errors.SchemaError, SliceContinuityError) as e:
+            errors[name] = e
+    return errors
+
+
+def validate_store(store, chunk_rows=STORE_CHUNK_ROWS):
+    """
+    Validates the trajectories of a TrackStore like `validate_sheet`, a chunk of tracks
+    at a time. Rows without 'Track n' or 'Slice n' were dropped when the store was written.
+
+    Args:
+        store (TrackStore): Store to validate.
+        chunk_rows (int, optional): Rows validated at once.
+
+    Raises:
+        pa.errors.SchemaError: If a coordinate is missing.
+        SliceContinuityError: If some tracks have missing or duplicated slices, all of them reported.
+    """
+    issues = {}
+    for tracks in store.track_chunks(np.arange(store.n_tracks), chunk_rows):
+        chunk = store.chunk(tracks)
+        input_schema.validate(chunk)
+        issues.update(slice_issues(chunk))
+    if issues:
+        raise SliceContinuityError(issues)
+
+
+def read_track_stores(file_path, cache=workbook_cache, directory=None):
+    """
+    Reads the trajectories of every sheet of a file into TrackStores and validates them,
+    for datasets too large to be analysed from DataFrames. Text tables are streamed to
+    the store chunk by chunk; workbooks and TrackMate files are read one sheet at a time,
+    required columns only, with `read_workbook`.
+
+    Args:
+        file_path (str | Path): Path to the workbook, text table or TrackMate file.
+        cache (WorkbookCache, optional): Cache of the typed sheets, None to disable it.
+        directory (str | Path, optional): Parent directory of the stores, see `TrackStore.create`.
+
+    Returns:
+        tuple: (stores, errors) where `stores` maps sheet names to the TrackStores of the
+        valid sheets and `errors` maps the other sheet names to their validation error.
+        The caller removes the stores.
+
+    Raises:
+        Exception: If the file cannot be read or a sheet misses a required column.
+    """
+    suffix = Path(file_path).suffix.lower()
+    delimited = suffix in DELIMITED_SUFFIXES or (suffix == ".xls" and is_text_xls(file_path))
+    stores, errors = {}, {}
+    try:
+        for name in workbook_sheet_names(file_path):
+            if delimited:
+                store = TrackStore.create(delimited_chunks(file_path), directory)
+            else:
+                sheets, _ = read_workbook(file_path, [], cache=cache, validate=False, sheet_names=[name])
+                store = TrackStore.from_frame(sheets.pop(name), directory)
+                del sheets
+            stores[name] = store
+            try:
+                validate_store(store)
+            except (pa.errors.SchemaError, SliceContinuityError) as e:
+                errors[name] = e
+                stores.pop(name).remove()
+    except BaseException:
+        for store in stores.values():
+            store.remove()
+        raise
+    return stores, errors
+
+
+def read_workbook(file_path, extra_columns=None, cache=workbook_cache, validate=True, sheet_names=None):
+    """
+    Reads every sheet of an Excel workbook, casts the required columns to float
+    and validates them with `validate_sheet`.
+
+    The cells are parsed straight from the sheet XML by `read_xlsx`, the required columns
+    becoming float arrays without intermediate Python objects. Workbooks it does not
+    support (.xls, dates, text in the required columns...) are read with pandas.
+    Text tables (.csv, .tsv, .txt and ImageJ's text .xls) and TrackMate XML files are
+    imported as a workbook with one sheet, see `read_delimited` and `read_trackmate_xml`.
+
+    The typed sheets are stored in `cache` and loaded from it, without parsing, until the
+    file changes. Sheets read one at a time (`sheet_names`) are cached one at a time.
+
+    Args:
+        file_path (str | Path): Path to the workbook, text table or TrackMate file.
+        extra_columns (list of str, optional): Columns read besides REQUIRED_COLUMNS.
+            If None, every column is read.
+        cache (WorkbookCache, optional): Cache of the typed sheets, None to disable it.
+        validate (bool, optional): Validate the sheets. With False, `errors` is always
+            empty and the caller validates the sheets later (see `DataModel.validate`).
+        sheet_names (collection of str, optional): Sheets to read, all if None
+            (see `workbook_sheet_names`). Text tables and TrackMate files have one sheet.
+
+    Returns:
+        tuple: (sheets, errors) where `sheets` maps sheet names to DataFrames and
+        `errors` maps the names of sheets that failed validation to the SchemaError
+        or SliceContinuityError.
+
+    Raises:
+        Exception: If the file cannot be read or a sheet misses a required column.
+    """
+    columns = None if extra_columns is None else set(REQUIRED_COLUMNS) | set(extra_columns)
+    sheets = cache.load(file_path, columns, sheet_names) if cache is not None else None
+
+    if sheets is None:
+        sheets = read_sheets(file_path, columns, sheet_names)
+        for df in sheets.values():
+            # Cast required columns
+            df["Track n"] = df["Track n"].astype(float)
+            df["Slice n"] = df["Slice n"].astype(float)
+            df["X"] = df["X"].astype(float)
+            df["Y"] = df["Y"].astype(float)
+
+        # Only complete workbooks are cached, projected reads are served from them
+        if cache is not None and columns is None:
+            all_sheets = list(sheets) if sheet_names is None else workbook_sheet_names(file_path)
+            cache.store(file_path, sheets, all_sheets)
+
+    errors = validate_sheets(sheets) if validate else {}
+    return sheets, errors
+
+
+def read_sheets(file_path, columns=None, sheet_names=None):
+    """
+    Reads the sheets of a file with the reader matching its format, without validation.
+
+    Args:
+        file_path (str | Path): Path to the workbook, text table or TrackMate file.
+        columns (collection, optional): Columns to read, all if None.
+        sheet_names (collection of str, optional): Workbook sheets to read, all if None.
+
+    Returns:
+        dict: Sheet name -> DataFrame.
+    """
+    suffix = Path(file_path).suffix.lower()
+    if suffix == ".xml":
+        return read_trackmate_xml(file_path)
+    if suffix in DELIMITED_SUFFIXES or (suffix == ".xls" and is_text_xls(file_path)):
+        return read_delimited(file_path, columns)
+
+    try:
+        return read_xlsx(file_path, columns=columns, numeric=REQUIRED_COLUMNS, sheets=sheet_names)
+    except UnsupportedWorkbook as e:
+        logger.info(f"Input data : {file_path} read with pandas: {e}")
+        usecols = None if columns is None else lambda name: name in columns
+        names = None if sheet_names is None else [name for name in workbook_sheet_names(file_path) if name in sheet_names]
+        return pd.read_excel(file_path, sheet_name=names, engine='openpyxl', usecols=usecols)
+
+
+def workbook_sheet_names(file_path):
+    """
+    Lists the sheets of a file without reading their cells.
+
+    Args:
+        file_path (str | Path): Path to the workbook, text table or TrackMate file.
+
+    Returns:
+        list of str: Sheet names in workbook order, the single sheet of text tables and TrackMate files.
+    """
+    suffix = Path(file_path).suffix.lower()
+    if suffix == ".xml" or suffix in DELIMITED_SUFFIXES or (suffix == ".xls" and is_text_xls(file_path)):
+        return [sheet_name(file_path)]
+    try:
+        return xlsx_sheet_names(file_path)
+    except UnsupportedWorkbook:
+        with pd.ExcelFile(file_path) as workbook:
+            return workbook.sheet_names
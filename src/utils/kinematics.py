@@ -0,0 +1,153 @@
+# This code computes the per-step quantities shared by the analyses and the
+# statistics module once per sheet and keeps them in a bounded cache
+
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from logs.logger import app_logger as logger
+
+
+class Kinematics():
+    """
+    Derived per-step quantities of a set of trajectories, in the sorted row order of its TrackTable.
+
+    The arrays are read-only because the same instance is shared by every analysis
+    of the sheet through `get_kinematics`.
+
+    Args:
+        table (TrackTable): Track index of the data.
+        time_interval (float): Time between slices.
+
+    Attributes:
+        delta_x (np.ndarray): ΔX from the previous slice, NaN on the first row of each track.
+        delta_y (np.ndarray): ΔY from the previous slice, NaN on the first row of each track.
+        distance (np.ndarray): Distance from the previous slice.
+        time (np.ndarray): Slice n × time interval.
+        instant_speed (np.ndarray): distance / time.
+        cos_theta (np.ndarray): cos(θ) of the movement vector.
+        sin_theta (np.ndarray): sin(θ) of the movement vector.
+    """
+    def __init__(self, table, time_interval):
+        self.time_interval = time_interval
+
+        self.delta_x = table.diff(table.x)
+        self.delta_y = table.diff(table.y)
+        self.distance = np.sqrt(self.delta_x**2 + self.delta_y**2)
+        self.time = table.slice_n * time_interval
+        self.instant_speed = self.distance / self.time
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.cos_theta = self.delta_x / self.distance
+            self.sin_theta = self.delta_y / self.distance
+
+        for array in self.arrays():
+            array.setflags(write=False)
+
+    def arrays(self):
+        """
+        Returns the arrays held by the instance.
+        """
+        return (self.delta_x, self.delta_y, self.distance, self.time,
+                self.instant_speed, self.cos_theta, self.sin_theta)
+
+    @property
+    def nbytes(self):
+        """
+        Returns the memory used by the arrays, in bytes.
+        """
+        return sum(array.nbytes for array in self.arrays())
+
+
+class KinematicsCache():
+    """
+    Least-recently-used cache of Kinematics keyed by (table fingerprint, time interval).
+
+    Thread-safe, so the analysis worker and the statistics module can share it.
+
+    Args:
+        max_bytes (int, optional): Memory budget. The least recently used entries are
+            dropped when it is exceeded; an entry larger than the budget is not stored.
+    """
+    def __init__(self, max_bytes=256 * 2**20):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, table, time_interval):
+        """
+        Returns the kinematics of the table, computing them if they are not cached.
+
+        Args:
+            table (TrackTable): Track index of the data.
+            time_interval (float): Time between slices.
+
+        Returns:
+            Kinematics: Shared, read-only kinematics.
+        """
+        key = (table.fingerprint, float(time_interval))
+        with self.lock:
+            kinematics = self.entries.get(key)
+            if kinematics is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return kinematics
+            self.misses += 1
+
+        kinematics = Kinematics(table, time_interval)
+        self.put(key, kinematics)
+        return kinematics
+
+    def put(self, key, kinematics):
+        """
+        Stores an entry and evicts the least recently used ones over the memory budget.
+
+        Args:
+            key (tuple): (table fingerprint, time interval).
+            kinematics (Kinematics): Entry to store.
+        """
+        if kinematics.nbytes > self.max_bytes:
+            logger.info(f"Kinematics cache : entry of {kinematics.nbytes} bytes not cached")
+            return
+
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = kinematics
+            self.nbytes += kinematics.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        """
+        Drops all entries.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+
+kinematics_cache = KinematicsCache()
+
+
+def get_kinematics(table, time_interval):
+    """
+    Returns the kinematics of a TrackTable from the shared cache.
+
+    Args:
+        table (TrackTable): Track index of the data.
+        time_interval (float): Time between slices.
+
+    Returns:
+        Kinematics: Shared, read-only kinematics.
+    """
+    return kinematics_cache.get(table, time_interval)
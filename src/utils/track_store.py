@@ -0,0 +1,264 @@
+# This code keeps the trajectories of large sheets in memory-mapped NumPy arrays on
+# local disk, so that analyses read them a chunk of tracks at a time
+
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from logs.logger import app_logger as logger
+
+# Sheets with more rows than this are analysed from a TrackStore
+LARGE_ROWS = 2_000_000
+# Rows read from the store (or from the source data) at once
+STORE_CHUNK_ROWS = 250_000
+# Directory of the stores, overridden by the environment variable of the same name
+STORE_DIR_VARIABLE = "CELL_MIGRATION_STORE_DIR"
+# Column -> file of the store, float64 values in track and slice order
+COLUMN_FILES = {"Track n": "track.f8", "Slice n": "slice.f8", "X": "x.f8", "Y": "y.f8"}
+
+
+def default_directory():
+    """
+    Returns the directory of the stores: $CELL_MIGRATION_STORE_DIR or a directory in the
+    temporary directory of the system.
+    """
+    if os.environ.get(STORE_DIR_VARIABLE):
+        return Path(os.environ[STORE_DIR_VARIABLE])
+    return Path(tempfile.gettempdir()) / "cell_migration_analysis" / "tracks"
+
+
+class TrackStore():
+    """
+    Trajectories ('Track n', 'Slice n', 'X', 'Y') of one sheet in a directory of raw
+    float64 files sorted by track and slice, read through read-only memory maps, with
+    the start offset of every track (CSR-style, like TrackTable) kept in memory.
+
+    Only the pages of the rows being read are loaded, so a sheet of any size can be
+    analysed in bounded memory with `chunk`. A store is opened again from its directory,
+    e.g. in a worker process. `create` and `from_frame` write a new store; `remove`
+    deletes it (also when used as a context manager).
+
+    Args:
+        directory (str | Path): Directory written by `create`.
+
+    Attributes:
+        n_rows (int): Number of rows.
+        track_ids (np.ndarray): Unique track ids in ascending order.
+        offsets (np.ndarray): Start offset of each track, followed by `n_rows`.
+    """
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.n_rows = os.path.getsize(self.directory / COLUMN_FILES["Track n"]) // 8
+        self.track_ids = np.load(self.directory / "track_ids.npy")
+        self.offsets = np.load(self.directory / "offsets.npy")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.remove()
+
+    def __len__(self):
+        return self.n_rows
+
+    def __reduce__(self):
+        # Sent to worker processes by path, never by content
+        return (TrackStore, (str(self.directory),))
+
+    @property
+    def n_tracks(self):
+        """
+        Returns the number of tracks.
+        """
+        return len(self.track_ids)
+
+    @property
+    def lengths(self):
+        """
+        Returns the number of rows of each track.
+        """
+        return np.diff(self.offsets)
+
+    def column(self, name):
+        """
+        Returns a column as a read-only memory map.
+
+        Args:
+            name (str): One of 'Track n', 'Slice n', 'X', 'Y'.
+
+        Returns:
+            np.memmap: float64 values in track and slice order.
+        """
+        if self.n_rows == 0:
+            return np.empty(0)
+        return np.memmap(self.directory / COLUMN_FILES[name], dtype=np.float64, mode="r", shape=(self.n_rows,))
+
+    def chunk(self, tracks, width=None):
+        """
+        Reads the rows of some tracks into a DataFrame.
+
+        Args:
+            tracks (np.ndarray): Positions of the tracks in `track_ids`, ascending.
+            width (int, optional): Read only the first `width` rows of every track, which
+                must all have at least `width` rows. All rows if None.
+
+        Returns:
+            pd.DataFrame: 'Track n', 'Slice n', 'X', 'Y' of the tracks, in track and slice order.
+        """
+        tracks = np.asarray(tracks, dtype=np.int64)
+        if width is None:
+            lengths = self.lengths[tracks]
+            rows = np.repeat(self.offsets[tracks] - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        else:
+            rows = (self.offsets[tracks][:, None] + np.arange(width)).ravel()
+        return pd.DataFrame({name: self.column(name)[rows] for name in COLUMN_FILES})
+
+    def track_chunks(self, tracks, chunk_rows=STORE_CHUNK_ROWS, width=None):
+        """
+        Splits tracks into groups of about `chunk_rows` rows.
+
+        Args:
+            tracks (np.ndarray): Positions of the tracks in `track_ids`, ascending.
+            chunk_rows (int, optional): Rows per group.
+            width (int, optional): Rows read per track, see `chunk`; all rows if None.
+
+        Returns:
+            list of np.ndarray: Track positions of each group, in order.
+        """
+        tracks = np.asarray(tracks, dtype=np.int64)
+        rows = self.lengths[tracks] if width is None else np.full(len(tracks), width)
+        ends = np.cumsum(rows)
+        cuts = np.searchsorted(ends, np.arange(chunk_rows, ends[-1] if len(ends) else 0, chunk_rows), side="left") + 1
+        return [part for part in np.split(tracks, np.unique(cuts)) if len(part)]
+
+    def remove(self):
+        """
+        Deletes the files of the store.
+        """
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    @classmethod
+    def create(cls, chunks, directory=None):
+        """
+        Writes a store from chunks of rows, holding only one chunk in memory when the rows
+        come sorted by track and slice (as exported by trackers). Otherwise the rows are
+        sorted afterwards, which needs the track and slice columns and the sort order in
+        memory (24 bytes per row) but never the whole table.
+
+        Rows without 'Track n' or 'Slice n' are dropped, values that are not numbers become NaN.
+
+        Args:
+            chunks (iterable of pd.DataFrame): Rows with 'Track n', 'Slice n', 'X', 'Y', in any order.
+            directory (str | Path, optional): Parent directory, see `default_directory`.
+
+        Returns:
+            TrackStore: The new store.
+        """
+        parent = Path(directory) if directory is not None else default_directory()
+        parent.mkdir(parents=True, exist_ok=True)
+        path = Path(tempfile.mkdtemp(dir=parent, prefix="tracks-"))
+        try:
+            is_sorted = True
+            last = (-np.inf, -np.inf)
+            files = {name: open(path / f"{file}.raw", "wb") for name, file in COLUMN_FILES.items()}
+            try:
+                for chunk in chunks:
+                    columns = {name: pd.to_numeric(chunk[name], errors='coerce').to_numpy(dtype=np.float64)
+                               for name in COLUMN_FILES}
+                    valid = ~(np.isnan(columns["Track n"]) | np.isnan(columns["Slice n"]))
+                    columns = {name: values[valid] for name, values in columns.items()}
+                    track, slice_n = columns["Track n"], columns["Slice n"]
+                    if len(track) == 0:
+                        continue
+                    if is_sorted:
+                        keys = (np.concatenate([[last[0]], track]), np.concatenate([[last[1]], slice_n]))
+                        is_sorted = bool(np.all((keys[0][1:] > keys[0][:-1])
+                                                | ((keys[0][1:] == keys[0][:-1]) & (keys[1][1:] >= keys[1][:-1]))))
+                        last = (track[-1], slice_n[-1])
+                    for name, values in columns.items():
+                        files[name].write(values.tobytes())
+            finally:
+                for file in files.values():
+                    file.close()
+
+            if is_sorted:
+                for file in COLUMN_FILES.values():
+                    os.replace(path / f"{file}.raw", path / file)
+            else:
+                sort_columns(path)
+            write_index(path)
+        except BaseException:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+
+        store = cls(path)
+        logger.info(f"Track store : {store.n_rows} rows of {store.n_tracks} tracks written to {path}"
+                    f"{'' if is_sorted else ' (sorted)'}")
+        return store
+
+    @classmethod
+    def from_frame(cls, df, directory=None, chunk_rows=STORE_CHUNK_ROWS):
+        """
+        Writes the required columns of a sheet to a new store, `chunk_rows` rows at a time,
+        without copying the sheet.
+
+        Args:
+            df (pd.DataFrame): Sheet with 'Track n', 'Slice n', 'X', 'Y'.
+            directory (str | Path, optional): Parent directory, see `default_directory`.
+            chunk_rows (int, optional): Rows converted at once.
+
+        Returns:
+            TrackStore: The new store.
+        """
+        columns = [df.columns.get_loc(name) for name in COLUMN_FILES]
+        chunks = (df.iloc[start:start + chunk_rows, columns] for start in range(0, len(df), chunk_rows))
+        return cls.create(chunks, directory)
+
+
+def sort_columns(path, block_rows=STORE_CHUNK_ROWS):
+    """
+    Sorts the raw columns of a store by track and slice into their final files.
+
+    Args:
+        path (Path): Store directory holding `<file>.raw` for every column.
+        block_rows (int, optional): Rows gathered at once.
+    """
+    raw = {name: np.fromfile(path / f"{file}.raw", dtype=np.float64) if name in ("Track n", "Slice n")
+           else np.memmap(path / f"{file}.raw", dtype=np.float64, mode="r")
+           for name, file in COLUMN_FILES.items()}
+    order = np.lexsort((raw["Slice n"], raw["Track n"]))
+    for name, file in COLUMN_FILES.items():
+        values = raw[name]
+        with open(path / file, "wb") as out:
+            for start in range(0, len(order), block_rows):
+                out.write(values[order[start:start + block_rows]].tobytes())
+        raw[name] = None
+        del values
+        os.remove(path / f"{file}.raw")
+
+
+def write_index(path, block_rows=STORE_CHUNK_ROWS):
+    """
+    Writes the track ids and start offsets of a sorted store, reading its track column in blocks.
+
+    Args:
+        path (Path): Store directory.
+        block_rows (int, optional): Rows read at once.
+    """
+    size = os.path.getsize(path / COLUMN_FILES["Track n"]) // 8
+    track = np.memmap(path / COLUMN_FILES["Track n"], dtype=np.float64, mode="r", shape=(size,)) if size else np.empty(0)
+    starts = []
+    previous = np.nan
+    for start in range(0, size, block_rows):
+        block = np.asarray(track[start:start + block_rows])
+        changes = np.flatnonzero(np.concatenate([[block[0] != previous], block[1:] != block[:-1]]))
+        starts.append(changes + start)
+        previous = block[-1]
+    starts = np.concatenate(starts) if starts else np.empty(0, dtype=np.int64)
+    np.save(path / "track_ids.npy", np.asarray(track[starts], dtype=np.float64))
+    np.save(path / "offsets.npy", np.append(starts, size).astype(np.int64))
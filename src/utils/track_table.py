@@ -0,0 +1,220 @@
+# This code groups trajectory rows by track once, so analyses do not have to
+# mask the whole DataFrame for every track
+
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+
+class TrackTable():
+    """
+    Sorted, offset-indexed (CSR-style) container of trajectory data.
+
+    Rows are sorted by 'Track n' and 'Slice n' once. The X, Y and Slice n columns are
+    stored as contiguous arrays and track i occupies rows offsets[i]:offsets[i + 1],
+    so a track is a slice of the arrays instead of a boolean mask over the DataFrame.
+    Rows without 'Track n' or 'Slice n' do not belong to any trajectory and are skipped.
+
+    Args:
+        data (pd.DataFrame): Trajectory data with 'Track n', 'Slice n', 'X', 'Y'.
+
+    Attributes:
+        n_rows (int): Number of rows in the source DataFrame.
+        order (np.ndarray): Positions in the source DataFrame of the sorted rows.
+        track_ids (np.ndarray): Unique track ids in ascending order.
+        offsets (np.ndarray): Start offset of each track, followed by the total length.
+        slice_n (np.ndarray): Sorted 'Slice n' values.
+        x (np.ndarray): Sorted 'X' values.
+        y (np.ndarray): Sorted 'Y' values.
+    """
+    def __init__(self, data):
+        track = pd.to_numeric(data["Track n"], errors='coerce').to_numpy(dtype=float)
+        slice_n = pd.to_numeric(data["Slice n"], errors='coerce').to_numpy(dtype=float)
+
+        # Sort valid rows by track, then by slice (lexsort uses the last key as primary)
+        positions = np.flatnonzero(~(np.isnan(track) | np.isnan(slice_n)))
+        self.order = positions[np.lexsort((slice_n[positions], track[positions]))]
+        self.n_rows = len(data)
+
+        sorted_tracks = track[self.order]
+        starts = np.flatnonzero(np.diff(sorted_tracks)) + 1
+        if len(sorted_tracks):
+            starts = np.concatenate(([0], starts))
+        self.offsets = np.append(starts, len(sorted_tracks))
+        self.track_ids = sorted_tracks[starts]
+
+        self.slice_n = slice_n[self.order]
+        self.x = self.column(data, "X")
+        self.y = self.column(data, "Y")
+
+        self._track_index = None
+        self._fingerprint = None
+
+    def __len__(self):
+        """
+        Returns the number of trajectory rows in the table.
+        """
+        return len(self.order)
+
+    @property
+    def n_tracks(self):
+        """
+        Returns the number of tracks.
+        """
+        return len(self.track_ids)
+
+    @property
+    def fingerprint(self):
+        """
+        Returns a hash of the track ids, slices and coordinates. Two tables with the
+        same fingerprint hold the same trajectories, whatever the row order of their source.
+        """
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(digest_size=16)
+            for array in (self.track_ids, self.offsets, self.slice_n, self.x, self.y):
+                digest.update(np.ascontiguousarray(array).tobytes())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    @property
+    def starts(self):
+        """
+        Returns the offset of the first row of each track.
+        """
+        return self.offsets[:-1]
+
+    @property
+    def lengths(self):
+        """
+        Returns the number of rows of each track.
+        """
+        return np.diff(self.offsets)
+
+    @property
+    def track_index(self):
+        """
+        Returns, for every sorted row, the position of its track in `track_ids`.
+        """
+        if self._track_index is None:
+            self._track_index = np.repeat(np.arange(self.n_tracks), self.lengths)
+        return self._track_index
+
+    @property
+    def position(self):
+        """
+        Returns, for every sorted row, its position inside its own track (0 for the first slice).
+        """
+        return np.arange(len(self)) - np.repeat(self.starts, self.lengths)
+
+    def track(self, i):
+        """
+        Returns the slice of the sorted arrays occupied by the i-th track.
+
+        Args:
+            i (int): Position of the track in `track_ids`.
+
+        Returns:
+            slice: Rows of the track in the sorted arrays.
+        """
+        return slice(self.offsets[i], self.offsets[i + 1])
+
+    def column(self, data, name):
+        """
+        Returns a column of the source DataFrame in sorted track order.
+
+        Args:
+            data (pd.DataFrame): The DataFrame the table was built from.
+            name (str): Column name.
+
+        Returns:
+            np.ndarray: Float values of the column for the sorted rows.
+        """
+        return pd.to_numeric(data[name], errors='coerce').to_numpy(dtype=float)[self.order]
+
+    def scatter(self, values):
+        """
+        Puts sorted per-row values back into the row order of the source DataFrame.
+
+        Args:
+            values (np.ndarray): Values for the sorted rows.
+
+        Returns:
+            np.ndarray: Array of length `n_rows`, NaN for rows outside any trajectory.
+        """
+        full = np.full(self.n_rows, np.nan)
+        full[self.order] = values
+        return full
+
+    def diff(self, values):
+        """
+        First difference of the values inside each track.
+
+        Args:
+            values (np.ndarray): Values for the sorted rows.
+
+        Returns:
+            np.ndarray: values[i] - values[i - 1], NaN on the first row of each track.
+        """
+        result = np.empty(len(values))
+        result[1:] = values[1:] - values[:-1]
+        result[self.starts] = np.nan
+        return result
+
+    def first(self, values):
+        """
+        Broadcasts the first value of each track to all rows of the track.
+
+        Args:
+            values (np.ndarray): Values for the sorted rows.
+
+        Returns:
+            np.ndarray: First value of the track for every sorted row.
+        """
+        return np.repeat(values[self.starts], self.lengths)
+
+    def cumsum(self, values):
+        """
+        Cumulative sum of the values inside each track.
+
+        Args:
+            values (np.ndarray): Values for the sorted rows.
+
+        Returns:
+            np.ndarray: Running sum restarted at the first row of each track.
+        """
+        return pd.Series(values).groupby(self.track_index).cumsum().to_numpy()
+
+    def mean(self, values):
+        """
+        Mean of the values of each track, ignoring NaN.
+
+        Args:
+            values (np.ndarray): Values for the sorted rows.
+
+        Returns:
+            np.ndarray: One mean per track, NaN if the track has no valid values.
+        """
+        valid = ~np.isnan(values)
+        sums = np.bincount(self.track_index[valid], weights=values[valid], minlength=self.n_tracks)
+        counts = np.bincount(self.track_index[valid], minlength=self.n_tracks)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return sums / counts
+
+    def to_matrix(self, values, width):
+        """
+        Lays out the values as a tracks x width matrix, one track per row.
+
+        Args:
+            values (np.ndarray): Values for the sorted rows.
+            width (int): Number of slices kept for each track.
+
+        Returns:
+            np.ndarray: Matrix padded with NaN where a track is shorter than `width`.
+        """
+        matrix = np.full((self.n_tracks, width), np.nan)
+        position = self.position
+        kept = position < width
+        matrix[self.track_index[kept], position[kept]] = values[kept]
+        return matrix
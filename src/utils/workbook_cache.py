@@ -0,0 +1,268 @@
+# This code keeps the typed sheets of opened workbooks on disk in a binary form,
+# so that a workbook opened again is loaded without parsing it
+
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from logs.logger import app_logger as logger
+
+# Bump when the layout of the entries changes, older entries are then ignored
+CACHE_VERSION = 2
+# Directory of the cache, overridden by the environment variable of the same name
+CACHE_DIR_VARIABLE = "CELL_MIGRATION_CACHE_DIR"
+
+
+def default_directory():
+    """
+    Returns the cache directory: $CELL_MIGRATION_CACHE_DIR or ~/.cache/cell_migration_analysis/workbooks.
+    """
+    if os.environ.get(CACHE_DIR_VARIABLE):
+        return Path(os.environ[CACHE_DIR_VARIABLE])
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "cell_migration_analysis" / "workbooks"
+
+
+def file_hash(file_path):
+    """
+    BLAKE2b digest of the content of a file, read in blocks.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class WorkbookCache():
+    """
+    On-disk cache of the sheets read from workbooks.
+
+    Each workbook has an entry directory named after its resolved path, holding a
+    `manifest.json` with the size, modification time and content hash of the file, the
+    names of all its sheets and the stored sheets, and one file per column: `.npy` for
+    numeric and boolean columns, loaded memory-mapped, `.json` for the other ones.
+    An entry is used when the size and modification time match, or when the content hash
+    matches after the file was touched or copied back. Sheets can be stored one at a time.
+
+    Args:
+        directory (str | Path, optional): Cache directory, see `default_directory`.
+        max_entries (int, optional): Number of workbooks kept, the least recently used are removed.
+
+    Attributes:
+        hits (int): Number of workbooks loaded from the cache.
+        misses (int): Number of workbooks not found or out of date.
+    """
+    def __init__(self, directory=None, max_entries=50):
+        self.directory = Path(directory) if directory is not None else default_directory()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # Sheets may be stored from a background thread while the GUI thread stores another one
+        self.lock = threading.Lock()
+
+    def entry_path(self, file_path):
+        """
+        Returns the entry directory of a workbook.
+        """
+        key = hashlib.blake2b(str(Path(file_path).resolve()).encode("utf-8"), digest_size=16).hexdigest()
+        return self.directory / key
+
+    def load(self, file_path, columns=None, sheets=None):
+        """
+        Loads sheets of a workbook if its entry is up to date.
+
+        Args:
+            file_path (str | Path): Path to the workbook.
+            columns (collection, optional): Columns to keep, all if None.
+            sheets (collection of str, optional): Sheets to load, every sheet of the workbook if None.
+
+        Returns:
+            dict | None: Sheet name -> DataFrame in workbook order, None if the workbook is
+            not cached, changed or one of the sheets is not cached yet.
+        """
+        entry = self.entry_path(file_path)
+        try:
+            # A manifest refreshed here must not overwrite the sheets being stored meanwhile
+            with self.lock:
+                manifest = self.current_manifest(file_path)
+            if manifest is None:
+                raise FileNotFoundError(entry)
+            wanted = manifest["all_sheets"] if sheets is None else [name for name in manifest["all_sheets"] if name in sheets]
+            stored = {sheet["name"]: sheet for sheet in manifest["sheets"]}
+            if any(name not in stored for name in wanted):
+                raise FileNotFoundError(entry)
+
+            frames = {}
+            for name in wanted:
+                sheet = stored[name]
+                frame = {}
+                for column in sheet["columns"]:
+                    if columns is not None and column["name"] not in columns:
+                        continue
+                    path = entry / column["file"]
+                    if column["file"].endswith(".npy"):
+                        # Copy-on-write mapping: edits of the sheet never reach the cache
+                        frame[column["name"]] = np.load(path, mmap_mode="c")
+                    else:
+                        frame[column["name"]] = pd.Series(json.loads(path.read_text()), dtype=object)
+                # Without copy=False the mapped columns are read into one block in memory
+                frames[name] = pd.DataFrame(frame, index=pd.RangeIndex(sheet["n_rows"]), copy=False)
+        except (OSError, LookupError, ValueError, TypeError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.info(f"Workbook cache : {file_path} not loaded from the cache: {e}")
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        logger.info(f"Workbook cache : {list(frames)} of {file_path} loaded from the cache")
+        return frames
+
+    def current_manifest(self, file_path):
+        """
+        Reads the manifest of a workbook and checks that it matches the file; called with
+        the lock held.
+
+        The manifest is rewritten only when the modification time changed, otherwise its
+        own modification time is updated to keep the least recently used order.
+
+        Returns:
+            dict | None: Manifest, None if there is no entry or it is out of date.
+        """
+        path = self.entry_path(file_path) / "manifest.json"
+        try:
+            manifest = json.loads(path.read_text())
+        except FileNotFoundError:
+            return None
+        stat = os.stat(file_path)
+        if manifest.get("version") != CACHE_VERSION or manifest["size"] != stat.st_size:
+            return None
+        if manifest["mtime_ns"] != stat.st_mtime_ns:
+            if manifest["hash"] != file_hash(file_path):
+                return None
+            manifest["mtime_ns"] = stat.st_mtime_ns
+            write_json(path, manifest)
+        else:
+            os.utime(path)
+        return manifest
+
+    def store(self, file_path, sheets, all_sheets=None):
+        """
+        Writes sheets of a workbook to its entry. Sheets are added to an up-to-date entry,
+        so a workbook read sheet by sheet is cached sheet by sheet; an out-of-date entry
+        is replaced.
+
+        Nothing is stored, with a log message, if a column cannot be serialized
+        (e.g. dates read by pandas) or the cache directory is not writable.
+
+        Args:
+            file_path (str | Path): Path to the workbook the sheets were read from.
+            sheets (dict): Sheet name -> DataFrame, as returned by `read_workbook`.
+            all_sheets (list of str, optional): Names of every sheet of the workbook,
+                the keys of `sheets` if None.
+        """
+        with self.lock:
+            self.store_sheets(file_path, sheets, all_sheets)
+
+    def store_sheets(self, file_path, sheets, all_sheets):
+        """
+        Writes the sheets, see `store`; called with the lock held.
+        """
+        entry = self.entry_path(file_path)
+        temporary = None
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            manifest = self.current_manifest(file_path) if entry.exists() else None
+            if manifest is None:
+                # Write the size and time before hashing, a file changed meanwhile is then seen as out of date
+                stat = os.stat(file_path)
+                manifest = {
+                    "version": CACHE_VERSION,
+                    "path": str(Path(file_path).resolve()),
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "hash": file_hash(file_path),
+                    "all_sheets": list(all_sheets if all_sheets is not None else sheets),
+                    "sheets": [],
+                }
+                shutil.rmtree(entry, ignore_errors=True)
+            entry.mkdir(exist_ok=True)
+
+            # Column files of the new sheets are written under new names, the manifest
+            # written last is the only reference to them
+            temporary = Path(tempfile.mkdtemp(dir=entry, prefix=".tmp-"))
+            prefix = temporary.name
+            written = []
+            for sheet_name, df in sheets.items():
+                sheet = {"name": sheet_name, "n_rows": len(df), "columns": []}
+                for j, (name, values) in enumerate(df.items()):
+                    if values.dtype.kind in "biufcmM":
+                        file = f"{prefix}/{len(written)}_{j}.npy"
+                        np.save(entry / file, values.to_numpy(), allow_pickle=False)
+                    else:
+                        file = f"{prefix}/{len(written)}_{j}.json"
+                        write_json(entry / file, values.tolist())
+                    sheet["columns"].append({"name": name, "file": file})
+                written.append(sheet)
+
+            replaced = {sheet["name"] for sheet in written}
+            manifest["sheets"] = [sheet for sheet in manifest["sheets"] if sheet["name"] not in replaced] + written
+            write_json(entry / "manifest.json", manifest)
+            temporary = None
+        except (OSError, TypeError, ValueError) as e:
+            logger.info(f"Workbook cache : {file_path} not cached: {e}")
+            return
+        finally:
+            if temporary is not None:
+                shutil.rmtree(temporary, ignore_errors=True)
+
+        self.remove_unused(entry, manifest)
+        self.prune()
+
+    def remove_unused(self, entry, manifest):
+        """
+        Deletes the column files of an entry that its manifest does not reference any more.
+        """
+        used = {column["file"].split("/")[0] for sheet in manifest["sheets"] for column in sheet["columns"]}
+        for path in entry.iterdir():
+            if path.is_dir() and path.name not in used:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def prune(self):
+        """
+        Removes the least recently used entries over `max_entries`.
+        """
+        manifests = sorted(self.directory.glob("*/manifest.json"), key=lambda path: path.stat().st_mtime)
+        for manifest in manifests[:max(len(manifests) - self.max_entries, 0)]:
+            shutil.rmtree(manifest.parent, ignore_errors=True)
+
+    def clear(self):
+        """
+        Removes every entry.
+        """
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def write_json(path, content):
+    """
+    Writes JSON to a file through a temporary file, so readers never see a partial file.
+    """
+    descriptor, temporary = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "w") as file:
+            file.write(json.dumps(content))
+        os.replace(temporary, path)
+    except BaseException:
+        Path(temporary).unlink(missing_ok=True)
+        raise
+
+
+workbook_cache = WorkbookCache()
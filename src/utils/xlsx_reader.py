@@ -0,0 +1,296 @@
+# This code reads the cell values of .xlsx workbooks straight from the sheet XML,
+# without building openpyxl cell objects, keeping only the requested columns
+
+
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from functools import lru_cache
+from html import unescape
+
+import numpy as np
+import pandas as pd
+
+MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# One cell: reference, other attributes, then an optional formula followed by a value or an inline string
+CELL = re.compile(
+    rb'<c r="([A-Z]{1,3})(\d+)"([^>]*?)(?:/>|>(?:<f[^>]*?(?:/>|>[^<]*</f>))?(?:<v>([^<]*)</v>|<v ?/>|<is>(.*?)</is>)?</c>)',
+    re.S)
+CELL_TYPE = re.compile(rb'\bt="(\w+)"')
+CELL_STYLE = re.compile(rb'\bs="(\d+)"')
+TEXT = re.compile(rb'<t(?: [^>]*)?>([^<]*)</t>')
+PHONETIC = re.compile(rb'<rPh\b.*?</rPh>', re.S)
+
+# Built-in number formats showing dates or times
+DATE_FORMAT_IDS = set(range(14, 23)) | set(range(27, 37)) | set(range(45, 48)) | set(range(50, 59))
+
+
+class UnsupportedWorkbook(Exception):
+    """
+    Raised when a workbook uses a feature the fast reader does not handle; the caller
+    should read it with pandas instead.
+    """
+
+
+def read_xlsx(file_path, columns=None, numeric=(), sheets=None):
+    """
+    Reads the sheets of an .xlsx workbook, using the first row as header like pd.read_excel.
+
+    Args:
+        file_path (str | Path): Path to the workbook.
+        columns (collection of str, optional): Names of the columns to keep, all if None.
+        numeric (collection of str, optional): Columns returned as float64 arrays. A text
+            value in one of them raises UnsupportedWorkbook.
+        sheets (collection of str, optional): Names of the sheets to read, all if None.
+
+    Returns:
+        dict: Sheet name -> DataFrame, in workbook order.
+
+    Raises:
+        UnsupportedWorkbook: If the file is not a plain .xlsx workbook this reader understands.
+    """
+    try:
+        archive = zipfile.ZipFile(file_path)
+    except zipfile.BadZipFile as e:
+        raise UnsupportedWorkbook(f"not an .xlsx file: {e}") from e
+
+    with archive:
+        names = set(archive.namelist())
+        strings = shared_strings(archive) if "xl/sharedStrings.xml" in names else []
+        date_styles = None
+
+        frames = {}
+        for sheet_name, path in sheet_paths(archive):
+            if sheets is not None and sheet_name not in sheets:
+                continue
+            if path not in names or not path.startswith("xl/worksheets/"):
+                raise UnsupportedWorkbook(f"sheet '{sheet_name}' is not a worksheet")
+            if date_styles is None:
+                date_styles = date_style_indices(archive) if "xl/styles.xml" in names else set()
+            frames[sheet_name] = read_sheet(archive.read(path), strings, date_styles, columns, numeric)
+    return frames
+
+
+def sheet_names(file_path):
+    """
+    Lists the sheets of an .xlsx workbook without reading them.
+
+    Returns:
+        list of str: Sheet names in workbook order.
+
+    Raises:
+        UnsupportedWorkbook: If the file is not an .xlsx file.
+    """
+    try:
+        with zipfile.ZipFile(file_path) as archive:
+            return [name for name, _ in sheet_paths(archive)]
+    except (zipfile.BadZipFile, KeyError) as e:
+        raise UnsupportedWorkbook(f"not an .xlsx file: {e}") from e
+
+
+def sheet_paths(archive):
+    """
+    Lists the sheets of the workbook with the path of their XML part.
+
+    Returns:
+        list of tuples: (sheet name, path in the archive) in workbook order.
+    """
+    workbook = ET.fromstring(archive.read("xl/workbook.xml"))
+    relations = ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    targets = {rel.get("Id"): rel.get("Target") for rel in relations.iter(f"{PACKAGE_REL_NS}Relationship")}
+
+    paths = []
+    for sheet in workbook.iter(f"{MAIN_NS}sheet"):
+        target = targets.get(sheet.get(f"{REL_NS}id"), "")
+        path = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+        paths.append((sheet.get("name"), path))
+    return paths
+
+
+def shared_strings(archive):
+    """
+    Reads the shared string table, ignoring phonetic runs as openpyxl does.
+
+    Returns:
+        list of str: Strings by index.
+    """
+    data = PHONETIC.sub(b"", archive.read("xl/sharedStrings.xml"))
+    strings = []
+    for item in re.finditer(rb"<si>(.*?)</si>|<si/>", data, re.S):
+        strings.append(unescape(b"".join(TEXT.findall(item.group(1) or b"")).decode("utf-8")))
+    return strings
+
+
+def date_style_indices(archive):
+    """
+    Finds the cell styles that display numbers as dates or times.
+
+    Returns:
+        set of int: Indices in cellXfs of the date styles.
+    """
+    styles = ET.fromstring(archive.read("xl/styles.xml"))
+    custom = {}
+    for fmt in styles.iter(f"{MAIN_NS}numFmt"):
+        # Remove quoted text, escaped characters and [colour]/[condition] sections before looking for date codes
+        code = re.sub(r'"[^"]*"|\\.|\[[^\]]*\]', "", fmt.get("formatCode", ""))
+        custom[int(fmt.get("numFmtId"))] = re.search(r"[dDyYhHsS]", code) is not None
+
+    indices = set()
+    cell_xfs = styles.find(f"{MAIN_NS}cellXfs")
+    for i, xf in enumerate(cell_xfs if cell_xfs is not None else []):
+        fmt_id = int(xf.get("numFmtId", 0))
+        if custom.get(fmt_id, fmt_id in DATE_FORMAT_IDS):
+            indices.add(i)
+    return indices
+
+
+@lru_cache(maxsize=1024)
+def cell_attributes(attributes):
+    """
+    Parses the attributes following the reference of a cell. Sheets repeat a handful
+    of attribute strings, hence the cache.
+
+    Returns:
+        tuple: (type, style index) with type b"n" and style None when absent.
+    """
+    kind = CELL_TYPE.search(attributes)
+    style = CELL_STYLE.search(attributes)
+    return (kind.group(1) if kind else b"n"), (int(style.group(1)) if style else None)
+
+
+def column_index(letters):
+    """
+    Converts a column reference ("A", "AB") to a 0-based index.
+    """
+    index = 0
+    for letter in letters:
+        index = index * 26 + letter - 64
+    return index - 1
+
+
+def read_sheet(data, strings, date_styles, columns, numeric):
+    """
+    Parses the XML of one worksheet into a DataFrame.
+
+    Args:
+        data (bytes): Worksheet XML.
+        strings (list of str): Shared strings.
+        date_styles (set of int): Indices of the date styles.
+        columns (collection of str | None): Names of the columns to keep, all if None.
+        numeric (collection of str): Columns returned as float64 arrays.
+
+    Returns:
+        pd.DataFrame: Sheet content below the header row.
+    """
+    if b"<sheetData" not in data:
+        raise UnsupportedWorkbook("unexpected worksheet XML")
+    cells = CELL.findall(data)
+    # Every cell must have been matched, otherwise the layout is not the one expected
+    if len(cells) != data.count(b"<c ") + data.count(b"<c>"):
+        raise UnsupportedWorkbook("unexpected cell layout")
+    if not cells:
+        return pd.DataFrame()
+
+    letters = {ref: column_index(ref) for ref in {cell[0] for cell in cells}}
+    col = np.array([letters[cell[0]] for cell in cells])
+    row = np.array([cell[1] for cell in cells]).astype(np.int64)
+    has_value = np.array([bool(cell[3]) or bool(cell[4]) for cell in cells])
+
+    # Header row: the first row of the sheet
+    header = {}
+    for i in np.flatnonzero((row == 1) & has_value):
+        header[col[i]] = cell_value(cells[i], strings)
+    if not (has_value & (row > 1)).any() and not header:
+        return pd.DataFrame()
+
+    n_columns = col[has_value].max() + 1
+    names = [header[j] if j in header else f"Unnamed: {j}" for j in range(n_columns)]
+    if len(set(names)) != len(names):
+        raise UnsupportedWorkbook("duplicated column names")
+    n_rows = max(row[has_value].max() - 1, 0)
+
+    frame = {}
+    for j, name in enumerate(names):
+        if columns is not None and name not in columns:
+            continue
+        selected = np.flatnonzero((col == j) & (row > 1) & has_value)
+        positions = row[selected] - 2
+        if name in numeric:
+            frame[name] = numeric_column([cells[i] for i in selected], positions, n_rows, date_styles)
+        else:
+            frame[name] = value_column([cells[i] for i in selected], positions, n_rows, strings, date_styles)
+    return pd.DataFrame(frame)
+
+
+def cell_value(cell, strings, date_styles=()):
+    """
+    Converts one matched cell to a Python value the way pandas reads it with openpyxl.
+
+    Returns:
+        int | float | str | bool: Value, NaN for error cells.
+    """
+    _, _, attributes, value, inline = cell
+    kind, style = cell_attributes(attributes)
+
+    if kind == b"s":
+        return strings[int(value)]
+    if kind == b"inlineStr":
+        return unescape(b"".join(TEXT.findall(inline)).decode("utf-8"))
+    if kind == b"str":
+        return unescape(value.decode("utf-8"))
+    if kind == b"b":
+        return value == b"1"
+    if kind == b"e":
+        return np.nan
+    if kind != b"n":
+        raise UnsupportedWorkbook(f"unsupported cell type {kind.decode()}")
+
+    if style in date_styles:
+        raise UnsupportedWorkbook("date cells")
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+
+def numeric_column(cells, positions, n_rows, date_styles):
+    """
+    Builds a float64 column from numeric cells, parsing all values at once.
+
+    Raises:
+        UnsupportedWorkbook: If a cell holds text, a date or a non-numeric value.
+    """
+    column = np.full(n_rows, np.nan)
+    if not cells:
+        return column
+    for kind, style in map(cell_attributes, {cell[2] for cell in cells}):
+        if kind != b"n":
+            raise UnsupportedWorkbook("text in a numeric column")
+        if style in date_styles:
+            raise UnsupportedWorkbook("date cells")
+    try:
+        column[positions] = np.array([cell[3] for cell in cells]).astype(np.float64)
+    except ValueError as e:
+        raise UnsupportedWorkbook(f"unexpected numeric value: {e}") from e
+    return column
+
+
+def value_column(cells, positions, n_rows, strings, date_styles):
+    """
+    Builds a column of any type, with the dtype pandas would infer: int64 or bool when
+    every row holds an integer or a boolean, float64 for numbers and booleans with blanks,
+    object when text is present.
+    """
+    values = [cell_value(cell, strings, date_styles) for cell in cells]
+    if len(values) == n_rows and all(type(value) is int for value in values):
+        column = np.empty(n_rows, dtype=np.int64)
+    elif len(values) == n_rows and all(type(value) is bool for value in values):
+        column = np.empty(n_rows, dtype=bool)
+    elif all(type(value) in (int, float, bool) for value in values):
+        column = np.full(n_rows, np.nan)
+    else:
+        column = np.full(n_rows, np.nan, dtype=object)
+    column[positions] = values
+    return column
@@ -0,0 +1,307 @@
+# This code saves workbooks by streaming the sheet XML into the archive, copying the
+# sheets that did not change from the original file, and replaces the file atomically
+
+
+import os
+import re
+import secrets
+import shutil
+import zipfile
+from pathlib import Path
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+import pandas as pd
+
+from logs.logger import app_logger as logger
+
+from src.utils.xlsx_reader import MAIN_NS, UnsupportedWorkbook, sheet_paths
+
+# Rows converted to XML at once
+CHUNK_ROWS = 10_000
+# Sheets with more cells may exceed 2 GiB of XML and are written with ZIP64 records
+ZIP64_CELLS = 20_000_000
+# Fast deflate level: the sheet XML compresses well anyway and saving is several times faster
+COMPRESS_LEVEL = 1
+# Characters XML 1.0 does not allow, openpyxl refuses them as well
+ILLEGAL_CHARACTERS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '{overrides}</Types>')
+SHEET_CONTENT_TYPE = (
+    '<Override PartName="/xl/worksheets/sheet{i}.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>')
+PACKAGE_RELATIONSHIPS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>')
+WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    f'<workbook xmlns="{MAIN_NS[1:-1]}" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets>{sheets}</sheets></workbook>')
+WORKBOOK_RELATIONSHIPS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '{sheets}<Relationship Id="rIdStyles" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    '</Relationships>')
+SHEET_RELATIONSHIP = (
+    '<Relationship Id="rId{i}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet{i}.xml"/>')
+STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    f'<styleSheet xmlns="{MAIN_NS[1:-1]}">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>')
+
+
+def save_workbook(file_path, sheets, source=None, read_sheet=None, progress=None):
+    """
+    Saves sheets to an .xlsx workbook through a temporary file in the same directory,
+    renamed over `file_path` once complete, so the file is never left half written.
+
+    Sheets given as None did not change since they were read from `source`: when
+    `source` is an .xlsx workbook with the same sheets, their XML is copied as it is
+    and only the other sheets are written (`write_xlsx`). Otherwise they are read with
+    `read_sheet` and every sheet is written. Values the writer does not handle (dates...)
+    make the workbook be written with pandas instead.
+
+    Args:
+        file_path (str | Path): Destination workbook.
+        sheets (dict): Sheet name -> DataFrame, or None for a sheet unchanged since it was read from `source`.
+        source (str | Path, optional): File the unchanged sheets were read from.
+        read_sheet (callable, optional): Sheet name -> DataFrame of that sheet in `source`.
+        progress (callable, optional): Called with the fraction of the rows written, from 0 to 1.
+
+    Raises:
+        Exception: If the workbook cannot be written; the existing file is then unchanged.
+    """
+    file_path = Path(file_path)
+    # Created like any new file (umask permissions), next to the destination so the rename is atomic
+    temporary = file_path.with_name(f".{file_path.name}.{secrets.token_hex(4)}.tmp.xlsx")
+    open(temporary, "xb").close()
+    try:
+        try:
+            if any(df is None for df in sheets.values()):
+                try:
+                    write_xlsx(temporary, sheets, source, progress)
+                    sheets = None
+                except UnsupportedWorkbook as e:
+                    logger.info(f"Save : sheets of {file_path} not copied from {source}: {e}")
+                    sheets = {name: read_sheet(name) if df is None else df for name, df in sheets.items()}
+            if sheets is not None:
+                write_xlsx(temporary, sheets, progress=progress)
+        except UnsupportedWorkbook as e:
+            logger.info(f"Save : {file_path} written with pandas: {e}")
+            with pd.ExcelWriter(temporary, engine='openpyxl') as writer:
+                for name, df in sheets.items():
+                    df.to_excel(writer, sheet_name=name, index=False)
+
+        if file_path.exists():
+            shutil.copymode(file_path, temporary)
+        os.replace(temporary, file_path)
+    finally:
+        if os.path.exists(temporary):
+            os.unlink(temporary)
+
+
+def write_xlsx(file_path, sheets, source=None, progress=None):
+    """
+    Writes an .xlsx workbook, streaming the XML of each sheet into the archive in
+    chunks of rows. Text is written as inline strings, so copied sheets keep using the
+    shared strings and styles of `source`.
+
+    Args:
+        file_path (str | Path): Destination file.
+        sheets (dict): Sheet name -> DataFrame, or None to copy the sheet from `source`.
+        source (str | Path, optional): Workbook the None sheets are copied from, with
+            the same sheets in the same order.
+        progress (callable, optional): Called with the fraction of the rows written.
+
+    Raises:
+        UnsupportedWorkbook: If a sheet cannot be copied from `source` or holds values
+            other than numbers, booleans and text.
+    """
+    total = max(sum(len(df) for df in sheets.values() if df is not None), 1)
+    done = 0
+
+    def advance(rows):
+        nonlocal done
+        done += rows
+        if progress is not None:
+            progress(done / total)
+
+    with zipfile.ZipFile(file_path, "w", zipfile.ZIP_DEFLATED, compresslevel=COMPRESS_LEVEL) as archive:
+        if any(df is None for df in sheets.values()):
+            copy_package(archive, sheets, source, advance)
+        else:
+            write_package(archive, sheets, advance)
+    if progress is not None:
+        progress(1.0)
+
+
+def write_package(archive, sheets, advance):
+    """
+    Writes a new workbook holding `sheets`.
+    """
+    names = list(sheets)
+    archive.writestr("[Content_Types].xml", CONTENT_TYPES.format(
+        overrides="".join(SHEET_CONTENT_TYPE.format(i=i) for i in range(1, len(names) + 1))))
+    archive.writestr("_rels/.rels", PACKAGE_RELATIONSHIPS)
+    archive.writestr("xl/workbook.xml", WORKBOOK.format(sheets="".join(
+        f'<sheet name={quoteattr(name)} sheetId="{i}" r:id="rId{i}"/>' for i, name in enumerate(names, 1))))
+    archive.writestr("xl/_rels/workbook.xml.rels", WORKBOOK_RELATIONSHIPS.format(
+        sheets="".join(SHEET_RELATIONSHIP.format(i=i) for i in range(1, len(names) + 1))))
+    archive.writestr("xl/styles.xml", STYLES)
+    for i, name in enumerate(names, 1):
+        write_sheet(archive, f"xl/worksheets/sheet{i}.xml", sheets[name], advance)
+
+
+def copy_package(archive, sheets, source, advance):
+    """
+    Copies every part of `source`, writing the changed sheets in place of their part.
+    """
+    if source is None or Path(source).suffix.lower() not in (".xlsx", ".xlsm"):
+        raise UnsupportedWorkbook("no workbook to copy the sheets from")
+    try:
+        original = zipfile.ZipFile(source)
+    except (OSError, zipfile.BadZipFile) as e:
+        raise UnsupportedWorkbook(f"cannot open {source}: {e}") from e
+
+    with original:
+        try:
+            paths = dict(sheet_paths(original))
+        except KeyError as e:
+            raise UnsupportedWorkbook(f"not an .xlsx file: {e}") from e
+        if list(paths) != list(sheets):
+            raise UnsupportedWorkbook("the sheets differ from the original workbook")
+        names = set(original.namelist())
+        if "xl/calcChain.xml" in names:
+            # Formula cells of rewritten sheets would not match the calculation chain
+            raise UnsupportedWorkbook("workbook with formulas")
+
+        written = {}
+        for name, df in sheets.items():
+            if df is None:
+                continue
+            path = paths[name]
+            relationships = relationships_path(path)
+            if not path.startswith("xl/worksheets/") or relationships in names:
+                # Tables, drawings or comments would refer to cells of the old sheet
+                raise UnsupportedWorkbook(f"sheet '{name}' has linked parts")
+            written[path] = df
+
+        for info in original.infolist():
+            if info.filename in written:
+                write_sheet(archive, info.filename, written[info.filename], advance)
+                continue
+            # The size tells zipfile whether the copy needs ZIP64 records
+            copy_info = zipfile.ZipInfo(info.filename, info.date_time)
+            copy_info.compress_type = zipfile.ZIP_DEFLATED
+            copy_info.file_size = info.file_size
+            with original.open(info) as part, archive.open(copy_info, "w") as copy:
+                shutil.copyfileobj(part, copy, 1 << 20)
+
+
+def relationships_path(path):
+    """
+    Path of the relationships part of a part, e.g. xl/worksheets/_rels/sheet1.xml.rels.
+    """
+    folder, _, name = path.rpartition("/")
+    return f"{folder}/_rels/{name}.rels"
+
+
+def column_letters(index):
+    """
+    Converts a 0-based column index to its reference ("A", "AB").
+    """
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def write_sheet(archive, path, df, advance):
+    """
+    Streams one sheet into the archive: the column names as first row, then the values.
+    """
+    letters = [column_letters(j) for j in range(df.shape[1])]
+    with archive.open(path, "w", force_zip64=df.size > ZIP64_CELLS) as part:
+        part.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                   b'<worksheet xmlns="' + MAIN_NS[1:-1].encode() + b'"><sheetData>')
+        header = "".join(cell_xml(letter, 1, name) for letter, name in zip(letters, df.columns))
+        part.write(f'<row r="1">{header}</row>'.encode("utf-8"))
+
+        for start in range(0, len(df), CHUNK_ROWS):
+            chunk = df.iloc[start:start + CHUNK_ROWS]
+            rows = range(start + 2, start + 2 + len(chunk))
+            columns = [column_cells(letter, rows, values) for letter, (_, values) in zip(letters, chunk.items())]
+            lines = [f'<row r="{r}">{"".join(cells)}</row>' for r, cells in zip(rows, zip(*columns))]
+            part.write("".join(lines).encode("utf-8"))
+            advance(len(chunk))
+        part.write(b"</sheetData></worksheet>")
+
+
+def column_cells(letter, rows, values):
+    """
+    Converts a chunk of one column to cell XML, an empty string for blank cells.
+    """
+    if not isinstance(values.dtype, np.dtype):
+        # Nullable and categorical columns hold pd.NA for blanks
+        return [cell_xml(letter, r, value) for r, value in zip(rows, values.astype(object).tolist())]
+    kind = values.dtype.kind
+    if kind == "f":
+        array = values.to_numpy()
+        if np.isfinite(array[~np.isnan(array)]).all():
+            return ["" if value != value else f'<c r="{letter}{r}"><v>{value!r}</v></c>'
+                    for r, value in zip(rows, array.tolist())]
+    elif kind in "iu":
+        return [f'<c r="{letter}{r}"><v>{value}</v></c>' for r, value in zip(rows, values.tolist())]
+    elif kind == "b":
+        return [f'<c r="{letter}{r}" t="b"><v>{int(value)}</v></c>' for r, value in zip(rows, values.tolist())]
+    elif kind != "O":
+        raise UnsupportedWorkbook(f"cannot write {values.dtype} values")
+    return [cell_xml(letter, r, value) for r, value in zip(rows, values.tolist())]
+
+
+def cell_xml(letter, row, value):
+    """
+    Converts one value to cell XML the way pandas writes it: numbers, booleans, text,
+    'inf' for infinite numbers and nothing for blank cells.
+
+    Raises:
+        UnsupportedWorkbook: If the value is not a number, a boolean or text.
+    """
+    if value is None or value is pd.NA or (isinstance(value, str) and not value):
+        return ""
+    if isinstance(value, (bool, np.bool_)):
+        return f'<c r="{letter}{row}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, np.integer)):
+        return f'<c r="{letter}{row}"><v>{int(value)}</v></c>'
+    if isinstance(value, (float, np.floating)):
+        value = float(value)
+        if value != value:
+            return ""
+        if value in (np.inf, -np.inf):
+            value = "inf" if value > 0 else "-inf"
+        else:
+            return f'<c r="{letter}{row}"><v>{value!r}</v></c>'
+    if not isinstance(value, str):
+        raise UnsupportedWorkbook(f"cannot write {type(value).__name__} values")
+    if ILLEGAL_CHARACTERS.search(value):
+        raise UnsupportedWorkbook("control characters in text")
+    space = ' xml:space="preserve"' if value != value.strip() else ""
+    return f'<c r="{letter}{row}" t="inlineStr"><is><t{space}>{escape(value)}</t></is></c>'
@@ -0,0 +1,75 @@
+# This code checks the lag-matrix scalar products of the autocorrelation against a loop over pairs
+
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from src.Analysis.autocorrelation import direction_scalars
+from src.utils.kinematics import get_kinematics
+from src.utils.track_table import TrackTable
+
+
+def loop_scalars(table, cos_theta, sin_theta, n_steps):
+    """
+    Scalar products of each track, pair by pair, as the analysis computed them before.
+    """
+    mean = np.full((table.n_tracks, n_steps), np.nan)
+    sem = np.full((table.n_tracks, n_steps), np.nan)
+    for step in range(1, n_steps + 1):
+        for i in range(table.n_tracks):
+            rows = table.track(i)
+            dx, dy = cos_theta[rows], sin_theta[rows]
+            scalars = []
+            for j in range(len(dx) - step):
+                v1 = np.array([dx[j], dy[j]])
+                v2 = np.array([dx[j + step], dy[j + step]])
+                if np.any(np.isnan(v1)) or np.any(np.isnan(v2)):
+                    continue
+                scalars.append(np.dot(v1, v2))
+            if scalars:
+                mean[i, step - 1] = np.mean(scalars)
+                if len(scalars) > 1:
+                    sem[i, step - 1] = np.std(scalars, ddof=1) / np.sqrt(len(scalars))
+    return mean, sem
+
+
+class DirectionScalarsTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        lengths = [1, 2, 5, 12, 12, 30]
+        frames = []
+        for track, length in enumerate(lengths, start=1):
+            frames.append(pd.DataFrame({
+                "Track n": float(track),
+                "Slice n": np.arange(1, length + 1, dtype=float),
+                "X": np.cumsum(rng.normal(size=length)),
+                "Y": np.cumsum(rng.normal(size=length)),
+            }))
+        data = pd.concat(frames, ignore_index=True)
+        # Missing coordinates and cells that do not move give NaN directions
+        data.loc[[9, 25], "X"] = np.nan
+        data.loc[[20, 21, 22], ["X", "Y"]] = data.loc[19, ["X", "Y"]].to_numpy()
+        # Rows in another order than the tracks
+        self.table = TrackTable(data.sample(frac=1, random_state=1))
+        kinematics = get_kinematics(self.table, 1.0)
+        self.cos_theta, self.sin_theta = kinematics.cos_theta, kinematics.sin_theta
+
+    def test_matches_loop(self):
+        for n_steps in (1, 4, 35):
+            expected_mean, expected_sem = loop_scalars(self.table, self.cos_theta, self.sin_theta, n_steps)
+            mean, sem, counts = direction_scalars(self.table, self.cos_theta, self.sin_theta, n_steps)
+            np.testing.assert_allclose(mean, expected_mean, rtol=1e-12, atol=1e-12)
+            np.testing.assert_allclose(sem, expected_sem, rtol=1e-9, atol=1e-12)
+            np.testing.assert_array_equal(counts == 0, np.isnan(expected_mean))
+
+    def test_small_blocks(self):
+        expected = direction_scalars(self.table, self.cos_theta, self.sin_theta, 10)
+        blocked = direction_scalars(self.table, self.cos_theta, self.sin_theta, 10, block_size=len(self.table) * 3)
+        for a, b in zip(expected, blocked):
+            np.testing.assert_allclose(a, b, rtol=1e-12)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+# This code checks the batched persistence fit of the statistics against scipy's curve_fit
+
+
+import unittest
+
+import numpy as np
+from scipy.optimize import curve_fit
+
+from src.Statistics.features import fit_persistence, persistence_start
+
+
+def decay(t, alpha):
+    return np.exp(-alpha * t)
+
+
+class FitPersistenceTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.times = np.arange(1, 9) * 10.0
+        alphas = rng.uniform(0.001, 0.2, size=40)
+        self.scalars = decay(self.times[None, :], alphas[:, None]) + rng.normal(scale=0.05, size=(40, 8))
+        # Missing steps, a cell with one point and a cell without positive points
+        self.scalars[3, 5:] = np.nan
+        self.scalars[7, 1:] = np.nan
+        self.scalars[11] = -np.abs(self.scalars[11])
+
+    def test_matches_curve_fit(self):
+        alpha, quality = fit_persistence(self.times, self.scalars)
+        start = persistence_start(self.times, self.scalars)
+        for i, row in enumerate(self.scalars):
+            valid = ~np.isnan(row)
+            p0 = start[i] if not np.isnan(start[i]) else 0.01
+            (expected,), _ = curve_fit(decay, self.times[valid], row[valid], p0=[p0], maxfev=10000)
+            residual = decay(self.times[valid], expected) - row[valid]
+            self.assertLessEqual(quality['rmse'][i], np.sqrt(np.mean(residual**2)) * (1 + 1e-6) + 1e-12, f"cell {i}")
+            if i != 11:
+                # Without a positive point the error only flattens as alpha grows, any large alpha fits
+                np.testing.assert_allclose(alpha[i], expected, rtol=1e-5, atol=1e-8, err_msg=f"cell {i}")
+        self.assertTrue(quality['converged'].all())
+        np.testing.assert_array_equal(quality['n_points'], (~np.isnan(self.scalars)).sum(axis=1))
+
+    def test_cell_without_points(self):
+        scalars = np.vstack([self.scalars[:2], np.full(8, np.nan)])
+        alpha, quality = fit_persistence(self.times, scalars)
+        self.assertTrue(np.isnan(alpha[2]))
+        self.assertEqual(quality['n_points'][2], 0)
+        self.assertTrue(quality['converged'][:2].all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+# This code checks the FFT kernel of the MSD against the lag by lag loop
+
+
+import unittest
+
+import numpy as np
+
+from src.Analysis.msd import msd_fft, msd_loop
+
+
+class MsdFftTest(unittest.TestCase):
+    def test_matches_loop(self):
+        rng = np.random.default_rng(0)
+        for length in (1, 2, 3, 5, 16, 17, 40, 257):
+            x = np.cumsum(rng.normal(size=length)) + 1000
+            y = np.cumsum(rng.normal(size=length)) - 500
+            expected = msd_loop(x, y, length)
+            np.testing.assert_allclose(msd_fft(x, y)[0], expected, rtol=1e-9, atol=1e-9, err_msg=f"length {length}")
+
+    def test_batch_of_tracks(self):
+        rng = np.random.default_rng(1)
+        x = np.cumsum(rng.normal(size=(6, 30)), axis=1)
+        y = np.cumsum(rng.normal(size=(6, 30)), axis=1)
+        result = msd_fft(x, y)
+        for i in range(len(x)):
+            np.testing.assert_allclose(result[i], msd_loop(x[i], y[i], 30), rtol=1e-9, atol=1e-9)
+
+    def test_lags_longer_than_track(self):
+        x = np.array([0.0, 1.0, 3.0])
+        y = np.zeros(3)
+        msd = msd_loop(x, y, 5)
+        np.testing.assert_allclose(msd[:3], msd_fft(x, y)[0])
+        self.assertTrue(np.isnan(msd[3:]).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,7 +12,7 @@ from PyQt6 import QtCore, QtGui, QtWidgets
 class Ui_ConfigurationAutocorrelationWindow(object):
     def setupUi(self, Dialog):
         Dialog.setObjectName("Dialog")
-        Dialog.resize(371, 211)
+        Dialog.resize(371, 241)
 
         self.verticalLayout = QtWidgets.QVBoxLayout(Dialog)
         self.verticalLayout.setContentsMargins(10, 10, 10, 10)
@@ -62,13 +62,22 @@ class Ui_ConfigurationAutocorrelationWindow(object):
         self.lineEdit_n_plot_points.setText("6")
         self.formLayout.setWidget(3, QtWidgets.QFormLayout.ItemRole.FieldRole, self.lineEdit_n_plot_points)
         
+        self.n_workers = QtWidgets.QLabel(parent=self.formLayoutWidget)
+        self.n_workers.setObjectName("n_workers")
+        self.formLayout.setWidget(4, QtWidgets.QFormLayout.ItemRole.LabelRole, self.n_workers)
+        
+        self.lineEdit_n_workers = QtWidgets.QLineEdit(parent=self.formLayoutWidget)
+        self.lineEdit_n_workers.setObjectName("lineEdit_n_workers")
+        self.lineEdit_n_workers.setText("1")
+        self.formLayout.setWidget(4, QtWidgets.QFormLayout.ItemRole.FieldRole, self.lineEdit_n_workers)
+        
         self.buttonBox = QtWidgets.QDialogButtonBox(parent=self.formLayoutWidget)
         self.buttonBox.setOrientation(QtCore.Qt.Orientation.Horizontal)
         self.buttonBox.setStandardButtons(QtWidgets.QDialogButtonBox.StandardButton.Cancel|QtWidgets.QDialogButtonBox.StandardButton.Ok)
         self.buttonBox.setCenterButtons(False)
         self.buttonBox.setObjectName("buttonBox")
         
-        self.formLayout.setWidget(4, QtWidgets.QFormLayout.ItemRole.FieldRole, self.buttonBox)
+        self.formLayout.setWidget(5, QtWidgets.QFormLayout.ItemRole.FieldRole, self.buttonBox)
 
         self.verticalLayout.addWidget(self.formLayoutWidget)
 
@@ -84,3 +93,4 @@ class Ui_ConfigurationAutocorrelationWindow(object):
         self.n_time_points.setText(_translate("Dialog", "Number of time points"))
         self.n_tracks.setText(_translate("Dialog", "Number of tracks (cells)"))
         self.n_plot_points.setText(_translate("Dialog", "Number of points for the plot"))
+        self.n_workers.setText(_translate("Dialog", "Number of processes"))
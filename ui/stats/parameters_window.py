@@ -29,6 +29,13 @@ class Ui_Stat_parameters_window(object):
         self.lineEdit_2 = QtWidgets.QLineEdit(parent=Stat_parameters_window)
         self.lineEdit_2.setObjectName("lineEdit_2")
         self.gridLayout.addWidget(self.lineEdit_2, 0, 1, 1, 1)
+        self.label_3 = QtWidgets.QLabel(parent=Stat_parameters_window)
+        self.label_3.setObjectName("label_3")
+        self.gridLayout.addWidget(self.label_3, 1, 0, 1, 1)
+        self.lineEdit_n_workers = QtWidgets.QLineEdit(parent=Stat_parameters_window)
+        self.lineEdit_n_workers.setObjectName("lineEdit_n_workers")
+        self.lineEdit_n_workers.setText("1")
+        self.gridLayout.addWidget(self.lineEdit_n_workers, 1, 1, 1, 1)
         self.verticalLayout.addLayout(self.gridLayout)
         self.label = QtWidgets.QLabel(parent=Stat_parameters_window)
         sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Expanding)
@@ -70,6 +77,7 @@ class Ui_Stat_parameters_window(object):
         _translate = QtCore.QCoreApplication.translate
         Stat_parameters_window.setWindowTitle(_translate("Stat_parameters_window", "Choose Parameter"))
         self.label_2.setText(_translate("Stat_parameters_window", "Time Interval (min)"))
+        self.label_3.setText(_translate("Stat_parameters_window", "Number of processes"))
         self.label.setText(_translate("Stat_parameters_window", "Choose a parameter for the test"))
         self.comboBox.setItemText(0, _translate("Stat_parameters_window", "Migration Persistence (Autocorrelation)"))
         self.comboBox.setItemText(1, _translate("Stat_parameters_window", "Speed"))